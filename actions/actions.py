@@ -1,202 +1,658 @@
-from typing import Any, Text, Dict, List
+import asyncio
+import logging
+from typing import Any, Text, Dict, Iterable, List, Optional, Tuple
 from rasa_sdk import Action, Tracker
 from rasa_sdk.executor import CollectingDispatcher
-import mysql.connector
 import os
-import re
-from datetime import datetime
-from dateparser import parse as parse_date
+import time
+from datetime import date, datetime
 from dotenv import load_dotenv
-from openai import OpenAI
-from rasa_sdk.events import UserUtteranceReverted
+from openai import AsyncOpenAI, BadRequestError
+from rasa_sdk.events import SlotSet, UserUtteranceReverted
+
+from actions.answer_cache import AnswerCache
+from actions.dates import warmup as warm_dates
+from actions.db import ConnectionPool
+from actions.geo import GeoIndex, LocationFilter, extract_location, parse_origin
+from actions.llm import LLMGovernor, LLMUnavailable, settings_from_env as llm_settings
+from actions.filters import (FilterSpec, UnsafeQueryError, compile_spec, filter_sql, parse_spec, spec_for,
+                             spec_from_rules, spec_json, spec_location, spec_options, spec_prompt)
+from actions.followup import Refinement, Session, SessionStore, narrow_rows
+from actions.paging import NextPageCache, PageCursor, PageWindow, page_query, ranked_page, ranked_query
+from actions.readiness import Readiness
+from actions.render import EVENT_PROJECTION, render_events
+from actions.routing import Route, router_from_env, score_query
+from actions.rules import (DateFilter, extract_category_id, extract_date_filter,
+                           extract_date_sql_from_query)
+from actions.singleflight import SingleFlight, query_key
+from actions.search import EventSearch
+from actions.occurrences import OccurrenceIndex
+from actions.snapshot import EventSnapshot
+from actions.sql_cache import TemplateCache, normalize_query
+from actions.telemetry import REGISTRY, TimedRows, add_rows, add_tokens, current_trace, set_path, span, trace_request
 
 # Load environment variables
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise EnvironmentError("OPENAI_API_KEY not set in environment variables.")
-
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-# DB Connection
-try:
-    db_config = {
-        "host": os.getenv("DB_HOST"),
-        "user": os.getenv("DB_USER"),
-        "password": os.getenv("DB_PASSWORD"),
-        "database": os.getenv("DB_NAME"),
-        "port": 3306
-    }
-    db = mysql.connector.connect(**db_config)
-    cursor = db.cursor(dictionary=True)
-except mysql.connector.Error as e:
-    raise ConnectionError(f"Database connection failed: {e}")
-
-# --- DATE SQL PARSER ---
-def extract_date_sql_from_query(user_query: str) -> str:
-    user_query = user_query.lower()
-    today = datetime.now()
-    current_year = today.year
-    base_sql = "SELECT * FROM events WHERE"
-
-    # Handle range like: between 1 June and 10 June
-    date_range = re.findall(r"(?:between|from)\s+(.*?)\s+(?:and|to)\s+(.*)", user_query)
-    if date_range:
-        start_str, end_str = date_range[0]
-        start_date = parse_date(start_str + f" {current_year}")
-        end_date = parse_date(end_str + f" {current_year}")
-        if start_date and end_date:
-            return (
-                f"{base_sql} STR_TO_DATE(date_time, '%d/%m/%Y,%H:%i') "
-                f"BETWEEN '{start_date.date()}' AND '{end_date.date()}' LIMIT 10"
-            )
-
-    # Handle single date like: 15 June
-    single_date = re.search(r"\d{1,2}\s+\w+|\w+\s+\d{1,2}", user_query)
-    if single_date:
-        parsed_date = parse_date(single_date.group() + f" {current_year}")
-        if parsed_date:
-            return (
-                f"{base_sql} DATE(STR_TO_DATE(date_time, '%d/%m/%Y,%H:%i')) = "
-                f"'{parsed_date.date()}' LIMIT 10"
-            )
 
-    # Handle monthly queries
-    if "this month" in user_query:
-        return (
-            f"{base_sql} MONTH(STR_TO_DATE(date_time, '%d/%m/%Y,%H:%i')) = {today.month} "
-            f"AND YEAR(STR_TO_DATE(date_time, '%d/%m/%Y,%H:%i')) = {today.year} LIMIT 10"
+# Nothing below connects to MySQL or OpenAI at import: the pool and the
+# client are created on first use, and warmup() does the slow parts in the
+# background while the action server starts
+_client: Optional[AsyncOpenAI] = None
+
+
+def llm() -> AsyncOpenAI:
+    """The OpenAI client, built on first use."""
+    global _client
+    if _client is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise EnvironmentError("OPENAI_API_KEY not set in environment variables.")
+        _client = AsyncOpenAI(api_key=api_key, max_retries=0)  # the governor retries
+    return _client
+
+# Every GPT call goes through this: rate limit, in-flight cap, deadline,
+# retries, optional hedging and a circuit breaker (see actions.llm)
+gpt = LLMGovernor(llm, **llm_settings())
+
+# Which model, if any, answers each call: simple filters stay on the rules,
+# the small model takes the rest, GPT-4 only multi-constraint questions
+router = router_from_env()
+
+# Per-call deadlines (seconds); a slow upstream falls back to a friendly message.
+# The GPT deadline (LLM_TIMEOUT) is part of the governor settings
+DB_QUERY_TIMEOUT = float(os.getenv("DB_QUERY_TIMEOUT", "10"))
+
+RENDER_LOCALE = os.getenv("RENDER_LOCALE", "en_IN")
+EVENT_PAGE_SIZE = int(os.getenv("EVENT_PAGE_SIZE", "10"))
+
+# Limits applied to SQL compiled from model filter specs
+SQL_MAX_LIMIT = int(os.getenv("SQL_MAX_LIMIT", "50"))
+SQL_MAX_EXECUTION_MS = int(os.getenv("SQL_MAX_EXECUTION_MS", "2000"))
+SPEC_MAX_TOKENS = int(os.getenv("SPEC_MAX_TOKENS", "150"))
+
+logger = logging.getLogger(__name__)
+
+# DB Connection pool; connections open lazily (and are retried) on checkout
+db_config = {
+    "host": os.getenv("DB_HOST"),
+    "user": os.getenv("DB_USER"),
+    "password": os.getenv("DB_PASSWORD"),
+    "database": os.getenv("DB_NAME"),
+    "port": 3306
+}
+pool = ConnectionPool(
+    db_config,
+    size=int(os.getenv("DB_POOL_SIZE", "5")),
+    timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+    ping_interval=float(os.getenv("DB_POOL_PING_INTERVAL", "30")),
+    connect_retries=int(os.getenv("DB_CONNECT_RETRIES", "2")),
+)
+
+# GPT filter spec template cache, persisted so it survives restarts
+sql_cache = TemplateCache(
+    os.getenv("SQL_CACHE_PATH", "sql_cache.db"),
+    max_entries=int(os.getenv("SQL_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("SQL_CACHE_TTL", str(7 * 86400))),
+    version="filter_spec",  # prompt contract: the model answers with a JSON filter spec
+)
+
+# Event coordinates on a grid, so city and "near me" filters become id sets
+geo_index = GeoIndex(
+    pool.fetch_all,
+    max_age=float(os.getenv("GEO_MAX_AGE", "300")),
+    full_refresh=float(os.getenv("GEO_FULL_REFRESH", "3600")),
+    cell_deg=float(os.getenv("GEO_CELL_DEG", "0.1")),
+    max_ids=int(os.getenv("GEO_MAX_IDS", "500")),
+)
+
+# BM25 keyword index over title/about/address, saved to disk and mmapped at startup
+event_search = EventSearch(
+    pool.fetch_all,
+    path=os.getenv("SEARCH_INDEX_PATH", "search_index.bin"),
+    max_age=float(os.getenv("SEARCH_MAX_AGE", "300")),
+    full_refresh=float(os.getenv("SEARCH_FULL_REFRESH", str(24 * 3600))),
+    compact_after=int(os.getenv("SEARCH_COMPACT_AFTER", "5000")),
+)
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "50"))
+
+# In-process copy of `events` that answers rule-based date/category queries
+snapshot = EventSnapshot(
+    pool.fetch_all,
+    max_age=float(os.getenv("SNAPSHOT_MAX_AGE", "300")),
+    full_refresh=float(os.getenv("SNAPSHOT_FULL_REFRESH", "3600")),
+    # Recurring events are expanded from a month back to a year ahead
+    occurrences=OccurrenceIndex(
+        lookback_days=int(os.getenv("OCCURRENCE_LOOKBACK_DAYS", "31")),
+        horizon_days=int(os.getenv("OCCURRENCE_HORIZON_DAYS", "366")),
+    ),
+)
+# Most events a SQL listing with recurring events in it is ordered by occurrence over
+OCCURRENCE_MAX_IDS = int(os.getenv("OCCURRENCE_MAX_IDS", "500"))
+
+# Near-duplicate cache for general FAQ answers
+answer_cache = AnswerCache(
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.87")),
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1000")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600))),
+)
+# Looser match used when GPT is unavailable: a near answer beats an error, but
+# only one about the same thing (the cached question's content words must all match)
+ANSWER_CACHE_DEGRADED_THRESHOLD = float(os.getenv("ANSWER_CACHE_DEGRADED_THRESHOLD", "0.8"))
+
+# Identical questions/queries arriving together share one model call and one DB query
+sql_flight = SingleFlight("nl2sql")
+db_flight = SingleFlight("db")
+
+# Next result pages, fetched in the background after a full page is sent
+next_pages = NextPageCache(
+    max_entries=int(os.getenv("PREFETCH_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("PREFETCH_TTL", "300")),
+)
+
+# Each sender's last search, so "only music ones" or "what about next month?" refine it
+sessions = SessionStore(
+    max_entries=int(os.getenv("SESSION_MAX", "1000")),
+    ttl=float(os.getenv("SESSION_TTL", "1800")),
+    max_rows=EVENT_PAGE_SIZE,
+)
+
+# Cache, pool and coalescing counters, read at scrape time next to the request metrics
+REGISTRY.gauges("amused_db_pool", "Connection pool state.", pool.metrics)
+REGISTRY.gauges("amused_sql_cache", "GPT filter spec template cache counters.", sql_cache.stats)
+REGISTRY.gauges("amused_answer_cache", "FAQ answer cache counters.", answer_cache.stats)
+REGISTRY.gauges("amused_snapshot", "Event snapshot state.", snapshot.stats)
+REGISTRY.gauges("amused_geo", "Event location index state.", geo_index.stats)
+REGISTRY.gauges("amused_search", "Keyword index state.", event_search.stats)
+REGISTRY.gauges("amused_prefetch", "Next-page prefetch cache counters.", next_pages.stats)
+REGISTRY.gauges("amused_singleflight_nl2sql", "NL->SQL coalescing counters.", sql_flight.stats)
+REGISTRY.gauges("amused_singleflight_db", "DB query coalescing counters.", db_flight.stats)
+REGISTRY.gauges("amused_llm", "OpenAI governor state and counters.", gpt.stats)
+REGISTRY.gauges("amused_sessions", "Follow-up session store counters.", sessions.stats)
+
+# --- GPT FILTER SPEC ---
+async def generate_spec_from_gpt(user_query: str, route: Route) -> FilterSpec:
+    cached = sql_cache.get(user_query)
+    if cached:
+        set_path("sql_cache")
+        return parse_spec(cached)
+
+    with span("llm"), router.timed(route):
+        res = await gpt.chat(
+            model=route.model,
+            messages=[{"role": "user", "content": spec_prompt(user_query)}],
+            max_tokens=SPEC_MAX_TOKENS,
+            temperature=0,
+            **spec_options(route.model)
         )
+    add_tokens(res.usage)
+    set_path("gpt_sql")
+    with span("guard"):
+        spec = parse_spec(res.choices[0].message.content)
+    sql_cache.put(user_query, spec_json(spec))
+    return spec
+
+
+async def plan_spec(user_query: str, route: Route, origin: Optional[Tuple[float, float]] = None) -> FilterSpec:
+    """Filter spec for a question; concurrent identical questions share one plan."""
+    key = f"{query_key(user_query)}@{origin}" if origin else query_key(user_query)
+    return await sql_flight.do(key, lambda: _plan_spec(user_query, route, origin))
+
+
+async def _plan_spec(user_query: str, route: Route, origin: Optional[Tuple[float, float]] = None) -> FilterSpec:
+    if route.model is None:
+        set_path("local_sql")
+        return spec_from_rules(user_query, origin) or FilterSpec()
+    try:
+        return await generate_spec_from_gpt(user_query, route)
+    except BadRequestError as e:
+        # The API refused the request itself (a model or option it doesn't take); rules still answer
+        logger.warning("GPT rejected the spec request (%s); planning %r with rules", e, user_query)
+        set_path("local_sql")
+        return spec_from_rules(user_query, origin) or FilterSpec()
 
-    if "next month" in user_query:
-        next_month = (today.month % 12) + 1
-        next_year = today.year + (1 if next_month == 1 else 0)
-        return (
-            f"{base_sql} MONTH(STR_TO_DATE(date_time, '%d/%m/%Y,%H:%i')) = {next_month} "
-            f"AND YEAR(STR_TO_DATE(date_time, '%d/%m/%Y,%H:%i')) = {next_year} LIMIT 10"
-        )
+# --- FORMAT EVENTS FOR DISPLAY ---
+MORE_HINT = "👉 Say *show more* to see more events."
+DEGRADED_NOTE = "🤖 My free-text search is busy, so here are events matching the category or city you mentioned."
+NO_MORE = "That's all the matching events I found."
+
+
+def format_events(events: Iterable[Dict], start: int = 1) -> str:
+    return render_events(events, style="emoji", locale=RENDER_LOCALE, start=start)
+
+# --- KEYWORD SEARCH ---
+def keyword_cursor(terms: Iterable[str], start: Optional[datetime], end: Optional[datetime],
+                   category_id: Optional[int], location: Optional[LocationFilter]) -> Optional[PageCursor]:
+    """Events matching the keywords within the rule filters, best first; None when the
+    index or snapshot can't answer or nothing matches."""
+    if not event_search.ready:
+        return None
+    ids = None
+    if location is not None:
+        ids = geo_index.ids_within(location)
+        if ids is None:
+            return None
+    candidates = snapshot.matching_ids(start, end, category_id, ids)
+    if candidates is None:
+        snapshot.refresh_in_background()
+        return None
+    ranked = event_search.search(" ".join(terms), limit=SEARCH_MAX_RESULTS, candidates=candidates)
+    if not ranked:
+        return None
+    # The range travels along so recurring events show their next occurrence in it
+    return PageCursor(ranked=ranked,
+                      date_filter=[start.isoformat() if start else None, end.isoformat() if end else None,
+                                   category_id, list(location) if location else None])
+
+
+# --- PAGED RESULTS ---
+def snapshot_page(cursor: PageCursor) -> Optional[List[Dict]]:
+    """The cursor's page from the in-memory snapshot, or None if it can't answer."""
+    start, end, category_id, location, min_rating = ([*(cursor.date_filter or [])] + [None] * 5)[:5]
+    if cursor.ranked is not None:
+        after = datetime.fromisoformat(start) if start else None
+        return snapshot.rows_for(ranked_page(cursor, EVENT_PAGE_SIZE), after=after)
+    if not cursor.date_filter:
+        return None
+    if snapshot.stale:
+        snapshot.refresh_in_background()
+    ids = None
+    if location:
+        ids = geo_index.ids_within(LocationFilter(*location))
+        if ids is None:
+            return None
+    after = None
+    if cursor.after_start is not None:
+        after = (datetime.fromisoformat(cursor.after_start), cursor.after_id)
+    return snapshot.query(
+        datetime.fromisoformat(start), datetime.fromisoformat(end) if end else None, category_id,
+        limit=EVENT_PAGE_SIZE + 1, after=after, ids=ids, min_rating=min_rating,
+    )
 
-    # Handle specific month names
-    month_map = {
-        "january": 1,
-        "february": 2,
-        "march": 3,
-        "april": 4,
-        "may": 5,
-        "june": 6,
-        "july": 7,
-        "august": 8,
-        "september": 9,
-        "october": 10,
-        "november": 11,
-        "december": 12
-    }
-
-    for month_name, month_num in month_map.items():
-        if month_name in user_query:
-            return (
-                f"{base_sql} MONTH(STR_TO_DATE(date_time, '%d/%m/%Y,%H:%i')) = {month_num} "
-                f"AND YEAR(STR_TO_DATE(date_time, '%d/%m/%Y,%H:%i')) = {today.year} LIMIT 10"
-            )
 
-    return ""  # default fallback if no match
-# --- GPT SQL FALLBACK ---
-def generate_sql_from_gpt(user_query: str) -> str:
-    prompt = f"""
-You are an AI that converts natural language into MySQL SELECT queries.
-The table is `events` with columns: id, title, address, lat, long, date_time, about, category_id, rating, user_id, created_at, link, visible_date, recurring, end_date, weekdays, dates, all_time, selected_weeks.
-Use STR_TO_DATE(date_time, '%d/%m/%Y,%H:%i') for date comparisons.
-Category mapping:
-• music → 6
-• sports → 3
-• art → 4
-• education → 5
-• tech → 2
-• food → 7
-Only return a SELECT statement with LIMIT 10.
-User query: "{user_query}"
-"""
-    res = client.chat.completions.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0
+def recurring_ids(spec: FilterSpec) -> List[int]:
+    """Recurring events occurring in the spec's range, which SQL on their first
+    ``event_start`` misses; empty until the snapshot has expanded them."""
+    if not snapshot.ready:
+        return []
+    start = datetime.combine(spec.start or date.today(), datetime.min.time())
+    end = datetime.combine(spec.end, datetime.min.time()) if spec.end else None
+    return snapshot.occurrences.recurring_between(start, end)
+
+
+async def occurrence_cursor(cursor: PageCursor) -> Optional[PageCursor]:
+    """The listing as event ids in occurrence order, when recurring events fall in its range.
+
+    Keyset pages in SQL follow ``event_start``, a recurring event's first start,
+    so the spec's matching ids are fetched once (recurring events by id) and
+    ranked by each event's next occurrence in the range instead. Returns None
+    when no recurring event occurs in the range.
+    """
+    spec = parse_spec(cursor.spec or "{}")
+    recurring = recurring_ids(spec)
+    if not recurring:
+        return None
+    origin = tuple(cursor.origin) if cursor.origin else None
+    sql, params = filter_sql(spec, origin=origin, geo=geo_index, max_execution_ms=SQL_MAX_EXECUTION_MS,
+                             columns="id, event_start", recurring=recurring)
+    rows = await asyncio.wait_for(
+        pool.afetch_all(f"{sql} ORDER BY event_start, id LIMIT %s", (*params, OCCURRENCE_MAX_IDS)),
+        timeout=DB_QUERY_TIMEOUT,
     )
-    sql = res.choices[0].message.content.strip().replace("```sql", "").replace("```", "")
-    return sql
-
-# --- FORMAT EVENTS FOR DISPLAY ---
-def format_events(events: List[Dict]) -> str:
-    if not events:
-        return "no matching events."
-
-    formatted = []
-    for i, event in enumerate(events, start=1):
-        block = (
-            f"📅 *Event {i}*\n"
-            f"• *Title:* {event.get('title', 'N/A')}\n"
-            f"• *Date & Time:* {event.get('date_time', 'N/A')}\n"
-            f"• *Location:* {event.get('address', 'N/A')}\n"
-            f"• *Link:* {event.get('link', 'N/A')}\n"
-            f"• *Rating:* {event.get('rating', 'N/A')}/5\n"
-            f"• *About:* {event.get('about', 'N/A')}\n"
+    start = datetime.combine(spec.start or date.today(), datetime.min.time())
+    ranked = sorted(rows, key=lambda row: (snapshot.next_occurrence(row, start)["event_start"] or start,
+                                           row["id"]))
+    return cursor._replace(ranked=[int(row["id"]) for row in ranked],
+                           date_filter=[start.isoformat(), spec.end.isoformat() if spec.end else None])
+
+
+def occurrence_start(cursor: PageCursor) -> Optional[datetime]:
+    """Where a ranked listing's range starts: recurring events show their next occurrence from it."""
+    if cursor.ranked is None or not cursor.date_filter or not cursor.date_filter[0] or not snapshot.ready:
+        return None
+    return datetime.fromisoformat(cursor.date_filter[0])
+
+
+def cursor_query(cursor: PageCursor) -> Tuple[str, Tuple[Any, ...]]:
+    """The cursor's page as parameterized SQL, compiled again from its spec; raises UnsafeQueryError."""
+    if cursor.ranked is not None:
+        return ranked_query(EVENT_PROJECTION, cursor, EVENT_PAGE_SIZE)
+    origin = tuple(cursor.origin) if cursor.origin else None
+    sql, params = filter_sql(parse_spec(cursor.spec or "{}"), origin=origin, geo=geo_index,
+                             max_execution_ms=SQL_MAX_EXECUTION_MS)
+    return page_query(sql, params, cursor, EVENT_PAGE_SIZE)
+
+
+async def fetch_page_rows(cursor: PageCursor) -> List[Dict]:
+    rows = snapshot_page(cursor)
+    if rows is None:
+        sql, params = cursor_query(cursor)
+        rows = await asyncio.wait_for(pool.afetch_all(sql, params), timeout=DB_QUERY_TIMEOUT)
+        after = occurrence_start(cursor)
+        if after is not None:
+            rows = [snapshot.next_occurrence(row, after) for row in rows]
+    return rows
+
+
+def stream_page(sql: str, first: int, size: int = EVENT_PAGE_SIZE, params: Optional[Tuple] = None,
+                after: Optional[datetime] = None) -> Tuple[str, int, bool, Optional[Dict], List[Dict]]:
+    """Run a page query and render rows as they stream off the cursor.
+
+    Only the page's own rows are kept (for the follow-up session), never the result set.
+    With ``after``, recurring events show their next occurrence from then.
+    """
+    rows = TimedRows(pool.stream(sql, params))
+    listed = rows if after is None else (snapshot.next_occurrence(row, after) for row in rows)
+    window = PageWindow(listed, size, keep=True)
+    started = time.perf_counter()
+    output = format_events(window, first)
+    trace = current_trace()
+    if trace is not None:
+        # Rendering pulls rows off the cursor, so split out the time spent waiting on MySQL
+        trace.add_span("execute", rows.seconds)
+        trace.add_span("render", time.perf_counter() - started - rows.seconds)
+    return output, window.count, window.has_more, window.last, window.rows
+
+
+async def render_page(cursor: PageCursor,
+                      rows: Optional[List[Dict]] = None) -> Tuple[str, Optional[PageCursor], List[Dict]]:
+    """Render the cursor's page; returns the text, the cursor for the page after it and the page's rows."""
+    first = (cursor.page - 1) * EVENT_PAGE_SIZE + 1
+    if cursor.ranked is not None:
+        set_path("search")
+    if rows is not None:
+        set_path("prefetch")
+    else:
+        with span("snapshot"):
+            rows = snapshot_page(cursor)
+        if rows is not None and cursor.ranked is None:
+            set_path("snapshot")
+    if rows is None:
+        trace = current_trace()
+        if cursor.date_filter and cursor.ranked is None and trace is not None and trace.path == "unknown":
+            set_path("rule_sql")  # a rule-parsed filter; planned specs already set their path
+        if cursor.ranked is None and cursor.page == 1:
+            # SQL only knows first starts: put recurring events in their occurrence order
+            with span("occurrences"):
+                cursor = await occurrence_cursor(cursor) or cursor
+            if cursor.ranked is not None:
+                rows = snapshot_page(cursor)
+    if rows is None:
+        sql, params = cursor_query(cursor)
+        after = occurrence_start(cursor)
+        with span("fetch"):
+            output, count, has_more, last, rows = await asyncio.wait_for(
+                db_flight.do(f"{first}:{sql}:{params}",
+                             lambda: pool.run(stream_page, sql, first, EVENT_PAGE_SIZE, params, after)),
+                timeout=DB_QUERY_TIMEOUT,
+            )
+    else:
+        with span("render"):
+            window = PageWindow(rows, EVENT_PAGE_SIZE, keep=True)
+            output = format_events(window, first)
+        count, has_more, last, rows = window.count, window.has_more, window.last, window.rows
+    add_rows(count)
+
+    if not has_more:
+        if cursor.page > 1:
+            output = f"{output.rstrip()}\n\n{NO_MORE}" if count else NO_MORE
+        return output, None, rows
+    next_cursor = cursor.advance(last)
+    # has_more means this page came back full, so only listings that go on are prefetched
+    next_pages.prefetch(next_cursor.encode(), lambda: fetch_page_rows(next_cursor))
+    return f"{output.rstrip()}\n\n{MORE_HINT}", next_cursor, rows
+
+
+def snapshot_filter(spec: FilterSpec, origin: Optional[Tuple[float, float]] = None) -> Optional[List[Any]]:
+    """The spec as a cursor ``date_filter`` when the snapshot can answer it on its own
+    (it holds only the start of ``about``, so word filters stay in SQL)."""
+    if spec.keywords or spec.exclude or len(spec.category_ids) > 1:
+        return None
+    location = spec_location(spec, origin)
+    if location is None and spec.city:
+        return None  # not a gazetteer city: matched with LIKE on the address
+    return [(spec.start or date.today()).isoformat(), spec.end.isoformat() if spec.end else None,
+            spec.category_ids[0] if spec.category_ids else None, list(location) if location else None,
+            spec.min_rating]
+
+
+async def render_spec(spec: FilterSpec, origin: Optional[Tuple[float, float]] = None
+                      ) -> Tuple[str, Optional[PageCursor], List[Dict]]:
+    """Render a filter spec's events: paged in date order, or in one go when sorted or capped."""
+    options = dict(origin=origin, geo=geo_index, max_execution_ms=SQL_MAX_EXECUTION_MS)
+    if spec.pageable:
+        return await render_page(PageCursor(spec_json(spec), date_filter=snapshot_filter(spec, origin),
+                                            origin=list(origin) if origin else None))
+    recurring = recurring_ids(spec)
+    sql, params = compile_spec(spec, limit=EVENT_PAGE_SIZE, max_limit=SQL_MAX_LIMIT,
+                               recurring=recurring, **options)
+    after = datetime.combine(spec.start or date.today(), datetime.min.time()) if recurring else None
+    with span("fetch"):
+        output, count, _, _, rows = await asyncio.wait_for(
+            db_flight.do(f"{sql}:{params}",
+                         lambda: pool.run(stream_page, sql, 1, SQL_MAX_LIMIT, params, after)),
+            timeout=DB_QUERY_TIMEOUT,
         )
-        formatted.append(block)
-
-    return "\n\n".join(formatted)
+    add_rows(count)
+    return output, None, rows
+
+
+async def render_refinement(session: Session, refinement: Refinement,
+                            origin: Optional[Tuple[float, float]] = None
+                            ) -> Tuple[str, Optional[PageCursor], List[Dict]]:
+    """Answer a follow-up: filter the session's rows when it only narrows them, else re-query."""
+    if not refinement.narrows:
+        set_path("refine_sql")
+        return await render_spec(refinement.spec, origin or session.origin)
+    set_path("refine_memory")
+    with span("render"):
+        rows = narrow_rows(refinement.spec, session.rows)
+        output = format_events(rows)
+    add_rows(len(rows))
+    return output, None, rows
 
 # --- ACTION TO FETCH EVENTS ---
 class ActionFetchEventData(Action):
     def name(self) -> Text:
         return "action_fetch_event_data"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    async def search(self, user_query: Text, origin: Optional[Tuple[float, float]],
+                     trace: Any) -> Tuple[FilterSpec, str, Optional[PageCursor], List[Dict]]:
+        """Answer a new question; returns its spec, the text, the next page's cursor and the rows shown."""
+        with span("parse"):
+            date_filter = extract_date_filter(user_query, origin)
+        cursor = None
+        if date_filter:
+            location = date_filter.location
+            # Keywords on top of the date ("jazz this weekend") are ranked by the index
+            terms = score_query(user_query, origin=origin).terms
+            if terms:
+                with span("search"):
+                    cursor = keyword_cursor(
+                        terms, datetime.combine(date_filter.start, datetime.min.time()),
+                        datetime.combine(date_filter.end, datetime.min.time()),
+                        date_filter.category_id, location,
+                    )
+            spec = spec_for(date_filter.start, date_filter.end, date_filter.category_id, location,
+                            terms if cursor is not None else ())
+            if cursor is None:
+                cursor = PageCursor(
+                    spec_json(spec), origin=list(origin) if origin else None,
+                    date_filter=[date_filter.start.isoformat(), date_filter.end.isoformat(),
+                                 date_filter.category_id, list(location) if location else None],
+                )
+        else:
+            route = router.route(self.name(), user_query, origin)
+            if route.tier == "search":
+                category_id, location = extract_category_id(user_query), extract_location(user_query, origin)
+                with span("search"):
+                    cursor = keyword_cursor(
+                        route.complexity.terms, datetime.combine(date.today(), datetime.min.time()),
+                        None, category_id, location,
+                    )
+                spec = spec_for(None, None, category_id, location, route.complexity.terms)
+                if cursor is None:
+                    route = router.escalate(route)  # no keyword hits: let the model try
+        if cursor is not None:
+            return (spec, *await render_page(cursor))
+        try:
+            with span("plan"):
+                spec = await plan_spec(user_query, route, origin)
+        except LLMUnavailable as e:
+            spec = spec_from_rules(user_query, origin)
+            if spec is None:
+                raise
+            logger.warning("GPT unavailable (%s); answering %r with rule SQL", e, user_query)
+            trace.path, trace.status = "degraded_rule_sql", "degraded"
+            output, next_cursor, rows = await render_spec(spec, origin)
+            return spec, f"{DEGRADED_NOTE}\n\n{output}", next_cursor, rows
+        else:
+            if trace.path == "unknown":
+                # Another request planned this query; only the leader's trace sees its stages
+                trace.path = "gpt_sql"
+                trace.attrs["coalesced"] = True
+            return (spec, *await render_spec(spec, origin))
+
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
         user_query = tracker.latest_message.get("text")
+        # Clients that know where the user is send it as message metadata: {"location": {"lat", "lon"}}
+        origin = parse_origin((tracker.latest_message.get("metadata") or {}).get("location"))
+        next_cursor = None
+
+        with trace_request(self.name(), sender_id=tracker.sender_id) as trace:
+            try:
+                refined = sessions.refinement(tracker.sender_id, user_query, origin)
+                if refined is not None:
+                    session, refinement = refined
+                    spec, origin = refinement.spec, origin or session.origin
+                    output, next_cursor, rows = await render_refinement(session, refinement, origin)
+                else:
+                    spec, output, next_cursor, rows = await self.search(user_query, origin, trace)
+                # Remember what was shown; it's every match only when no page or LIMIT cut it off
+                complete = next_cursor is None and (
+                    spec.pageable or len(rows) < min(spec.limit or EVENT_PAGE_SIZE, SQL_MAX_LIMIT))
+                sessions.put(tracker.sender_id, spec, origin, rows, complete)
+
+            except asyncio.TimeoutError:
+                logger.warning("Event lookup timed out for query %r", user_query)
+                trace.status = "timeout"
+                output = (
+                    "⏳ That search is taking longer than usual. "
+                    "Please try again in a moment, or ask for a specific date like 'events on 15 June'."
+                )
+            except LLMUnavailable as e:
+                logger.warning("GPT unavailable for query %r: %s", user_query, e)
+                trace.status = "degraded"
+                output = (
+                    "🤖 My free-text search is unavailable right now. "
+                    "Try a date or a category, like 'music events this weekend'."
+                )
+            except UnsafeQueryError as e:
+                logger.warning("Rejected generated SQL for query %r: %s", user_query, e)
+                trace.status = "rejected"
+                output = (
+                    "❓ I couldn't turn that into a safe search. "
+                    "Try asking about events by date, category or city."
+                )
+            except Exception as e:
+                trace.status = "error"
+                output = f"⚠️ Error: {str(e)}"
 
-        try:
-            sql = extract_date_sql_from_query(user_query)
-            if not sql:
-                sql = generate_sql_from_gpt(user_query)
+        dispatcher.utter_message(text=output)
+        return [SlotSet("event_cursor", next_cursor.encode() if next_cursor else None)]
+
+# --- ACTION TO SHOW THE NEXT PAGE ---
+class ActionShowMoreEvents(Action):
+    def name(self) -> Text:
+        return "action_show_more_events"
 
-            cursor.execute(sql)
-            results = cursor.fetchall()
-            output = format_events(results)
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
-        except Exception as e:
-            output = f"⚠️ Error: {str(e)}"
+        token = tracker.get_slot("event_cursor")
+        cursor = PageCursor.decode(token)
+        if cursor is None:
+            dispatcher.utter_message(
+                text="There's nothing more to show yet. Ask me about events first, like 'events this weekend'."
+            )
+            return []
+
+        next_cursor = cursor
+        with trace_request(self.name(), sender_id=tracker.sender_id, page=cursor.page) as trace:
+            try:
+                rows = await next_pages.take(token)
+                output, next_cursor, _ = await render_page(cursor, rows)
+                if trace.path == "unknown":
+                    trace.path = "gpt_sql"  # a model query's later page, read from MySQL
+            except asyncio.TimeoutError:
+                logger.warning("Next page timed out for cursor %r", token)
+                trace.status = "timeout"
+                output = "⏳ Loading more events is taking longer than usual. Please say 'show more' again."
+            except UnsafeQueryError as e:
+                logger.warning("Rejected page cursor %r: %s", token, e)
+                trace.status = "rejected"
+                next_cursor = None
+                output = "There's nothing more to show. Ask me about events, like 'events this weekend'."
+            except Exception as e:
+                trace.status = "error"
+                output = f"⚠️ Error: {str(e)}"
 
         dispatcher.utter_message(text=output)
-        return []
+        return [SlotSet("event_cursor", next_cursor.encode() if next_cursor else None)]
 
 # --- GENERAL EVENT FAQ HANDLER ---
 class ActionGeneralInfo(Action):
     def name(self) -> Text:
         return "action_general_info"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
         user_query = tracker.latest_message.get("text")
 
-        prompt = f"""
+        with trace_request(self.name(), sender_id=tracker.sender_id) as trace:
+            with span("cache"):
+                cached = answer_cache.get(user_query)
+            if cached:
+                trace.path = "answer_cache"
+                dispatcher.utter_message(text=cached)
+                return []
+
+            prompt = f"""
 You are an assistant that answers general questions about events.
 Answer clearly in 3–4 lines only.
 
 Question: "{user_query}"
 """
 
-        try:
-            res = client.chat.completions.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.5
-            )
-            response = res.choices[0].message.content.strip()
-        except Exception as e:
-            response = f"⚠️ Error fetching info: {str(e)}"
+            trace.path = "llm"
+            route = router.route(self.name(), user_query)
+            try:
+                with span("llm"), router.timed(route):
+                    res = await gpt.chat(
+                        model=route.model,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=0.5
+                    )
+                trace.add_tokens(res.usage)
+                response = res.choices[0].message.content.strip()
+                answer_cache.put(user_query, response)
+            except LLMUnavailable as e:
+                logger.warning("General info answer unavailable for query %r: %s", user_query, e)
+                trace.status = "degraded"
+                response = answer_cache.get(user_query, threshold=ANSWER_CACHE_DEGRADED_THRESHOLD,
+                                            include_expired=True, require_terms=True)
+                if response:
+                    trace.path = "answer_cache_degraded"
+                else:
+                    response = "⏳ I can't answer that right now. Please try again in a moment."
+            except Exception as e:
+                trace.status = "error"
+                response = f"⚠️ Error fetching info: {str(e)}"
 
         dispatcher.utter_message(text=response)
         return []
@@ -219,4 +675,52 @@ class ActionFallback(Action):
             "Try something like:\n• Show events happening in June\n"
             "• Events between 5th and 10th July\n• Music shows next month 🎶"
         ))
-        return [UserUtteranceReverted()]
\ No newline at end of file
+        return [UserUtteranceReverted()]
+
+
+# --- WARMUP AND READINESS ---
+readiness = Readiness()
+
+
+def warm_parsers() -> None:
+    """Run the query-path regexes, grammar and SQL parser once so they're compiled/imported."""
+    for sample in ("music events this weekend", "events between 5th and 10th July", "concerts in Delhi"):
+        extract_date_filter(sample)
+        normalize_query(sample, date.today())
+    cursor_query(PageCursor(spec_json(FilterSpec()), after_start=date.today().isoformat(), after_id=0))
+    compile_spec(parse_spec(spec_json(FilterSpec(keywords=("warmup",)))))
+    render_events([{"title": "warmup", "date_time": "01/01/2025,10:00"}])
+
+
+def load_answer_seed() -> None:
+    if os.getenv("ANSWER_CACHE_SEED"):
+        answer_cache.load_seed_file(os.getenv("ANSWER_CACHE_SEED"))
+
+
+def load_search_index() -> None:
+    """Map the saved index if there is one, then catch it up with MySQL."""
+    event_search.load()
+    event_search.refresh()
+
+
+def warmup() -> None:
+    """Ready every resource a first query would otherwise pay for, then mark the server ready.
+
+    DB steps retry with capped backoff, so a database that comes up after
+    the action server just delays readiness instead of crashing the process.
+    """
+    readiness.step("parsers", warm_parsers)
+    readiness.step("dateparser", warm_dates)
+    readiness.step("openai_client", llm)
+    readiness.step("answer_cache", load_answer_seed)
+    readiness.step("db_pool", lambda: pool.prime(int(os.getenv("DB_POOL_WARM", "2"))), retry=True)
+    readiness.step("snapshot", lambda: snapshot.refresh(full=True), retry=True)
+    readiness.step("geo_index", lambda: geo_index.refresh(full=True), retry=True)
+    readiness.step("search_index", load_search_index, retry=True)
+    readiness.mark_ready()
+
+
+if os.getenv("ACTIONS_WARMUP", "1") == "1":
+    readiness.start(warmup)
+if os.getenv("ACTIONS_READINESS_PORT"):
+    readiness.serve(int(os.getenv("ACTIONS_READINESS_PORT")), metrics=REGISTRY.render)
@@ -0,0 +1,195 @@
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from actions.search import tokenize
+
+# Mirrors the `CountVectorsFeaturizer analyzer: char_wb, min_ngram: 1,
+# max_ngram: 4` entry in config.yml, minus the 1-grams, which make every
+# pair of English sentences look alike.
+MIN_NGRAM = 2
+MAX_NGRAM = 4
+
+
+def char_wb_ngrams(text: str, min_n: int = MIN_NGRAM, max_n: int = MAX_NGRAM) -> Counter:
+    """Character n-grams taken inside word boundaries, each word padded with spaces."""
+    counts: Counter = Counter()
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        padded = f" {word} "
+        for n in range(min_n, max_n + 1):
+            for i in range(len(padded) - n + 1):
+                counts[padded[i:i + n]] += 1
+    return counts
+
+
+def _normalize(counts: Counter) -> Dict[str, float]:
+    norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+    return {gram: v / norm for gram, v in counts.items()}
+
+
+def cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(gram, 0.0) for gram, v in a.items())
+
+
+class _Entry:
+    __slots__ = ("question", "answer", "vector", "terms", "pinned", "created_at", "hits")
+
+    def __init__(self, question: str, answer: str, pinned: bool) -> None:
+        self.question = question
+        self.answer = answer
+        self.vector = _normalize(char_wb_ngrams(question))
+        self.terms = frozenset(tokenize(question))
+        self.pinned = pinned
+        self.created_at = time.time()
+        self.hits = 0
+
+
+# --- ANSWER CACHE ---
+class AnswerCache:
+    """Serves a stored answer when a new question is close enough to an old one.
+
+    Questions are compared as cosine similarity of char_wb n-gram vectors.
+    Learned entries are evicted least-recently-used beyond ``max_entries`` and
+    expire after ``ttl`` seconds; pinned (curated) entries never do.
+    An inverted n-gram index keeps lookups from scanning every entry.
+    """
+
+    def __init__(self, threshold: float = 0.87, max_entries: int = 1000,
+                 ttl: float = 24 * 3600) -> None:
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._index: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(question: str) -> str:
+        return " ".join(re.findall(r"[a-z0-9]+", question.lower()))
+
+    def _add(self, key: str, entry: _Entry) -> None:
+        self._remove(key)
+        self._entries[key] = entry
+        for gram in entry.vector:
+            self._index.setdefault(gram, set()).add(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if not entry:
+            return
+        for gram in entry.vector:
+            keys = self._index.get(gram)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._index[gram]
+
+    def _evict(self) -> None:
+        learned = [k for k, e in self._entries.items() if not e.pinned]
+        while len(learned) > self.max_entries:
+            self._remove(learned.pop(0))
+            self.evictions += 1
+
+    def _expired(self, entry: _Entry) -> bool:
+        return not entry.pinned and time.time() - entry.created_at > self.ttl
+
+    def match(self, question: str, threshold: Optional[float] = None, include_expired: bool = False,
+              require_terms: bool = False) -> Optional[Tuple[str, float, str]]:
+        """Best ``(answer, similarity, cached_question)`` at or above the threshold.
+
+        A lower ``threshold`` and ``include_expired`` are for degraded mode, when
+        a close-enough or stale answer beats none at all. ``require_terms`` then
+        also needs every content word of the cached question in ``question``, so
+        "what is diwali" never gets the answer to "what is holi".
+        """
+        threshold = self.threshold if threshold is None else threshold
+        vector = _normalize(char_wb_ngrams(question))
+        terms = frozenset(tokenize(question)) if require_terms else frozenset()
+        with self._lock:
+            candidates = set()
+            for gram in vector:
+                candidates |= self._index.get(gram, set())
+            best: Optional[Tuple[float, str]] = None
+            for key in candidates:
+                entry = self._entries[key]
+                if self._expired(entry) and not include_expired:
+                    continue
+                if require_terms and not entry.terms <= terms:
+                    continue
+                score = cosine(vector, entry.vector)
+                if score >= threshold and (best is None or score > best[0]):
+                    best = (score, key)
+            if best is None:
+                return None
+            entry = self._entries[best[1]]
+            self._entries.move_to_end(best[1])
+            entry.hits += 1
+            return entry.answer, best[0], entry.question
+
+    def get(self, question: str, threshold: Optional[float] = None, include_expired: bool = False,
+            require_terms: bool = False) -> Optional[str]:
+        found = self.match(question, threshold, include_expired, require_terms)
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return found[0] if found else None
+
+    def put(self, question: str, answer: str) -> None:
+        key = self._key(question)
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing and existing.pinned:
+                return  # never overwrite a curated answer with a generated one
+            self._add(key, _Entry(question, answer, pinned=False))
+            self.stores += 1
+            self._evict()
+
+    # --- admin hooks ---
+    def pin(self, question: str, answer: str) -> None:
+        """Seed a curated answer; it is served for near-duplicates and never evicted."""
+        with self._lock:
+            self._add(self._key(question), _Entry(question, answer, pinned=True))
+
+    def seed(self, pairs: List[Tuple[str, str]]) -> None:
+        for question, answer in pairs:
+            self.pin(question, answer)
+
+    def load_seed_file(self, path: str) -> int:
+        """Pin answers from a JSON list of ``{"question": ..., "answer": ...}`` objects."""
+        with open(path, encoding="utf-8") as f:
+            pairs = [(item["question"], item["answer"]) for item in json.load(f)]
+        self.seed(pairs)
+        return len(pairs)
+
+    def forget(self, question: str) -> bool:
+        key = self._key(question)
+        with self._lock:
+            found = key in self._entries
+            self._remove(key)
+            return found
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "pinned": sum(1 for e in self._entries.values() if e.pinned),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
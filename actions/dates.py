@@ -0,0 +1,382 @@
+"""Deterministic date-expression parser for event queries.
+
+Queries are tokenized once and matched against a small grammar:
+
+    range    := ["between" | "from"] ["the"] point ("and" | "to" | "till" | "until" | "-") ["the"] point
+    point    := DAY ["of"] MONTH [YEAR] | MONTH DAY [YEAR] | DD/MM[/YYYY] | DAY   (DAY only as a range start)
+    ordinal  := ORDINAL_DAY                        ("the 5th": its next occurrence)
+    relative := "today" | "tonight" | "tomorrow" | ["this" | "next" | "coming"] PERIOD
+              | ["this" | "next" | "on"] WEEKDAY | MONTH [YEAR] | HOLIDAY | ("in" | "during") YEAR
+    PERIOD   := "weekend" | "week" | "month" | "quarter" | "year"
+
+Every match resolves to a half-open ``DateInterval``. A bare number is never
+a date ("show 10" is not the 10th), but an ordinal day is: "on the 5th" is
+the 5th of this month, or of next month once it has passed. When a year is omitted the interval is
+taken from the current year, or from next year if it has already ended; a
+range only runs into next year when its months wrap ("28 dec to 3 jan").
+``dateparser`` is only consulted when the grammar finds nothing but the query
+still contains a numeric date form it doesn't know, and its guesses built from
+bare numbers alone ("between 1 and 5", "7 days") are thrown away.
+"""
+import re
+from datetime import date, datetime, timedelta
+from typing import List, NamedTuple, Optional, Tuple
+
+from actions.event_start import month_bounds
+from actions.vocab import MONTHS, MONTH_ABBREVIATIONS
+
+
+class DateInterval(NamedTuple):
+    start: date  # inclusive
+    end: date  # exclusive
+    kind: str  # day, range, weekend, week, month, quarter, year
+    source: str = "grammar"
+
+
+WEEKDAYS = {
+    "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3,
+    "friday": 4, "saturday": 5, "sunday": 6,
+}
+# Abbreviations that double as ordinary words only count after on/this/next
+WEEKDAY_ABBREVIATIONS = {
+    "mon": 0, "tue": 1, "tues": 1, "wed": 2, "thu": 3, "thur": 3, "thurs": 3,
+    "fri": 4, "sat": 5, "sun": 6,
+}
+# Month names that are also common words
+AMBIGUOUS_MONTHS = {"may", "march", "mar", "jan", "sept"}
+MONTH_CONTEXT = {"in", "of", "during", "for", "early", "late", "mid", "this", "next", "until", "till", "by"}
+
+HOLIDAYS = {
+    ("new", "year"): (1, 1),
+    ("new", "years"): (1, 1),
+    ("christmas",): (12, 25),
+    ("valentines",): (2, 14),
+}
+
+RANGE_WORDS = {"and", "to", "till", "until", "through", "-"}
+
+_TOKEN = re.compile(
+    r"(?P<numdate>\b\d{1,2}/\d{1,2}(?:/\d{2,4})?\b)"
+    r"|(?P<num>\b\d{1,4})(?:st|nd|rd|th)?\b"
+    r"|(?P<word>[a-z]+)"
+    r"|(?P<dash>[-–])"
+)
+# Month and weekday words and bare numbers are fully covered by the grammar;
+# only numeric forms it doesn't know (e.g. "2025-12-31") go to dateparser
+_HINT = re.compile(r"\d{4}|\d[-./:]\d")
+_ORDINAL_SUFFIXES = ("st", "nd", "rd", "th")
+_YEAR_FRAGMENT = re.compile(r"^(?:in |during |for |of )?((?:19|20)\d{2})$")
+
+
+class Token(NamedTuple):
+    kind: str  # NUM, YEAR, NUMDATE, MONTH, WEEKDAY, WORD
+    value: object
+    text: str
+
+
+def tokenize(text: str) -> List[Token]:
+    tokens: List[Token] = []
+    text = text.lower().replace("’", "'").replace("'s", "s")
+    for m in _TOKEN.finditer(text):
+        if m.group("numdate"):
+            tokens.append(Token("NUMDATE", m.group("numdate"), m.group(0)))
+        elif m.group("num"):
+            value = int(m.group("num"))
+            kind = "YEAR" if len(m.group("num")) == 4 else "NUM"
+            tokens.append(Token(kind, value, m.group(0)))
+        elif m.group("dash"):
+            tokens.append(Token("WORD", "-", "-"))
+        else:
+            word = m.group("word")
+            if word in MONTHS:
+                tokens.append(Token("MONTH", MONTHS[word], word))
+            elif word in MONTH_ABBREVIATIONS:
+                tokens.append(Token("MONTH", MONTH_ABBREVIATIONS[word], word))
+            elif word in WEEKDAYS:
+                tokens.append(Token("WEEKDAY", WEEKDAYS[word], word))
+            elif word in WEEKDAY_ABBREVIATIONS:
+                tokens.append(Token("WEEKDAY", WEEKDAY_ABBREVIATIONS[word], word))
+            else:
+                tokens.append(Token("WORD", word, word))
+    return tokens
+
+
+# A point is (day, month, year) with month/year possibly unknown yet
+Point = Tuple[int, Optional[int], Optional[int]]
+
+
+class _Parser:
+    def __init__(self, tokens: List[Token], today: date) -> None:
+        self.tokens = tokens
+        self.today = today
+
+    # --- helpers ---
+    def _at(self, i: int) -> Optional[Token]:
+        return self.tokens[i] if 0 <= i < len(self.tokens) else None
+
+    def _word(self, i: int) -> Optional[str]:
+        tok = self._at(i)
+        return tok.value if tok and tok.kind == "WORD" else None
+
+    def _is_month(self, i: int) -> bool:
+        tok = self._at(i)
+        if not tok or tok.kind != "MONTH":
+            return False
+        if tok.text not in AMBIGUOUS_MONTHS:
+            return True
+        prev, nxt = self._at(i - 1), self._at(i + 1)
+        return bool(
+            (prev and (prev.kind == "NUM" or prev.value in MONTH_CONTEXT or prev.text == "of"))
+            or (nxt and nxt.kind in ("NUM", "YEAR"))
+        )
+
+    def _is_weekday(self, i: int) -> bool:
+        tok = self._at(i)
+        if not tok or tok.kind != "WEEKDAY":
+            return False
+        return tok.text in WEEKDAYS or self._word(i - 1) in ("on", "this", "next", "coming")
+
+    def _year(self, i: int) -> Tuple[Optional[int], int]:
+        tok = self._at(i)
+        if tok and tok.kind == "YEAR":
+            return tok.value, i + 1
+        return None, i
+
+    def _day(self, value: int) -> bool:
+        return 1 <= value <= 31
+
+    def _is_ordinal(self, i: int) -> bool:
+        tok = self._at(i)
+        return bool(tok and tok.kind == "NUM" and self._day(tok.value)
+                    and tok.text.endswith(_ORDINAL_SUFFIXES))
+
+    def _next_day(self, day: int) -> Optional[date]:
+        """The first date on or after today that falls on the given day of the month."""
+        year, month = self.today.year, self.today.month
+        for _ in range(12):
+            start = self._resolve(day, month, year)
+            if start and start >= self.today:
+                return start
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return None
+
+    def _resolve(self, day: int, month: int, year: Optional[int]) -> Optional[date]:
+        try:
+            return date(year or self.today.year, month, day)
+        except ValueError:
+            return None
+
+    def _upcoming(self, interval: DateInterval, explicit_year: bool) -> DateInterval:
+        """Roll a year-less interval that has already ended into next year."""
+        if explicit_year or interval.end > self.today:
+            return interval
+        try:
+            return interval._replace(
+                start=interval.start.replace(year=interval.start.year + 1),
+                end=interval.end.replace(year=interval.end.year + 1),
+            )
+        except ValueError:
+            return interval
+
+    # --- grammar ---
+    def point(self, i: int, allow_bare_day: bool = False) -> Optional[Tuple[Point, int]]:
+        tok = self._at(i)
+        if not tok:
+            return None
+        if tok.kind == "NUMDATE":
+            parts = [int(p) for p in tok.value.split("/")]
+            year = parts[2] if len(parts) == 3 else None
+            if year is not None and year < 100:
+                year += 2000
+            return (parts[0], parts[1], year), i + 1
+        if tok.kind == "NUM" and self._day(tok.value):
+            j = i + 1
+            if self._word(j) == "of":
+                j += 1
+            if self._is_month(j):
+                year, k = self._year(j + 1)
+                return (tok.value, self._at(j).value, year), k
+            if allow_bare_day:
+                return (tok.value, None, None), i + 1
+            return None
+        if self._is_month(i):
+            nxt = self._at(i + 1)
+            if nxt and nxt.kind == "NUM" and self._day(nxt.value):
+                year, k = self._year(i + 2)
+                return (nxt.value, tok.value, year), k
+        return None
+
+    def range(self, i: int) -> Optional[Tuple[DateInterval, int]]:
+        j = i + 1 if self._word(i) in ("between", "from") else i
+        j += self._word(j) == "the"
+        first = self.point(j, allow_bare_day=True)
+        ordinal = self._is_ordinal(j)
+        if not first:
+            return None
+        (d1, m1, y1), j = first
+        if self._word(j) not in RANGE_WORDS:
+            return None
+        j += 1
+        j += self._word(j) == "the"
+        second = self.point(j, allow_bare_day=m1 is not None or ordinal)
+        if not second:
+            return None
+        (d2, m2, y2), j = second
+        if m1 is None and m2 is None:
+            # "between the 5th and 10th": both days of the month the 5th comes next in
+            anchor = self._next_day(d1) if ordinal else None
+            if not anchor:
+                return None
+            m1, y1 = anchor.month, anchor.year
+            if d2 < d1:  # "from the 28th to the 3rd" runs into the following month
+                m2, y2 = (1, y1 + 1) if m1 == 12 else (m1 + 1, y1)
+        m1, m2 = m1 or m2, m2 or m1
+        y1 = y1 or y2
+        start = self._resolve(d1, m1, y1)
+        end = self._resolve(d2, m2, y2 or y1)
+        if not start or not end:
+            return None
+        if end < start and m1 == m2 and start.year == end.year:
+            start, end = end, start  # reversed within a month: "between 10 and 5 july"
+        elif end < start and m2 < m1 and not (y2 or y1):
+            end = self._resolve(d2, m2, start.year + 1)  # "28 dec to 3 jan"
+            if not end:
+                return None
+        if end < start:
+            return None
+        interval = DateInterval(start, end + timedelta(days=1), "range")
+        return self._upcoming(interval, bool(y1 or y2)), j
+
+    def single(self, i: int) -> Optional[Tuple[DateInterval, int]]:
+        found = self.point(i)
+        if not found:
+            return None
+        (day, month, year), j = found
+        start = self._resolve(day, month, year)
+        if not start:
+            return None
+        return self._upcoming(DateInterval(start, start + timedelta(days=1), "day"), bool(year)), j
+
+    def relative(self, i: int) -> Optional[Tuple[DateInterval, int]]:
+        today = self.today
+        word = self._word(i)
+        one_day = timedelta(days=1)
+
+        if word in ("today", "tonight"):
+            return DateInterval(today, today + one_day, "day"), i + 1
+        if word == "this" and self._word(i + 1) in ("evening", "morning", "afternoon"):
+            return DateInterval(today, today + one_day, "day"), i + 2
+        if word == "day" and self._word(i + 1) == "after" and self._word(i + 2) == "tomorrow":
+            start = today + 2 * one_day
+            return DateInterval(start, start + one_day, "day"), i + 3
+        if word == "tomorrow":
+            return DateInterval(today + one_day, today + 2 * one_day, "day"), i + 1
+
+        for words, (month, day) in HOLIDAYS.items():
+            if all(self._word(i + k) == w for k, w in enumerate(words)):
+                start = date(today.year, month, day)
+                if start < today:
+                    start = start.replace(year=today.year + 1)
+                return DateInterval(start, start + one_day, "day"), i + len(words)
+
+        shift = 0
+        j = i
+        if word in ("this", "coming", "next", "on"):
+            shift = 1 if word == "next" else 0
+            j = i + 1
+        target = self._word(j)
+        monday = today - timedelta(days=today.weekday())
+
+        if word != "on" and target == "weekend":
+            saturday = monday + timedelta(days=5 + 7 * shift)
+            return DateInterval(max(saturday, today), saturday + 2 * one_day, "weekend"), j + 1
+        if word != "on" and target == "week":
+            if shift:
+                start = monday + timedelta(days=7)
+                return DateInterval(start, start + timedelta(days=7), "week"), j + 1
+            return DateInterval(today, monday + timedelta(days=7), "week"), j + 1
+        if word in ("this", "next") and target == "month":
+            month_index = today.month - 1 + shift
+            start, end = month_bounds(today.year + month_index // 12, month_index % 12 + 1)
+            return DateInterval(start, end, "month"), j + 1
+        if word in ("this", "next") and target == "quarter":
+            q_index = (today.month - 1) // 3 + shift
+            year, q = today.year + q_index // 4, q_index % 4
+            start = date(year, 3 * q + 1, 1)
+            end = date(year + (q == 3), (3 * q + 3) % 12 + 1, 1)
+            return DateInterval(start, end, "quarter"), j + 1
+        if word in ("this", "next") and target == "year":
+            year = today.year + shift
+            return DateInterval(date(year, 1, 1), date(year + 1, 1, 1), "year"), j + 1
+        if self._is_weekday(j):
+            weekday = self._at(j).value
+            start = today + timedelta(days=(weekday - today.weekday()) % 7)
+            if shift and start < monday + timedelta(days=7):
+                start += timedelta(days=7)
+            return DateInterval(start, start + one_day, "day"), j + 1
+
+        if self._is_month(i):
+            year, k = self._year(i + 1)
+            start, end = month_bounds(year or today.year, self._at(i).value)
+            return self._upcoming(DateInterval(start, end, "month"), bool(year)), k
+        if word in ("in", "during"):
+            year, k = self._year(i + 1)
+            if year and 1900 < year < 2100:
+                return DateInterval(date(year, 1, 1), date(year + 1, 1, 1), "year"), k
+        return None
+
+    def ordinal(self, i: int) -> Optional[Tuple[DateInterval, int]]:
+        if not self._is_ordinal(i):
+            return None
+        start = self._next_day(self._at(i).value)
+        if not start:
+            return None
+        return DateInterval(start, start + timedelta(days=1), "day"), i + 1
+
+    def parse(self) -> Optional[DateInterval]:
+        for i in range(len(self.tokens)):
+            for rule in (self.range, self.single, self.relative, self.ordinal):
+                found = rule(i)
+                if found:
+                    return found[0]
+        return None
+
+
+def _dateparser_fallback(text: str, today: date) -> Optional[DateInterval]:
+    # Imported lazily: dateparser is slow to import and to warm up
+    from dateparser.search import search_dates
+
+    found = search_dates(
+        text,
+        languages=["en"],
+        settings={"RELATIVE_BASE": datetime.combine(today, datetime.min.time()),
+                  "PREFER_DATES_FROM": "future"},
+    )
+    for fragment, value in found or []:
+        fragment = fragment.strip().lower()
+        year = _YEAR_FRAGMENT.match(fragment)
+        if year:  # dateparser pins "2025" to a single day; it means the whole year
+            start = date(int(year.group(1)), 1, 1)
+            return DateInterval(start, start.replace(year=start.year + 1), "year", source="dateparser")
+        if all(tok.kind in ("NUM", "WORD") for tok in tokenize(fragment)):
+            continue  # built from bare numbers ("show 10", "7 days"), not a date
+        start = value.date()
+        return DateInterval(start, start + timedelta(days=1), "day", source="dateparser")
+    return None
+
+
+def parse_date_interval(text: str, today: Optional[date] = None,
+                        fallback: bool = True) -> Optional[DateInterval]:
+    """Return the first date expression in ``text`` as a half-open interval, or None."""
+    today = today or datetime.now().date()
+    interval = _Parser(tokenize(text), today).parse()
+    if interval is None and fallback and _HINT.search(text):
+        interval = _dateparser_fallback(text, today)
+    return interval
+
+
+def warmup() -> None:
+    """Pay dateparser's import and language-loading cost now rather than on a user's query."""
+    today = datetime.now().date()
+    parse_date_interval("events between 5th and 10th July", today)
+    _dateparser_fallback("events on 2025-07-14", today)
@@ -0,0 +1,265 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import mysql.connector
+
+logger = logging.getLogger(__name__)
+
+
+# --- CONNECTION POOL ---
+class ConnectionPool:
+    """Thread-safe MySQL pool with checkout timeouts and stale-connection checks.
+
+    Connections are opened lazily up to ``size``. A connection that has been
+    idle for longer than ``ping_interval`` seconds is pinged (and reconnected
+    if needed) before it is handed out, and any connection that raised a
+    database error while checked out is dropped instead of being returned.
+    Opening a connection is retried ``connect_retries`` times with
+    exponential backoff, so a brief server blip doesn't fail the request.
+    """
+
+    def __init__(self, config: Dict[str, Any], size: int = 5,
+                 timeout: float = 5.0, ping_interval: float = 30.0,
+                 connect_retries: int = 2, retry_backoff: float = 0.5) -> None:
+        if size < 1:
+            raise ValueError("Pool size must be at least 1.")
+        self.config = dict(config)
+        self.size = size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self.connect_retries = connect_retries
+        self.retry_backoff = retry_backoff
+
+        self._idle: List[Tuple[Any, float]] = []  # (connection, last used), most recent last
+        self._lock = threading.Lock()
+        # signalled whenever a connection is returned or a slot is freed
+        self._available = threading.Condition(self._lock)
+        self._opened = 0
+        # one worker per connection: blocking queries never outnumber the pool
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="db")
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._reconnects = 0
+        self._discarded = 0
+        self._in_use = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # --- internals ---
+    def _connect(self):
+        # autocommit so every checkout sees fresh rows instead of the snapshot
+        # of a transaction left open on a long-lived connection
+        for attempt in range(self.connect_retries + 1):
+            try:
+                conn = mysql.connector.connect(**self.config)
+                break
+            except (mysql.connector.InterfaceError, mysql.connector.OperationalError) as e:
+                if attempt == self.connect_retries:
+                    raise
+                delay = self.retry_backoff * 2 ** attempt
+                logger.warning("MySQL connect failed (%s); retry %d/%d in %.1fs",
+                               e, attempt + 1, self.connect_retries, delay)
+                time.sleep(delay)
+        conn.autocommit = True
+        return conn
+
+    def _release_slot(self) -> None:
+        with self._available:
+            self._opened -= 1
+            # a caller blocked on a full pool can now open a connection of its own
+            self._available.notify()
+
+    def _discard(self, conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._release_slot()
+        with self._lock:
+            self._discarded += 1
+
+    def _ensure_alive(self, conn, last_used: float):
+        # is_connected() sends a ping, so only pay for it on connections that
+        # sat idle long enough for the server to have dropped them
+        if time.monotonic() - last_used < self.ping_interval or conn.is_connected():
+            return conn
+        logger.warning("Reconnecting stale MySQL connection.")
+        try:
+            conn.close()
+        except Exception:
+            pass
+        conn = self._connect()
+        with self._lock:
+            self._reconnects += 1
+        return conn
+
+    # --- public API ---
+    def acquire(self, timeout: Optional[float] = None):
+        """Check a connection out, waiting at most ``timeout`` seconds."""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        conn = None
+        with self._available:
+            while not self._idle and self._opened >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise TimeoutError(
+                        f"No database connection available after {timeout:.1f}s "
+                        f"(pool size {self.size})."
+                    )
+                self._available.wait(remaining)
+            if self._idle:
+                conn, last_used = self._idle.pop()
+            else:
+                self._opened += 1
+        if conn is None:
+            try:
+                conn, last_used = self._connect(), time.monotonic()
+            except Exception:
+                self._release_slot()
+                raise
+
+        try:
+            conn = self._ensure_alive(conn, last_used)
+        except Exception:
+            self._release_slot()
+            raise
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def release(self, conn, broken: bool = False) -> None:
+        """Return a connection to the pool, or drop it if it is ``broken``."""
+        if broken:
+            with self._lock:
+                self._in_use -= 1
+            self._discard(conn)
+            return
+        with self._available:
+            self._in_use -= 1
+            self._idle.append((conn, time.monotonic()))
+            self._available.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        conn = self.acquire(timeout)
+        broken = False
+        try:
+            yield conn
+        except mysql.connector.Error:
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    @contextmanager
+    def cursor(self, dictionary: bool = True,
+               timeout: Optional[float] = None) -> Iterator[Any]:
+        """Yield a fresh cursor on a pooled connection, one per request."""
+        with self.connection(timeout) as conn:
+            cur = conn.cursor(dictionary=dictionary)
+            try:
+                yield cur
+            finally:
+                cur.close()
+
+    def fetch_all(self, sql: str, params: Optional[tuple] = None) -> list:
+        with self.cursor() as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+    def stream(self, sql: str, params: Optional[tuple] = None) -> Iterator[Dict[str, Any]]:
+        """Yield rows as they arrive on an unbuffered cursor instead of materializing them.
+
+        The connection stays checked out until the generator is exhausted or closed.
+        """
+        conn = self.acquire()
+        broken = True  # until the result set has been read to the end
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(sql, params)
+            for row in cur:
+                yield row
+            broken = False
+        except GeneratorExit:
+            # A consumer that stops early (PageWindow) leaves rows unread, which
+            # would make cursor.close() raise and the connection be discarded
+            broken = not self._drain(cur)
+            raise
+        finally:
+            try:
+                cur.close()
+            except Exception:
+                broken = True  # never replaces the error that got us here
+            self.release(conn, broken=broken)
+
+    def _drain(self, cur) -> bool:
+        """Read what's left of an abandoned result set; False if the connection can't be reused."""
+        try:
+            cur.fetchall()
+            return True
+        except Exception:
+            logger.warning("Could not drain an abandoned query; dropping its connection.", exc_info=True)
+            return False
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run blocking ``fn`` on the pool's worker threads without blocking the event loop.
+
+        ``fn`` sees the caller's context variables (the request trace among them).
+        """
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, ctx.run, fn, *args)
+
+    async def afetch_all(self, sql: str, params: Optional[tuple] = None) -> list:
+        return await self.run(self.fetch_all, sql, params)
+
+    def prime(self, count: int = 1) -> None:
+        """Open ``count`` connections up front so the first request doesn't pay for them."""
+        conns = []
+        try:
+            for _ in range(min(count, self.size)):
+                conns.append(self.acquire())
+        finally:
+            # one failed connect mustn't leave the ones already open checked out
+            for conn in conns:
+                self.release(conn)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            checkouts = self._checkouts
+            return {
+                "size": self.size,
+                "opened": self._opened,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": checkouts,
+                "timeouts": self._timeouts,
+                "reconnects": self._reconnects,
+                "discarded": self._discarded,
+                "wait_seconds_total": round(self._wait_total, 6),
+                "wait_seconds_max": round(self._wait_max, 6),
+                "wait_seconds_avg": round(self._wait_total / checkouts, 6) if checkouts else 0.0,
+            }
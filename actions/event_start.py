@@ -0,0 +1,205 @@
+"""Keep the indexed `events.event_start` DATETIME in sync with `date_time`.
+
+`date_time` is a display string ('20/06/2025,20:30' or '20/06/2025,20 : 30'),
+so filtering on it means STR_TO_DATE on every row. `event_start` holds the
+parsed value behind an index so date filters become range scans. The
+migration also adds `updated_at`, which MySQL bumps on every insert and
+edit, so "has `events` changed?" is one index lookup (actions.responses).
+
+Usage (from the project root, with the DB_* variables set):
+
+    python -m actions.event_start migrate    # add columns, indexes and triggers
+    python -m actions.event_start backfill   # fill/repair event_start in batches
+    python -m actions.event_start check      # report rows that are out of sync
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+from datetime import date, datetime
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DATE_TIME_PATTERN = re.compile(
+    r"^\s*(\d{1,2})/(\d{1,2})/(\d{4})\s*,\s*(\d{1,2})\s*:\s*(\d{1,2})\s*$"
+)
+
+# Same normalization in SQL: strip the spaces around ':' before parsing. STR_TO_DATE
+# is only reached for strings shaped like a date, since under strict mode a value it
+# can't parse fails the whole INSERT/UPDATE instead of leaving event_start NULL
+SQL_DATE_TIME_REGEXP = "^(0?[1-9]|[12][0-9]|3[01])/(0?[1-9]|1[0-2])/[0-9]{4},([01]?[0-9]|2[0-3]):[0-5]?[0-9]$"
+
+
+def sql_parse_date_time(column: str = "date_time") -> str:
+    normalized = f"REPLACE({column}, ' ', '')"
+    return (f"IF({normalized} REGEXP '{SQL_DATE_TIME_REGEXP}', "
+            f"STR_TO_DATE({normalized}, '%d/%m/%Y,%H:%i'), NULL)")
+
+
+SQL_PARSE_DATE_TIME = sql_parse_date_time()
+
+MIGRATION = [
+    "ALTER TABLE events ADD COLUMN event_start DATETIME NULL AFTER date_time",
+    "CREATE INDEX idx_events_event_start ON events (event_start, id)",
+]
+
+CHANGE_MARKER = [
+    "ALTER TABLE events ADD COLUMN updated_at TIMESTAMP(3) NOT NULL "
+    "DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3)",
+    "CREATE INDEX idx_events_updated_at ON events (updated_at)",
+]
+
+TRIGGERS = [
+    "DROP TRIGGER IF EXISTS events_event_start_insert",
+    f"""CREATE TRIGGER events_event_start_insert BEFORE INSERT ON events
+FOR EACH ROW SET NEW.event_start = {sql_parse_date_time("NEW.date_time")}""",
+    "DROP TRIGGER IF EXISTS events_event_start_update",
+    f"""CREATE TRIGGER events_event_start_update BEFORE UPDATE ON events
+FOR EACH ROW SET NEW.event_start = {sql_parse_date_time("NEW.date_time")}""",
+]
+
+
+def parse_date_time(value: Optional[str]) -> Optional[datetime]:
+    """Parse an `events.date_time` string; None if it isn't in the expected format."""
+    if not value:
+        return None
+    match = DATE_TIME_PATTERN.match(value)
+    if not match:
+        return None
+    day, month, year, hour, minute = match.groups()
+    try:
+        return datetime(int(year), int(month), int(day), int(hour), int(minute))
+    except ValueError:
+        return None
+
+
+def date_range_sql(start: date, end: date) -> str:
+    """Sargable half-open range on the indexed `event_start` column."""
+    return f"event_start >= '{start.isoformat()}' AND event_start < '{end.isoformat()}'"
+
+
+def month_bounds(year: int, month: int) -> Tuple[date, date]:
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return date(year, month, 1), date(next_year, next_month, 1)
+
+
+def month_range_sql(year: int, month: int) -> str:
+    return date_range_sql(*month_bounds(year, month))
+
+
+def _has_column(cur, column: str) -> bool:
+    cur.execute(
+        "SELECT COUNT(*) FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() AND table_name = 'events' AND column_name = %s",
+        (column,),
+    )
+    return bool(cur.fetchone()[0])
+
+
+def migrate(conn, triggers: bool = True) -> None:
+    cur = conn.cursor()
+    for column, statements in (("event_start", MIGRATION), ("updated_at", CHANGE_MARKER)):
+        if _has_column(cur, column):
+            logger.info("events.%s already exists.", column)
+            continue
+        for statement in statements:
+            logger.info("%s", statement)
+            cur.execute(statement)
+    if triggers:
+        for statement in TRIGGERS:
+            cur.execute(statement)
+        logger.info("Installed insert/update triggers.")
+    conn.commit()
+    cur.close()
+
+
+def backfill(conn, batch_size: int = 1000, only_missing: bool = False) -> Dict[str, int]:
+    """Walk `events` by id and rewrite `event_start` wherever it disagrees with `date_time`."""
+    stats = {"scanned": 0, "updated": 0, "unparseable": 0}
+    read = conn.cursor(dictionary=True)
+    write = conn.cursor()
+    last_id = 0
+    where = "AND event_start IS NULL" if only_missing else ""
+    while True:
+        read.execute(
+            f"SELECT id, date_time, event_start FROM events WHERE id > %s {where} "
+            f"ORDER BY id LIMIT %s",
+            (last_id, batch_size),
+        )
+        rows = read.fetchall()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            stats["scanned"] += 1
+            parsed = parse_date_time(row["date_time"])
+            if parsed is None and row["date_time"]:
+                stats["unparseable"] += 1
+            if parsed != row["event_start"]:
+                updates.append((parsed, row["id"]))
+        if updates:
+            write.executemany("UPDATE events SET event_start = %s WHERE id = %s", updates)
+            conn.commit()
+            stats["updated"] += len(updates)
+        last_id = rows[-1]["id"]
+    read.close()
+    write.close()
+    return stats
+
+
+def check(conn) -> int:
+    cur = conn.cursor()
+    cur.execute(
+        f"SELECT COUNT(*) FROM events WHERE NOT (event_start <=> {SQL_PARSE_DATE_TIME})"
+    )
+    drift = cur.fetchone()[0]
+    cur.close()
+    return drift
+
+
+def _connect() -> Any:
+    import mysql.connector
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return mysql.connector.connect(
+        host=os.getenv("DB_HOST"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+        port=3306,
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    m = sub.add_parser("migrate", help="add event_start and updated_at, their indexes and sync triggers")
+    m.add_argument("--no-triggers", action="store_true",
+                   help="skip triggers (run 'backfill --missing' periodically instead)")
+    b = sub.add_parser("backfill", help="fill or repair event_start from date_time")
+    b.add_argument("--batch-size", type=int, default=1000)
+    b.add_argument("--missing", action="store_true", help="only rows where event_start is NULL")
+    sub.add_parser("check", help="count rows whose event_start disagrees with date_time")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    conn = _connect()
+    try:
+        if args.command == "migrate":
+            migrate(conn, triggers=not args.no_triggers)
+        elif args.command == "backfill":
+            logger.info("%s", backfill(conn, args.batch_size, only_missing=args.missing))
+        else:
+            drift = check(conn)
+            logger.info("%d row(s) out of sync", drift)
+            return 1 if drift else 0
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""Event searches as a compact filter spec, compiled locally into parameterized SQL.
+
+The model no longer writes SQL. ``spec_prompt`` asks it for a small JSON
+object and gives it today's date, so it resolves relative dates and years
+itself::
+
+    {"from": "2025-06-06", "before": "2025-06-09", "categories": ["music"],
+     "city": "Pune", "keywords": ["jazz"], "min_rating": 4, "sort": "date"}
+
+``parse_spec`` validates that into a FilterSpec and raises UnsafeQueryError
+for anything malformed. ``filter_sql`` and ``compile_spec`` turn a spec
+into a SELECT with ``%s`` placeholders. Every query starts with a
+half-open range on the indexed ``event_start``; with no dates the range
+is upcoming events, and recurring events that occur in it are added by
+id. User words only ever travel as parameters. The same spec always
+compiles to the same SQL, so specs are what the template cache stores
+(``spec_json`` is the canonical form). ``spec_from_rules`` builds the
+same spec from the rule parsers, for questions the router keeps local.
+"""
+import json
+import re
+from datetime import date
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from actions.geo import GAZETTEER, GeoIndex, LocationFilter, extract_location, location_sql
+from actions.render import EVENT_PROJECTION
+from actions.rules import extract_category_id, extract_date_filter
+from actions.vocab import CATEGORY_IDS, category_for_word
+
+SORTS = ("date", "rating")
+MAX_KEYWORDS = 5
+MAX_WORD_LENGTH = 40
+NEAR_ME_KM = 10.0
+
+# Kept short on purpose: this goes out with every model-planned question
+SPEC_PROMPT = """Turn the event search into a JSON object. Keys, all optional:
+from, before: ISO dates, the range is [from, before); today is {today} ({weekday})
+categories: any of {categories}
+city: a city name; near_me: true for "near me"/"nearby"; radius_km: a number
+keywords: other words an event title or description must contain
+exclude: words it must not contain
+min_rating: 1-5
+sort: "date" (default) or "rating"
+limit: only for "top N"
+Search: {query}"""
+
+# Models that refuse response_format=json_object with a 400; they get the prompt alone
+NO_JSON_MODE = re.compile(r"^gpt-4(-32k)?(-0314|-0613)?$|^gpt-3\.5-turbo(-16k)?(-0301|-0613)$")
+
+
+class UnsafeQueryError(ValueError):
+    """Raised when a filter spec can't be turned into a safe query."""
+
+
+class FilterSpec(NamedTuple):
+    start: Optional[date] = None  # inclusive; None means from today
+    end: Optional[date] = None  # exclusive
+    category_ids: Tuple[int, ...] = ()
+    city: Optional[str] = None
+    near_me: bool = False
+    radius_km: Optional[float] = None
+    keywords: Tuple[str, ...] = ()
+    exclude: Tuple[str, ...] = ()
+    min_rating: Optional[float] = None
+    sort: str = "date"
+    limit: Optional[int] = None
+
+    @property
+    def pageable(self) -> bool:
+        """Listed in (event_start, id) order with no fixed size, so it can be paged."""
+        return self.sort == "date" and self.limit is None
+
+
+def spec_prompt(user_query: str, today: Optional[date] = None) -> str:
+    today = today or date.today()
+    return SPEC_PROMPT.format(today=today.isoformat(), weekday=today.strftime("%A"),
+                              categories=", ".join(CATEGORY_IDS), query=json.dumps(user_query))
+
+
+def spec_options(model: str) -> Dict[str, Any]:
+    """Extra chat options for the spec prompt: JSON mode where ``model`` supports it."""
+    return {} if NO_JSON_MODE.match(model or "") else {"response_format": {"type": "json_object"}}
+
+
+# --- PARSING ---
+def _date(value: Any, key: str) -> Optional[date]:
+    if value in (None, ""):
+        return None
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError as e:
+        raise UnsafeQueryError(f"Spec {key!r} is not an ISO date: {value!r}") from e
+
+
+def _number(value: Any, key: str, low: float, high: float) -> Optional[float]:
+    if value in (None, ""):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError) as e:
+        raise UnsafeQueryError(f"Spec {key!r} is not a number: {value!r}") from e
+    if not low <= number <= high:
+        raise UnsafeQueryError(f"Spec {key!r} is out of range: {number}")
+    return number
+
+
+def _words(value: Any, key: str) -> List[str]:
+    if value in (None, ""):
+        return []
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not all(isinstance(w, (str, int)) for w in value):
+        raise UnsafeQueryError(f"Spec {key!r} must be a list of words.")
+    words = [" ".join(str(w).split())[:MAX_WORD_LENGTH] for w in value]
+    return [w for w in words if w]
+
+
+def parse_spec(text: str) -> FilterSpec:
+    """Validate the model's JSON (or a cached ``spec_json``) into a FilterSpec."""
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        # Without JSON mode a model may wrap the object in prose or a code fence
+        first, last = text.find("{"), text.rfind("}")
+        try:
+            data = json.loads(text[first:last + 1]) if 0 <= first < last else None
+        except ValueError:
+            data = None
+        if data is None:
+            raise UnsafeQueryError(f"Spec is not JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise UnsafeQueryError("Spec must be a JSON object.")
+
+    start, end = _date(data.get("from"), "from"), _date(data.get("before"), "before")
+    if start and end and end <= start:
+        raise UnsafeQueryError(f"Spec date range is empty: {start} to {end}")
+
+    # Categories by name, synonym or id; anything else is a keyword the model misfiled
+    category_ids: List[int] = []
+    keywords = _words(data.get("keywords"), "keywords")
+    for word in _words(data.get("categories"), "categories"):
+        name = category_for_word(word.lower())
+        if name:
+            category_ids.append(CATEGORY_IDS[name])
+        elif word.isdigit() and int(word) in CATEGORY_IDS.values():
+            category_ids.append(int(word))
+        else:
+            keywords.append(word)
+
+    sort = str(data.get("sort") or "date").lower()
+    if sort not in SORTS:
+        raise UnsafeQueryError(f"Spec sort must be one of {SORTS}, not {sort!r}")
+    limit = _number(data.get("limit"), "limit", 1, 1000)
+    city = data.get("city")
+    if city is not None and not isinstance(city, str):
+        raise UnsafeQueryError("Spec 'city' must be a string.")
+    city = " ".join(city.split())[:MAX_WORD_LENGTH].title() if city else None
+
+    return FilterSpec(
+        start=start,
+        end=end,
+        category_ids=tuple(sorted(set(category_ids))),
+        city=city or None,
+        near_me=bool(data.get("near_me")),
+        radius_km=_number(data.get("radius_km"), "radius_km", 0.1, 500),
+        keywords=tuple(dict.fromkeys(keywords))[:MAX_KEYWORDS],
+        exclude=tuple(dict.fromkeys(_words(data.get("exclude"), "exclude")))[:MAX_KEYWORDS],
+        min_rating=_number(data.get("min_rating"), "min_rating", 0, 5),
+        sort=sort,
+        limit=int(limit) if limit is not None else None,
+    )
+
+
+def spec_json(spec: FilterSpec) -> str:
+    """Canonical JSON for a spec: only the keys that are set, in a fixed order."""
+    data: Dict[str, Any] = {
+        "from": spec.start.isoformat() if spec.start else None,
+        "before": spec.end.isoformat() if spec.end else None,
+        "categories": list(spec.category_ids) or None,
+        "city": spec.city,
+        "near_me": spec.near_me or None,
+        "radius_km": spec.radius_km,
+        "keywords": list(spec.keywords) or None,
+        "exclude": list(spec.exclude) or None,
+        "min_rating": spec.min_rating,
+        "sort": spec.sort if spec.sort != "date" else None,
+        "limit": spec.limit,
+    }
+    return json.dumps({k: v for k, v in data.items() if v is not None}, separators=(", ", ": "))
+
+
+def spec_for(start: Optional[date], end: Optional[date], category_id: Optional[int],
+             location: Optional[LocationFilter], keywords: Tuple[str, ...] = ()) -> FilterSpec:
+    """The spec for filters the rule parsers found."""
+    return FilterSpec(
+        start=start,
+        end=end,
+        category_ids=(category_id,) if category_id is not None else (),
+        city=location.city.title() if location and location.city else None,
+        near_me=location is not None and location.city is None,
+        radius_km=location.radius_km if location else None,
+        keywords=tuple(keywords),
+    )
+
+
+def spec_from_rules(user_query: str, origin: Optional[Tuple[float, float]] = None) -> Optional[FilterSpec]:
+    """The spec the rule parsers find (date range, category, location); None if there's none."""
+    date_filter = extract_date_filter(user_query, origin)
+    if date_filter:
+        return spec_for(date_filter.start, date_filter.end, date_filter.category_id, date_filter.location)
+    category_id, location = extract_category_id(user_query), extract_location(user_query, origin)
+    if category_id is None and location is None:
+        return None
+    return spec_for(None, None, category_id, location)
+
+
+# --- COMPILING ---
+def _like(word: str) -> str:
+    escaped = word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def spec_location(spec: FilterSpec, origin: Optional[Tuple[float, float]] = None) -> Optional[LocationFilter]:
+    """The spec's gazetteer city or "near me" as a LocationFilter; None for neither (or no origin)."""
+    if spec.city and spec.city.lower() in GAZETTEER:
+        place = GAZETTEER[spec.city.lower()]
+        return LocationFilter(place.lat, place.lon, spec.radius_km or place.radius_km, spec.city.lower())
+    if spec.near_me and origin is not None:
+        return LocationFilter(origin[0], origin[1], spec.radius_km or NEAR_ME_KM)
+    return None
+
+
+def filter_sql(spec: FilterSpec, today: Optional[date] = None,
+               origin: Optional[Tuple[float, float]] = None, geo: Optional[GeoIndex] = None,
+               max_execution_ms: Optional[int] = None,
+               columns: str = EVENT_PROJECTION,
+               recurring: Sequence[int] = ()) -> Tuple[str, List[Any]]:
+    """``(sql, params)`` selecting ``columns`` of the spec's events, without ORDER BY/LIMIT.
+
+    ``event_start`` is only an event's first start, so ``recurring`` lists the
+    recurring events known to occur in the spec's range (actions.occurrences);
+    they match by id instead. ``columns`` goes into the SQL as is, so it must
+    never hold user input.
+    """
+    dates = "event_start >= %s"
+    params: List[Any] = [(spec.start or today or date.today()).isoformat()]
+    if spec.end:
+        dates += " AND event_start < %s"
+        params.append(spec.end.isoformat())
+    if recurring:
+        dates = f"({dates} OR id IN ({', '.join(['%s'] * len(recurring))}))"
+        params.extend(int(i) for i in recurring)
+    where = [dates]
+    if spec.category_ids:
+        where.append(f"category_id IN ({', '.join(['%s'] * len(spec.category_ids))})")
+        params.extend(spec.category_ids)
+    location = spec_location(spec, origin)
+    if location is not None:
+        where.append(location_sql(location, geo, params))
+    elif spec.city:
+        where.append("address LIKE %s")
+        params.append(_like(spec.city))
+    for word in spec.keywords:
+        where.append("(title LIKE %s OR about LIKE %s)")
+        params.extend([_like(word), _like(word)])
+    for word in spec.exclude:
+        where.append("title NOT LIKE %s AND COALESCE(about, '') NOT LIKE %s")
+        params.extend([_like(word), _like(word)])
+    if spec.min_rating is not None:
+        where.append("rating >= %s")
+        params.append(spec.min_rating)
+    hint = f"/*+ MAX_EXECUTION_TIME({int(max_execution_ms)}) */ " if max_execution_ms else ""
+    return f"SELECT {hint}{columns} FROM events WHERE {' AND '.join(where)}", params
+
+
+def compile_spec(spec: FilterSpec, limit: int = 10, max_limit: int = 50,
+                 **options: Any) -> Tuple[str, Tuple[Any, ...]]:
+    """``(sql, params)`` for the spec's first ``limit`` events (or its own "top N"), in its sort order.
+
+    ``options`` are passed to ``filter_sql``.
+    """
+    sql, params = filter_sql(spec, **options)
+    order = "rating DESC, event_start, id" if spec.sort == "rating" else "event_start, id"
+    params.append(min(spec.limit or limit, max_limit))
+    return f"{sql} ORDER BY {order} LIMIT %s", tuple(params)
+
@@ -0,0 +1,258 @@
+"""Follow-up questions applied to the previous search instead of starting over.
+
+After each search the action stores the conversation's filter spec and the
+rows it showed in a SessionStore. A message such as "only music ones",
+"what about next month?" or "sorted by rating" is then parsed by
+``refine`` into a change of that spec, with no model call. Two cases:
+
+* The change only narrows the spec (a category within the old ones, an
+  extra keyword, a minimum rating, a shorter date range or a different
+  sort) and the stored rows were every match. The answer is then
+  filtered and sorted in memory (``narrow_rows``).
+* Anything else (a new date, city or category) becomes one query for the
+  refined spec, compiled by actions.filters.
+
+Sessions are LRU-bounded to ``max_entries`` senders, expire after ``ttl``
+seconds and keep at most ``max_rows`` rows each.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from actions.dates import parse_date_interval
+from actions.filters import FilterSpec
+from actions.geo import match_location
+from actions.routing import FUNCTION_WORDS, OPERATOR_WORDS, STRUCTURE_WORDS
+from actions.rules import extract_category_id
+from actions.sql_cache import normalize_query
+
+# "only ...", "what about ...", "and tomorrow?", "sorted by rating", "... ones/those/instead"
+_FOLLOW_UP = re.compile(
+    r"^(?:(?:and|but|ok|okay|now|then|so)\s+)*"
+    r"(?:only|just|what\s+about|how\s+about|and|sort(?:ed)?\s+by|order(?:ed)?\s+by|show\s+(?:me\s+)?(?:only|just))\b"
+    r"|\b(?:ones|those|them|these|instead)\b|\bonly\W*$"
+)
+# "what about sports?" swaps a filter; "only sports" adds to it
+_REPLACE = re.compile(r"\b(?:what|how)\s+about\b|\binstead\b")
+_RATING_SORT = re.compile(r"\b(?:(?:sort(?:ed)?|order(?:ed)?)\s+by\s+rating|by\s+rating|best\s+(?:rated\s+)?first"
+                          r"|highest\s+rated|top\s+rated|best\s+ones)\b")
+_DATE_SORT = re.compile(r"\b(?:(?:sort(?:ed)?|order(?:ed)?)\s+by\s+date|by\s+date|soonest|earliest(?:\s+first)?)\b")
+_MIN_RATING = re.compile(
+    r"\b(?:above|over|at\s+least)\s+(\d(?:\.\d+)?)"
+    r"|\b(\d(?:\.\d+)?)\s*(?:\+|stars?\b(?:\s*(?:and|or)\s*(?:above|up|more))?|and\s+above|or\s+more)"
+)
+# Words that shape the follow-up rather than name what to look for
+REFINE_WORDS = {
+    "only", "just", "what", "about", "how", "ones", "one", "those", "them", "these", "instead",
+    "sort", "sorted", "order", "ordered", "by", "rating", "ratings", "rated", "first", "best",
+    "highest", "top", "date", "soonest", "earliest", "stars", "star", "up", "ok", "okay", "now",
+    "then", "so", "least", "same", "with", "that", "are",
+}
+
+
+class Session(NamedTuple):
+    spec: FilterSpec
+    origin: Optional[Tuple[float, float]]
+    rows: List[Dict[str, Any]]  # the rows shown for the spec, best first
+    complete: bool  # rows are every match, so narrowing can stay in memory
+
+
+class Refinement(NamedTuple):
+    spec: FilterSpec
+    narrows: bool  # every match of ``spec`` also matched the session's spec
+
+
+# --- PARSING ---
+def is_follow_up(text: str) -> bool:
+    return bool(_FOLLOW_UP.search(" ".join(text.lower().split())))
+
+
+def _keywords(text: str, origin: Optional[Tuple[float, float]]) -> List[str]:
+    _, rest = match_location(text, origin)
+    key, _, _ = normalize_query(rest)
+    return [w for w in key.split()
+            if not w.startswith("{") and not w.isdigit() and len(w) > 1
+            and w not in REFINE_WORDS and w not in STRUCTURE_WORDS and w not in OPERATOR_WORDS
+            and w not in FUNCTION_WORDS]
+
+
+def refine(spec: FilterSpec, text: str, origin: Optional[Tuple[float, float]] = None) -> Optional[FilterSpec]:
+    """``spec`` changed by a follow-up message, or None if ``text`` isn't one."""
+    lowered = " ".join(text.lower().split())
+    if not _FOLLOW_UP.search(lowered):
+        return None
+    replace = bool(_REPLACE.search(lowered))
+    changes: Dict[str, Any] = {}
+
+    interval = parse_date_interval(text)
+    if interval:
+        changes.update(start=interval.start, end=interval.end)
+    location, _ = match_location(text, origin)
+    if location is not None:
+        changes.update(city=location.city.title() if location.city else None,
+                       near_me=location.city is None, radius_km=location.radius_km)
+    category_id = extract_category_id(text)
+    if category_id is not None:
+        changes["category_ids"] = (category_id,)
+    if _RATING_SORT.search(lowered):
+        changes["sort"] = "rating"
+    elif _DATE_SORT.search(lowered):
+        changes["sort"] = "date"
+    rating = _MIN_RATING.search(lowered)
+    if rating:
+        value = float(rating.group(1) or rating.group(2))
+        if 0 <= value <= 5:
+            changes["min_rating"] = value
+    keywords = _keywords(text, origin)
+    if keywords:
+        changes["keywords"] = tuple(dict.fromkeys(keywords if replace else [*spec.keywords, *keywords]))
+
+    if not changes:
+        return None
+    return spec._replace(**changes)
+
+
+def narrows(old: FilterSpec, new: FilterSpec, today: Optional[date] = None) -> bool:
+    """Whether every event ``new`` matches also matched ``old``."""
+    today = today or date.today()
+    if (new.start or today) < (old.start or today):
+        return False
+    if old.end is not None and (new.end is None or new.end > old.end):
+        return False
+    if (new.city, new.near_me, new.radius_km) != (old.city, old.near_me, old.radius_km):
+        return False
+    if old.category_ids and not (new.category_ids and set(new.category_ids) <= set(old.category_ids)):
+        return False
+    if old.min_rating is not None and (new.min_rating is None or new.min_rating < old.min_rating):
+        return False
+    return set(old.keywords) <= set(new.keywords) and set(old.exclude) <= set(new.exclude)
+
+
+# --- IN-MEMORY NARROWING ---
+def _rating(row: Dict[str, Any]) -> float:
+    try:
+        return float(row.get("rating") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _start(row: Dict[str, Any]) -> Optional[datetime]:
+    value = row.get("event_start")
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return value
+
+
+def matches(spec: FilterSpec, row: Dict[str, Any], today: Optional[date] = None) -> bool:
+    """Whether a stored row meets the spec's dates, categories, keywords and rating.
+
+    Location isn't checked: ``narrows`` only allows the same one.
+    """
+    start = _start(row)
+    if start is None or start.date() < (spec.start or today or date.today()):
+        return False
+    if spec.end is not None and start.date() >= spec.end:
+        return False
+    if spec.category_ids and row.get("category_id") not in spec.category_ids:
+        return False
+    text = f"{row.get('title') or ''} {row.get('about') or ''}".lower()
+    if any(word.lower() not in text for word in spec.keywords):
+        return False
+    if any(word.lower() in text for word in spec.exclude):
+        return False
+    return spec.min_rating is None or _rating(row) >= spec.min_rating
+
+
+def narrow_rows(spec: FilterSpec, rows: Iterable[Dict[str, Any]],
+                today: Optional[date] = None) -> List[Dict[str, Any]]:
+    """The rows that match ``spec``, in its sort order."""
+    kept = [row for row in rows if matches(spec, row, today)]
+    # Keyword searches come back ranked, so date order is restored rather than assumed
+    kept.sort(key=lambda row: (_start(row) or datetime.min, row.get("id") or 0))
+    if spec.sort == "rating":
+        kept.sort(key=lambda row: -_rating(row))  # stable: date order breaks ties
+    return kept[:spec.limit] if spec.limit else kept
+
+
+# --- SESSION STORE ---
+class SessionStore:
+    """Each sender's last search, LRU-bounded to ``max_entries`` and expiring after ``ttl`` seconds."""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 1800.0, max_rows: int = 10) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._sessions: "OrderedDict[str, Tuple[Session, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.refined_in_memory = 0
+        self.refined_by_query = 0
+
+    def get(self, sender_id: str) -> Optional[Session]:
+        with self._lock:
+            entry = self._sessions.get(sender_id)
+            if entry is None or time.time() - entry[1] > self.ttl:
+                if entry is not None:
+                    del self._sessions[sender_id]
+                self.misses += 1
+                return None
+            self._sessions.move_to_end(sender_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, sender_id: str, spec: FilterSpec, origin: Optional[Tuple[float, float]],
+            rows: List[Dict[str, Any]], complete: bool) -> None:
+        if len(rows) > self.max_rows:
+            rows, complete = rows[:self.max_rows], False
+        with self._lock:
+            self._sessions[sender_id] = (Session(spec, origin, list(rows), complete), time.time())
+            self._sessions.move_to_end(sender_id)
+            self.stores += 1
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+
+    def drop(self, sender_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(sender_id, None)
+
+    def refinement(self, sender_id: str, text: str,
+                   origin: Optional[Tuple[float, float]] = None) -> Optional[Tuple[Session, Refinement]]:
+        """The sender's session and the refinement ``text`` asks for, if it is a follow-up."""
+        if not is_follow_up(text):
+            return None
+        session = self.get(sender_id)
+        if session is None:
+            return None
+        spec = refine(session.spec, text, origin or session.origin)
+        if spec is None:
+            return None
+        refinement = Refinement(spec, session.complete and narrows(session.spec, spec))
+        with self._lock:
+            if refinement.narrows:
+                self.refined_in_memory += 1
+            else:
+                self.refined_by_query += 1
+        return session, refinement
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "refined_in_memory": self.refined_in_memory,
+                "refined_by_query": self.refined_by_query,
+            }
@@ -0,0 +1,357 @@
+"""Event locations: a bundled city gazetteer and an in-process grid index over lat/long.
+
+City questions ("concerts in Mumbai", "art near Pune") and "near me within
+5 km" questions (when the client sends the user's coordinates) become a
+``LocationFilter``: a centre point and a radius. ``GeoIndex`` turns the
+filter into the ids of events within that radius, which the rule SQL
+uses as ``id IN (...)`` and the snapshot uses as an id mask. With too
+many matches to list, the filter becomes the lat/long bounding box of the
+radius (plus the city's ``address LIKE`` for rows without coordinates).
+When the index can't answer at all (not loaded yet or stale), it falls
+back to ``address LIKE`` for a city and to the bounding box otherwise.
+
+The index is a uniform grid of lat/long cells, not a KD-tree, so new
+events are a dict insert and need no rebuild. A radius query only reads
+the cells that overlap its bounding box. Like EventSnapshot, it pulls new
+rows past an ``id`` watermark and reloads fully every ``full_refresh``
+seconds. Events with no coordinates (NULL, empty or 0, 0) are placed at
+the centre of the gazetteer city named in their address, or left out.
+"""
+import logging
+import math
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+
+class Place(NamedTuple):
+    lat: float
+    lon: float
+    radius_km: float  # how far from the centre still counts as "in" the place
+
+
+# --- GAZETTEER ---
+# Every city in actions.vocab.CITIES; radius covers the metro area (all of Goa and Malta)
+GAZETTEER: Dict[str, Place] = {
+    "delhi": Place(28.6139, 77.2090, 25),
+    "new delhi": Place(28.6139, 77.2090, 25),
+    "mumbai": Place(19.0760, 72.8777, 25),
+    "bangalore": Place(12.9716, 77.5946, 25),
+    "bengaluru": Place(12.9716, 77.5946, 25),
+    "pune": Place(18.5204, 73.8567, 20),
+    "hyderabad": Place(17.3850, 78.4867, 25),
+    "kolkata": Place(22.5726, 88.3639, 20),
+    "chennai": Place(13.0827, 80.2707, 20),
+    "lucknow": Place(26.8467, 80.9462, 15),
+    "jaipur": Place(26.9124, 75.7873, 15),
+    "goa": Place(15.2993, 74.1240, 60),
+    "ahmedabad": Place(23.0225, 72.5714, 20),
+    "chandigarh": Place(30.7333, 76.7794, 15),
+    "malta": Place(35.9375, 14.3754, 30),
+}
+
+_CITY_WORDS = "|".join(re.escape(c) for c in sorted(GAZETTEER, key=len, reverse=True))
+_RADIUS = r"within\s+(\d+(?:\.\d+)?)\s*(?:km|kms|kilometers|kilometres)"
+_NEAR_CITY = re.compile(
+    rf"\b(?:{_RADIUS}\s+(?:of|from|around)|near|around|close\s+to)\s+({_CITY_WORDS})\b"
+)
+_NEAR_ME = re.compile(
+    rf"\b(?:(?:near|around|close\s+to)\s+(?:me|here)|nearby)(?:\s+{_RADIUS})?"
+    rf"|\b{_RADIUS}(?:\s+(?:of|from)\s+(?:me|here))?"
+)
+_CITY = re.compile(rf"\b(?:(?:in|at)\s+)?({_CITY_WORDS})\b")
+
+
+class LocationFilter(NamedTuple):
+    lat: float
+    lon: float
+    radius_km: float
+    city: Optional[str] = None  # gazetteer name when the question named a city
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((p2 - p1) / 2) ** 2
+         + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat: float, lon: float, km: float) -> Tuple[float, float, float, float]:
+    """``(min_lat, max_lat, min_lon, max_lon)`` enclosing the circle of ``km`` around a point."""
+    dlat = km / KM_PER_DEGREE
+    dlon = km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+
+def geocode_address(address: Optional[str]) -> Optional[Place]:
+    """Centre of the gazetteer city named in a free-text address."""
+    if not address:
+        return None
+    found = _CITY.search(address.lower())
+    return GAZETTEER[found.group(1)] if found else None
+
+
+def parse_origin(value: Any) -> Optional[Tuple[float, float]]:
+    """The user's ``(lat, lon)`` from ``{"lat": .., "lon"/"lng"/"long": ..}`` or ``[lat, lon]``."""
+    try:
+        if isinstance(value, dict):
+            lat = value.get("lat", value.get("latitude"))
+            lon = next((value[k] for k in ("lon", "lng", "long", "longitude") if k in value), None)
+        elif isinstance(value, (list, tuple)) and len(value) == 2:
+            lat, lon = value
+        else:
+            return None
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def match_location(text: str, origin: Optional[Tuple[float, float]] = None,
+                   near_km: float = 10.0) -> Tuple[Optional[LocationFilter], str]:
+    """The first location in ``text`` and the text with that phrase removed.
+
+    "near me"/"within N km" need ``origin``; without it they are left in
+    the text, for the model to deal with.
+    """
+    lowered = text.lower()
+    found = _NEAR_CITY.search(lowered)
+    if found:
+        km, city = found.group(1), found.group(2)
+        place = GAZETTEER[city]
+        location = LocationFilter(place.lat, place.lon,
+                                  float(km) if km else place.radius_km + near_km, city)
+    elif origin is not None and _NEAR_ME.search(lowered):
+        found = _NEAR_ME.search(lowered)
+        km = next((g for g in found.groups() if g), None)
+        location = LocationFilter(origin[0], origin[1], float(km) if km else near_km)
+    else:
+        found = _CITY.search(lowered)
+        if not found:
+            return None, text
+        place = GAZETTEER[found.group(1)]
+        location = LocationFilter(place.lat, place.lon, place.radius_km, found.group(1))
+    return location, " ".join(f"{text[:found.start()]} {text[found.end():]}".split())
+
+
+def extract_location(text: str, origin: Optional[Tuple[float, float]] = None,
+                     near_km: float = 10.0) -> Optional[LocationFilter]:
+    return match_location(text, origin, near_km)[0]
+
+
+def bbox_sql(location: LocationFilter) -> str:
+    min_lat, max_lat, min_lon, max_lon = bounding_box(location.lat, location.lon, location.radius_km)
+    return (f"lat BETWEEN {min_lat:.6f} AND {max_lat:.6f} "
+            f"AND `long` BETWEEN {min_lon:.6f} AND {max_lon:.6f}")
+
+
+def address_sql(city: str, params: Optional[List[Any]] = None) -> str:
+    if params is not None:
+        params.append(f"%{city.title()}%")
+        return "address LIKE %s"
+    return f"address LIKE '%{city.title()}%'"
+
+
+def location_sql(location: LocationFilter, index: Optional["GeoIndex"] = None,
+                 params: Optional[List[Any]] = None) -> str:
+    """WHERE predicate for a location: the index's id set when it can answer, else the
+    bounding box (or a city's address match while the index isn't loaded).
+
+    With ``params`` the address pattern is appended to it and the predicate
+    uses a ``%s`` placeholder, for parameterized queries.
+    """
+    if index is not None:
+        ids = index.ids_within(location)
+        if ids is not None and len(ids) <= index.max_ids:
+            return f"id IN ({', '.join(map(str, sorted(ids)))})" if ids else "FALSE"
+        if ids is not None:
+            # Too many to list: the box still uses the coordinates; the index placed
+            # rows without any at their address's city, so match those by address
+            if not location.city:
+                return bbox_sql(location)
+            return f"({bbox_sql(location)} OR ((lat IS NULL OR lat = 0) AND {address_sql(location.city, params)}))"
+    if location.city:
+        return address_sql(location.city, params)
+    return bbox_sql(location)
+
+
+# --- GRID INDEX ---
+class GridIndex:
+    """Points bucketed into ``cell_deg`` x ``cell_deg`` lat/long cells (not thread-safe)."""
+
+    def __init__(self, cell_deg: float = 0.1) -> None:
+        self.cell_deg = cell_deg
+        self._cells: Dict[Tuple[int, int], Dict[int, Tuple[float, float]]] = {}
+        self._where: Dict[int, Tuple[int, int]] = {}
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def add(self, key: int, lat: float, lon: float) -> None:
+        self.remove(key)
+        cell = self._cell(lat, lon)
+        self._cells.setdefault(cell, {})[key] = (lat, lon)
+        self._where[key] = cell
+
+    def remove(self, key: int) -> None:
+        cell = self._where.pop(key, None)
+        if cell is not None:
+            points = self._cells[cell]
+            del points[key]
+            if not points:
+                del self._cells[cell]
+
+    def within(self, lat: float, lon: float, km: float) -> List[Tuple[float, int]]:
+        """``(distance_km, key)`` for every point within ``km``, nearest first."""
+        min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, km)
+        (lo_i, lo_j), (hi_i, hi_j) = self._cell(min_lat, min_lon), self._cell(max_lat, max_lon)
+        found = []
+        if (hi_i - lo_i + 1) * (hi_j - lo_j + 1) > len(self._cells):
+            cells = (points for (i, j), points in self._cells.items()
+                     if lo_i <= i <= hi_i and lo_j <= j <= hi_j)
+        else:
+            cells = (self._cells.get((i, j)) for i in range(lo_i, hi_i + 1) for j in range(lo_j, hi_j + 1))
+        for points in cells:
+            for key, (plat, plon) in (points or {}).items():
+                distance = haversine_km(lat, lon, plat, plon)
+                if distance <= km:
+                    found.append((distance, key))
+        found.sort()
+        return found
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._where
+
+
+# --- EVENT LOCATIONS ---
+class GeoIndex:
+    """GridIndex of event ids, kept in step with the `events` table."""
+
+    def __init__(self, fetch: Callable[[str, Optional[tuple]], List[Dict[str, Any]]],
+                 max_age: float = 300.0, full_refresh: float = 3600.0,
+                 cell_deg: float = 0.1, max_ids: int = 500) -> None:
+        self._fetch = fetch
+        self.max_age = max_age
+        self.full_refresh = full_refresh
+        self.cell_deg = cell_deg
+        self.max_ids = max_ids
+
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._grid = GridIndex(cell_deg)
+        self._watermark = 0
+        self._loaded_at = 0.0
+        self._refreshed_at = 0.0
+
+        self.geocoded = 0
+        self.unplaced = 0
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def _points(self, rows: Iterable[Dict[str, Any]]) -> List[Tuple[int, float, float, bool]]:
+        points = []
+        for row in rows:
+            try:
+                lat, lon = float(row["lat"]), float(row["long"])
+                geocoded = False
+            except (TypeError, ValueError, KeyError):
+                lat = lon = 0.0
+            # 0, 0 is a form left blank, not the Gulf of Guinea
+            if (lat, lon) == (0.0, 0.0) or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                place = geocode_address(row.get("address"))
+                if place is None:
+                    continue
+                lat, lon, geocoded = place.lat, place.lon, True
+            points.append((int(row["id"]), lat, lon, geocoded))
+        return points
+
+    def refresh(self, full: bool = False) -> int:
+        """Index rows past the watermark (or everything when ``full``); returns rows read."""
+        if not self._refreshing.acquire(blocking=False):
+            return 0  # another thread is already refreshing
+        try:
+            full = full or not self._loaded_at or time.time() - self._loaded_at > self.full_refresh
+            watermark = 0 if full else self._watermark
+            rows = self._fetch(
+                "SELECT id, lat, `long`, address FROM events WHERE id > %s ORDER BY id", (watermark,)
+            )
+            points = self._points(rows)
+            geocoded = sum(1 for p in points if p[3])
+            if full:
+                grid = GridIndex(self.cell_deg)
+                for key, lat, lon, _ in points:
+                    grid.add(key, lat, lon)
+            with self._lock:
+                if full:
+                    self._grid = grid
+                    self.geocoded, self.unplaced = geocoded, len(rows) - len(points)
+                    self._loaded_at = time.time()
+                else:
+                    for key, lat, lon, _ in points:
+                        self._grid.add(key, lat, lon)
+                    self.geocoded += geocoded
+                    self.unplaced += len(rows) - len(points)
+                if full or rows:
+                    self._watermark = int(rows[-1]["id"]) if rows else 0
+                self._refreshed_at = time.time()
+                self.refreshes += 1
+            logger.debug("Geo index %s refresh: %d row(s)", "full" if full else "incremental", len(rows))
+            return len(rows)
+        finally:
+            self._refreshing.release()
+
+    def refresh_in_background(self) -> None:
+        if self._refreshing.locked():
+            return
+
+        def run():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Geo index refresh failed")
+
+        threading.Thread(target=run, name="geo-index-refresh", daemon=True).start()
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._loaded_at)
+
+    @property
+    def stale(self) -> bool:
+        return not self.ready or time.time() - self._refreshed_at > self.max_age
+
+    def ids_within(self, location: LocationFilter) -> Optional[List[int]]:
+        """Event ids within the filter's radius, nearest first; None if the index can't answer."""
+        if self.stale:
+            self.misses += 1
+            if self.ready:
+                self.refresh_in_background()
+            return None
+        with self._lock:
+            found = self._grid.within(location.lat, location.lon, location.radius_km)
+        self.hits += 1
+        return [key for _, key in found]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "events": len(self._grid),
+            "geocoded": self.geocoded,
+            "unplaced": self.unplaced,
+            "watermark": self._watermark,
+            "age_seconds": round(time.time() - self._refreshed_at, 1) if self._refreshed_at else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+        }
@@ -0,0 +1,410 @@
+"""Governed OpenAI chat completions.
+
+Every GPT call goes through a governor that applies, in order:
+
+1. a circuit breaker: after ``failure_threshold`` consecutive failed calls
+   (a call that used up its retries counts once), calls fail fast with CircuitOpenError for ``reset_after`` seconds, then
+   a single probe is let through to test the API again;
+2. a token bucket of ``rate`` requests/second (bursts up to ``burst``);
+3. at most ``max_in_flight`` requests at once;
+4. a deadline of ``timeout`` seconds for the whole call, retries included.
+   Rate limits, 5xx errors, timeouts and connection errors are retried
+   ``retries`` times with full-jitter exponential backoff;
+5. optional hedging: if an attempt has no answer after ``hedge_after``
+   seconds and the bucket has a spare token, the same request is sent again
+   and the first answer wins.
+
+When the API can't answer in time, callers get LLMUnavailable and degrade
+(rule-based SQL, cached answers) instead of showing a raw error. Other API
+errors, such as a bad request, are raised unchanged. LLMGovernor wraps the
+AsyncOpenAI client. ThreadedLLMGovernor applies the same policy to the
+sync client used by the trial Flask apps.
+
+The OpenAI clients should be created with ``max_retries=0``, so that
+retries happen only here.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+import openai
+
+RETRIABLE = (
+    openai.RateLimitError,
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.InternalServerError,
+    asyncio.TimeoutError,
+    TimeoutError,
+)
+
+
+class LLMUnavailable(RuntimeError):
+    """The model couldn't answer within the call's deadline and limits."""
+
+
+class CircuitOpenError(LLMUnavailable):
+    pass
+
+
+def settings_from_env() -> Dict[str, Any]:
+    """Governor keyword arguments from LLM_* environment variables."""
+    hedge_after = os.getenv("LLM_HEDGE_AFTER")
+    return {
+        "rate": float(os.getenv("LLM_RATE", "5")),
+        "burst": int(os.getenv("LLM_BURST", "10")),
+        "max_in_flight": int(os.getenv("LLM_MAX_IN_FLIGHT", "8")),
+        "timeout": float(os.getenv("LLM_TIMEOUT", "20")),
+        "retries": int(os.getenv("LLM_RETRIES", "2")),
+        "hedge_after": float(hedge_after) if hedge_after else None,
+        "failure_threshold": int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+        "reset_after": float(os.getenv("LLM_BREAKER_RESET", "30")),
+    }
+
+
+# --- RATE LIMIT ---
+class TokenBucket:
+    """Thread-safe token bucket; ``rate`` <= 0 disables it."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Take a token now; returns how many seconds to wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def try_take(self) -> bool:
+        """Take a token only if one is available right now."""
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def refund(self) -> None:
+        if self.rate > 0:
+            with self._lock:
+                self._tokens = min(self.burst, self._tokens + 1)
+
+
+# --- CIRCUIT BREAKER ---
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_after: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_after:
+                self._state = self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go out; while half-open only one probe at a time does."""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.OPEN:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            # a probe that never reported back (cancelled) doesn't block the next one forever
+            if self._probe_at is None or now - self._probe_at >= self.reset_after:
+                self._probe_at = now
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_at = None
+
+    def failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_at = None
+
+
+# --- GOVERNORS ---
+class _Governor:
+    def __init__(self, client: Callable[[], Any], name: str = "openai", rate: float = 5.0,
+                 burst: int = 10, max_in_flight: int = 8, timeout: float = 20.0, retries: int = 2,
+                 backoff: float = 0.5, max_backoff: float = 8.0, hedge_after: Optional[float] = None,
+                 failure_threshold: int = 5, reset_after: float = 30.0) -> None:
+        self.client = client
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_after)
+        self._rng = random.Random()
+        self.calls = 0
+        self.attempts = 0
+        self.retried = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.throttled = 0
+        self.short_circuited = 0
+        self.unavailable = 0
+
+    def _create(self) -> Callable[..., Any]:
+        return self.client().chat.completions.create
+
+    def _delay(self, attempt: int) -> float:
+        return self._rng.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+
+    def _admit(self) -> float:
+        """Circuit check for a new call; returns when it started."""
+        self.calls += 1
+        if not self.breaker.allow():
+            self.short_circuited += 1
+            raise CircuitOpenError(f"{self.name}: circuit open after repeated failures")
+        return time.monotonic()
+
+    def _give_up(self, attempt: int, deadline: float) -> Optional[float]:
+        """After a retriable failure: the backoff before the next attempt, or None to stop."""
+        delay = self._delay(attempt)
+        if attempt > self.retries or self.breaker.state == CircuitBreaker.OPEN \
+                or time.monotonic() + delay >= deadline:
+            return None
+        self.retried += 1
+        return delay
+
+    def _unavailable(self, error: BaseException) -> LLMUnavailable:
+        """The call has failed for good: one breaker failure, however many attempts it made."""
+        self.unavailable += 1
+        self.breaker.failure()
+        if self.breaker.state == CircuitBreaker.OPEN:
+            return CircuitOpenError(f"{self.name}: circuit open ({type(error).__name__})")
+        return LLMUnavailable(f"{self.name} unavailable: {type(error).__name__}: {error}")
+
+    def _throttled(self, why: str) -> LLMUnavailable:
+        self.throttled += 1
+        self.unavailable += 1
+        return LLMUnavailable(f"{self.name}: {why}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "state": self.breaker.state,
+            "open": int(self.breaker.state != CircuitBreaker.CLOSED),
+            "breaker_opened": self.breaker.opened,
+            "calls": self.calls,
+            "attempts": self.attempts,
+            "retried": self.retried,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "throttled": self.throttled,
+            "short_circuited": self.short_circuited,
+            "unavailable": self.unavailable,
+        }
+
+
+class LLMGovernor(_Governor):
+    """Governs ``client().chat.completions.create`` on an AsyncOpenAI client."""
+
+    def __init__(self, client: Callable[[], Any], **kwargs: Any) -> None:
+        super().__init__(client, **kwargs)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def chat(self, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        """``chat.completions.create(**kwargs)`` under the policy; raises LLMUnavailable."""
+        deadline = self._admit() + (timeout or self.timeout)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await self._attempt(deadline, kwargs)
+            except LLMUnavailable:
+                raise
+            except RETRIABLE as e:
+                delay = self._give_up(attempt, deadline)
+                if delay is None:
+                    raise self._unavailable(e) from e
+                await asyncio.sleep(delay)
+                continue
+            except openai.APIStatusError:
+                self.breaker.success()  # the API is up; the request itself was refused
+                raise
+            self.breaker.success()
+            return response
+
+    async def _attempt(self, deadline: float, kwargs: Dict[str, Any]) -> Any:
+        wait_for_token = self.bucket.reserve()
+        if time.monotonic() + wait_for_token >= deadline:
+            self.bucket.refund()
+            raise self._throttled("rate limit leaves no time before the deadline")
+        if wait_for_token:
+            await asyncio.sleep(wait_for_token)
+
+        loop = asyncio.get_running_loop()
+        if self._slots_loop is not loop:  # one limiter per event loop (benchmarks run several)
+            self._slots, self._slots_loop = asyncio.Semaphore(self.max_in_flight), loop
+        slots = self._slots
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            raise self._throttled("too many requests in flight") from None
+        try:
+            return await self._race(deadline, kwargs)
+        finally:
+            slots.release()
+
+    async def _race(self, deadline: float, kwargs: Dict[str, Any]) -> Any:
+        """One attempt, plus a hedge if it is slow; the first answer wins."""
+        create = self._create()
+
+        def launch() -> asyncio.Future:
+            self.attempts += 1
+            remaining = max(deadline - time.monotonic(), 0.001)
+            return asyncio.ensure_future(create(**kwargs, timeout=remaining))
+
+        first = launch()
+        pending = {first}
+        try:
+            if self.hedge_after is not None and time.monotonic() + self.hedge_after < deadline:
+                done, _ = await asyncio.wait(pending, timeout=self.hedge_after)
+                if not done and self.bucket.try_take():
+                    self.hedged += 1
+                    pending.add(launch())
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(deadline - time.monotonic(), 0), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    if task.cancelled():
+                        continue  # cancelled from outside; exception() would raise CancelledError
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error or asyncio.TimeoutError()
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+class ThreadedLLMGovernor(_Governor):
+    """Governs ``client().chat.completions.create`` on a sync OpenAI client."""
+
+    def __init__(self, client: Callable[[], Any], **kwargs: Any) -> None:
+        super().__init__(client, **kwargs)
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+        if self.hedge_after is not None:
+            self._hedge_pool = ThreadPoolExecutor(max_workers=self.max_in_flight * 2,
+                                                  thread_name_prefix=f"{self.name}-hedge")
+
+    def chat(self, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        """``chat.completions.create(**kwargs)`` under the policy; raises LLMUnavailable."""
+        deadline = self._admit() + (timeout or self.timeout)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = self._attempt(deadline, kwargs)
+            except LLMUnavailable:
+                raise
+            except RETRIABLE as e:
+                delay = self._give_up(attempt, deadline)
+                if delay is None:
+                    raise self._unavailable(e) from e
+                time.sleep(delay)
+                continue
+            except openai.APIStatusError:
+                self.breaker.success()
+                raise
+            self.breaker.success()
+            return response
+
+    def _attempt(self, deadline: float, kwargs: Dict[str, Any]) -> Any:
+        wait_for_token = self.bucket.reserve()
+        if time.monotonic() + wait_for_token >= deadline:
+            self.bucket.refund()
+            raise self._throttled("rate limit leaves no time before the deadline")
+        if wait_for_token:
+            time.sleep(wait_for_token)
+        if not self._slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            raise self._throttled("too many requests in flight")
+        try:
+            return self._race(deadline, kwargs)
+        finally:
+            self._slots.release()
+
+    def _race(self, deadline: float, kwargs: Dict[str, Any]) -> Any:
+        create = self._create()
+
+        def call() -> Any:
+            return create(**kwargs, timeout=max(deadline - time.monotonic(), 0.001))
+
+        self.attempts += 1
+        if self._hedge_pool is None or time.monotonic() + self.hedge_after >= deadline:
+            return call()
+
+        # a losing attempt is left to finish on its own; it is bounded by the deadline
+        first = self._hedge_pool.submit(call)
+        pending = {first}
+        done, _ = wait(pending, timeout=self.hedge_after)
+        if not done and self.bucket.try_take():
+            self.hedged += 1
+            self.attempts += 1
+            pending.add(self._hedge_pool.submit(call))
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError()
+            for future in done:
+                if future.cancelled():
+                    continue
+                if future.exception() is None:
+                    if future is not first:
+                        self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error or TimeoutError()
@@ -0,0 +1,254 @@
+"""Occurrences of recurring events, expanded once into a sorted interval index.
+
+`date_time` (and the indexed `event_start`) only hold an event's first
+start. A recurring event (``recurring = 1``) also happens on its
+``weekdays`` (JSON names, "Mon".."Sun"), in the ``selected_weeks`` of the
+month (1-5) when given, until ``end_date`` or indefinitely with
+``all_time``. Any event can also list extra ``dates``. Expanding that in
+SQL means a calendar join on every query, so it's done here once.
+
+OccurrenceIndex keeps every occurrence as one int64 key,
+``minutes since the epoch << 32 | event id``, in a sorted NumPy array. A
+one-off event is a single key. A date range, optionally past a keyset
+position ``(start, id)``, is then two binary searches and a slice, already
+in (event_start, id) order. Open-ended rules are expanded over a rolling
+window, ``lookback_days`` before today to ``horizon_days`` after it.
+``upsert`` and ``remove`` splice single events in and out, and ``advance``
+rolls the window forward by expanding only the new days.
+"""
+import json
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+RECURRENCE_COLUMNS = ("recurring", "end_date", "weekdays", "dates", "all_time", "selected_weeks")
+WEEKDAY_NUMBERS = {name: i for i, name in enumerate(("mon", "tue", "wed", "thu", "fri", "sat", "sun"))}
+
+_ID_BITS = 32
+_ID_MASK = (1 << _ID_BITS) - 1
+
+
+class Recurrence(NamedTuple):
+    repeats: bool = False  # the `recurring` flag; without it only ``dates`` add occurrences
+    weekdays: FrozenSet[int] = frozenset()  # 0 is Monday; empty means the first start's weekday
+    weeks: FrozenSet[int] = frozenset()  # weeks of the month, 1-5; empty means every week
+    until: Optional[date] = None  # last day, inclusive; None is open-ended
+    dates: Tuple[date, ...] = ()  # extra days, at the first start's time
+
+
+# --- PARSING ---
+def _flag(value: Any) -> bool:
+    return str(value).strip().lower() in ("1", "true", "yes")
+
+
+def _json_list(value: Any) -> List[Any]:
+    if value in (None, ""):
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    try:
+        parsed = json.loads(value)
+    except (TypeError, ValueError):
+        parsed = [part for part in str(value).split(",") if part.strip()]
+    return parsed if isinstance(parsed, list) else [parsed]
+
+
+def _day(value: Any) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value or "").strip()[:10]
+    for layout in ("%d/%m/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text, layout).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _weekday(value: Any) -> Optional[int]:
+    if isinstance(value, int) and 0 <= value <= 6:
+        return value
+    return WEEKDAY_NUMBERS.get(str(value).strip().lower()[:3])
+
+
+def parse_recurrence(row: Dict[str, Any]) -> Optional[Recurrence]:
+    """The row's recurrence rule, or None for a one-off event."""
+    repeats = _flag(row.get("recurring"))
+    dates = tuple(sorted({d for d in map(_day, _json_list(row.get("dates"))) if d}))
+    if not repeats and not dates:
+        return None
+    weeks = {int(w) for w in _json_list(row.get("selected_weeks")) if str(w).strip().isdigit()}
+    return Recurrence(
+        repeats=repeats,
+        weekdays=frozenset(w for w in map(_weekday, _json_list(row.get("weekdays"))) if w is not None),
+        weeks=frozenset(w for w in weeks if 1 <= w <= 5),
+        until=None if _flag(row.get("all_time")) else _day(row.get("end_date")),
+        dates=dates,
+    )
+
+
+# --- EXPANSION ---
+def expand(first: datetime, rule: Recurrence, start: date, end: date) -> List[datetime]:
+    """Starts of the rule's occurrences on days in [start, end), besides ``first`` itself."""
+    days = {d for d in rule.dates if start <= d < end}
+    if rule.repeats:
+        last = end if rule.until is None else min(end, rule.until + timedelta(days=1))
+        begin = max(start, first.date())
+        for weekday in rule.weekdays or {first.weekday()}:
+            day = begin + timedelta(days=(weekday - begin.weekday()) % 7)
+            while day < last:
+                if not rule.weeks or (day.day - 1) // 7 + 1 in rule.weeks:
+                    days.add(day)
+                day += timedelta(days=7)
+    days.discard(first.date())
+    at = first.time()
+    return [datetime.combine(d, at) for d in sorted(days)]
+
+
+def _minutes(value: datetime) -> int:
+    return int(value.timestamp()) // 60
+
+
+def occurrence_key(start: datetime, event_id: int = 0) -> int:
+    return (_minutes(start) << _ID_BITS) | int(event_id)
+
+
+def decode(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Epoch seconds and event ids of occurrence keys."""
+    return (keys >> _ID_BITS) * 60, keys & _ID_MASK
+
+
+# --- INDEX ---
+class OccurrenceIndex:
+    """Every event occurrence as a sorted ``(start minute, event id)`` key.
+
+    Writers build new arrays and swap them in, so readers only need the
+    array they picked up.
+    """
+
+    def __init__(self, lookback_days: int = 31, horizon_days: int = 366,
+                 today: Optional[date] = None) -> None:
+        self.lookback_days = lookback_days
+        self.horizon_days = horizon_days
+        self.start, self.end = self._window(today)
+        self._keys = np.empty(0, dtype=np.int64)
+        self._rules: Dict[int, Tuple[datetime, Recurrence]] = {}
+        self._lock = threading.Lock()
+
+    def _window(self, today: Optional[date]) -> Tuple[date, date]:
+        today = today or date.today()
+        return today - timedelta(days=self.lookback_days), today + timedelta(days=self.horizon_days)
+
+    def _event_keys(self, event_id: int, first: datetime, rule: Optional[Recurrence],
+                    start: date, end: date, with_first: bool = True) -> List[int]:
+        keys = [occurrence_key(first, event_id)] if with_first else []
+        if rule is not None:
+            keys.extend(occurrence_key(at, event_id) for at in expand(first, rule, start, end))
+        return keys
+
+    def _merge(self, keys: np.ndarray, new: List[int]) -> np.ndarray:
+        if not new:
+            return keys
+        added = np.sort(np.asarray(new, dtype=np.int64))
+        return np.insert(keys, np.searchsorted(keys, added), added)
+
+    def build(self, events: Iterable[Tuple[int, Optional[datetime], Optional[Recurrence]]],
+              today: Optional[date] = None) -> int:
+        """Replace the index with ``(id, first start, rule)`` events; returns the occurrence count."""
+        start, end = self._window(today)
+        keys: List[int] = []
+        rules: Dict[int, Tuple[datetime, Recurrence]] = {}
+        for event_id, first, rule in events:
+            if first is None:
+                continue  # no time of day to repeat at
+            keys.extend(self._event_keys(event_id, first, rule, start, end))
+            if rule is not None:
+                rules[event_id] = (first, rule)
+        built = np.sort(np.asarray(keys, dtype=np.int64))
+        with self._lock:
+            self.start, self.end = start, end
+            self._keys, self._rules = built, rules
+        return len(built)
+
+    def upsert(self, events: Iterable[Tuple[int, Optional[datetime], Optional[Recurrence]]]) -> int:
+        """Add or replace events' occurrences; returns how many were added."""
+        events = list(events)
+        with self._lock:
+            keys = self._without(self._keys, [event_id for event_id, _, _ in events])
+            new: List[int] = []
+            for event_id, first, rule in events:
+                self._rules.pop(event_id, None)
+                if first is None:
+                    continue
+                new.extend(self._event_keys(event_id, first, rule, self.start, self.end))
+                if rule is not None:
+                    self._rules[event_id] = (first, rule)
+            self._keys = self._merge(keys, new)
+        return len(new)
+
+    def remove(self, ids: Sequence[int]) -> None:
+        with self._lock:
+            self._keys = self._without(self._keys, ids)
+            for event_id in ids:
+                self._rules.pop(event_id, None)
+
+    def _without(self, keys: np.ndarray, ids: Sequence[int]) -> np.ndarray:
+        if not len(ids) or not len(keys):
+            return keys
+        return keys[~np.isin(keys & _ID_MASK, np.asarray(ids, dtype=np.int64))]
+
+    def advance(self, today: Optional[date] = None) -> int:
+        """Roll the window forward to ``today``, expanding only the days it gains; returns keys added.
+
+        Occurrences that fall behind the window stay until the next ``build``.
+        """
+        start, end = self._window(today)
+        with self._lock:
+            if end <= self.end:
+                return 0
+            new: List[int] = []
+            for event_id, (first, rule) in self._rules.items():
+                new.extend(self._event_keys(event_id, first, rule, self.end, end, with_first=False))
+            self._keys = self._merge(self._keys, new)
+            self.start, self.end = start, end
+        return len(new)
+
+    # --- lookups ---
+    def between(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                after: Optional[Tuple[datetime, int]] = None) -> np.ndarray:
+        """Keys of occurrences with ``start <= occurrence < end``, past the keyset position ``after``."""
+        keys = self._keys
+        low = 0 if start is None else int(np.searchsorted(keys, occurrence_key(start)))
+        if after is not None:
+            low = max(low, int(np.searchsorted(keys, occurrence_key(*after), side="right")))
+        high = len(keys) if end is None else int(np.searchsorted(keys, occurrence_key(end)))
+        return keys[low:max(low, high)]
+
+    def recurring_between(self, start: Optional[datetime] = None,
+                          end: Optional[datetime] = None) -> List[int]:
+        """Ids of the recurring events with an occurrence in ``[start, end)``."""
+        rules = self._rules
+        if not rules:
+            return []
+        _, event_ids = decode(self.between(start, end))
+        return [int(i) for i in np.unique(event_ids) if int(i) in rules]
+
+    def next_start(self, event_id: int, first: datetime, after: datetime) -> datetime:
+        """The event's first occurrence at or after ``after`` (``first`` if none is known)."""
+        if first >= after or event_id not in self._rules:
+            return first
+        _, rule = self._rules[event_id]
+        upcoming = [at for at in expand(first, rule, after.date(), self.end) if at >= after]
+        return upcoming[0] if upcoming else first
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "occurrences": len(self._keys),
+            "recurring": len(self._rules),
+            "window_start": self.start.isoformat(),
+            "window_end": self.end.isoformat(),
+        }
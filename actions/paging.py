@@ -0,0 +1,165 @@
+"""Keyset pagination over (event_start, id) for event listings.
+
+A page query keeps the original filter and adds
+``event_start > X OR (event_start = X AND id > N)`` after the last row
+shown, so page N costs the same index range scan as page 1 instead of an
+ever-growing OFFSET. The filter and position travel in a Rasa slot as a
+PageCursor; NextPageCache holds prefetched pages keyed by that cursor.
+
+The slot comes back from the client, so it never carries SQL: the cursor
+holds the filter spec (actions.filters), which is validated and compiled
+again for every page, and ``page_query`` adds the keyset as parameters.
+
+Keyword search results keep their relevance order instead: the cursor
+carries the ranked event ids and each page is a slice of them.
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+PAGE_SIZE = 10
+
+
+class PageCursor(NamedTuple):
+    spec: Optional[str] = None  # spec_json of the listing's filter (actions.filters)
+    after_start: Optional[str] = None  # event_start of the last row shown, ISO format
+    after_id: Optional[int] = None
+    page: int = 1  # page the cursor points at
+    date_filter: Optional[List[Any]] = None  # [start, end, category_id, location, min_rating] when the snapshot can answer
+    ranked: Optional[List[int]] = None  # event ids best first, for keyword search results
+    origin: Optional[List[float]] = None  # the user's [lat, lon], for a "near me" spec
+
+    def encode(self) -> str:
+        return json.dumps(self._asdict(), separators=(",", ":"))
+
+    @classmethod
+    def decode(cls, value: Optional[str]) -> Optional["PageCursor"]:
+        if not value:
+            return None
+        try:
+            return cls(**json.loads(value))
+        except (TypeError, ValueError):
+            return None
+
+    def advance(self, last: Dict[str, Any]) -> "PageCursor":
+        start = last.get("event_start")
+        if isinstance(start, datetime):
+            start = start.isoformat(sep=" ")
+        return self._replace(after_start=start, after_id=int(last["id"]), page=self.page + 1)
+
+
+def ranked_page(cursor: PageCursor, size: int = PAGE_SIZE) -> List[int]:
+    """The ids on the cursor's page of a ranked listing, plus the first id of the next page."""
+    start = (cursor.page - 1) * size
+    return [int(i) for i in (cursor.ranked or [])[start:start + size + 1]]
+
+
+def ranked_query(projection: str, cursor: PageCursor, size: int = PAGE_SIZE) -> Tuple[str, Tuple[Any, ...]]:
+    """One page of a ranked listing, in rank order; ``size + 1`` rows so the caller can tell if more exist."""
+    ids = ranked_page(cursor, size)
+    if not ids:
+        return f"SELECT {projection} FROM events WHERE FALSE", ()
+    marks = ", ".join(["%s"] * len(ids))
+    return (f"SELECT {projection} FROM events WHERE id IN ({marks}) ORDER BY FIELD(id, {marks}) LIMIT %s",
+            (*ids, *ids, size + 1))
+
+
+def page_query(sql: str, params: Iterable[Any], cursor: PageCursor,
+               size: int = PAGE_SIZE) -> Tuple[str, Tuple[Any, ...]]:
+    """The cursor's page of a compiled filter query (``%s`` placeholders, no ORDER BY/LIMIT).
+
+    A compiled query always has a WHERE clause (its ``event_start`` range),
+    so the keyset condition is appended to it, with the keyset values as
+    parameters; ``size + 1`` rows are fetched so the caller can tell if
+    more exist.
+    """
+    params = list(params)
+    if cursor.after_start is not None and cursor.after_id is not None:
+        sql += " AND (event_start > %s OR (event_start = %s AND id > %s))"
+        params += [cursor.after_start, cursor.after_start, int(cursor.after_id)]
+    return f"{sql} ORDER BY event_start, id LIMIT %s", tuple(params + [size + 1])
+
+
+class PageWindow:
+    """Passes through at most ``size`` rows, remembering the last one and whether more exist.
+
+    Wraps a streaming cursor so a page can be rendered without buffering it;
+    with ``keep`` the page's rows are also collected in ``rows``.
+    """
+
+    def __init__(self, rows: Iterable[Dict[str, Any]], size: int = PAGE_SIZE, keep: bool = False) -> None:
+        self._rows = rows
+        self.size = size
+        self.count = 0
+        self.last: Optional[Dict[str, Any]] = None
+        self.has_more = False
+        self.rows: Optional[List[Dict[str, Any]]] = [] if keep else None
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for row in self._rows:
+            if self.count == self.size:
+                self.has_more = True
+                break
+            self.count += 1
+            self.last = row
+            if self.rows is not None:
+                self.rows.append(row)
+            yield row
+
+
+# --- NEXT PAGE PREFETCH ---
+class NextPageCache:
+    """Next pages fetched in the background after a page is sent.
+
+    Entries are asyncio tasks keyed by the encoded cursor, so a "show more"
+    that arrives while the prefetch is still running waits for it instead
+    of querying again. Bounded to ``max_entries`` and ``ttl`` seconds.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300.0) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._tasks: "OrderedDict[str, tuple]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.prefetches = 0
+
+    def prefetch(self, key: str, fetch: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> None:
+        if key in self._tasks:
+            return
+        task = asyncio.ensure_future(fetch())
+        # A failed prefetch just means the next page is fetched on demand
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._tasks[key] = (task, time.time())
+        self.prefetches += 1
+        while len(self._tasks) > self.max_entries:
+            old, _ = self._tasks.popitem(last=False)[1]
+            old.cancel()
+
+    async def take(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """The prefetched rows for ``key``, or None if there are none usable."""
+        entry = self._tasks.pop(key, None)
+        if entry is None or time.time() - entry[1] > self.ttl:
+            if entry is not None:
+                entry[0].cancel()
+            self.misses += 1
+            return None
+        try:
+            rows = await entry[0]
+        except Exception:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return rows
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._tasks),
+            "prefetches": self.prefetches,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
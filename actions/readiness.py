@@ -0,0 +1,118 @@
+"""Warmup bookkeeping and a small readiness/liveness HTTP endpoint.
+
+The action server has no startup hook, so actions.py runs its warmup in a
+background thread when it is imported and reports progress here. A
+container orchestrator (or the Dockerfile HEALTHCHECK) polls ``/ready``,
+which answers 503 until warmup has finished (steps run with ``retry``
+must have succeeded); ``/health`` only says the process is up. When given
+a ``metrics`` callable, ``/metrics`` serves its Prometheus text as well.
+"""
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    def __init__(self, max_backoff: float = 30.0) -> None:
+        self.max_backoff = max_backoff
+        self._steps: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def _record(self, name: str, **fields: Any) -> None:
+        with self._lock:
+            self._steps.setdefault(name, {"status": "pending", "attempts": 0}).update(fields)
+
+    def step(self, name: str, fn: Callable[[], Any], retry: bool = False,
+             backoff: float = 1.0) -> bool:
+        """Run one warmup step; with ``retry`` it is repeated with capped backoff until it works."""
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.monotonic()
+            self._record(name, status="running", attempts=attempt)
+            try:
+                fn()
+            except Exception as e:
+                self._record(name, status="failed", error=str(e),
+                             seconds=round(time.monotonic() - started, 3))
+                if not retry:
+                    logger.warning("Warmup step %s failed: %s", name, e)
+                    return False
+                delay = min(backoff * 2 ** (attempt - 1), self.max_backoff)
+                logger.warning("Warmup step %s failed (%s); retrying in %.1fs", name, e, delay)
+                time.sleep(delay)
+                continue
+            self._record(name, status="ok", error=None, seconds=round(time.monotonic() - started, 3))
+            return True
+
+    def mark_ready(self) -> None:
+        self._ready.set()
+        logger.info("Action server warm: %s", self.status()["steps"])
+
+    def start(self, warmup: Callable[[], None]) -> threading.Thread:
+        def run():
+            try:
+                warmup()
+            except Exception:
+                logger.exception("Warmup failed")
+
+        thread = threading.Thread(target=run, name="actions-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            steps = {name: dict(step) for name, step in self._steps.items()}
+        return {"ready": self.ready, "steps": steps}
+
+    # --- HTTP ---
+    def serve(self, port: int, host: str = "0.0.0.0",
+              metrics: Optional[Callable[[], str]] = None) -> ThreadingHTTPServer:
+        """Serve ``/ready``, ``/health`` and (with ``metrics``) ``/metrics`` on a daemon thread."""
+        readiness = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if metrics is not None and self.path.rstrip("/") == "/metrics":
+                    payload = metrics().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+                if self.path.rstrip("/") == "/ready":
+                    body = readiness.status()
+                    code = 200 if body["ready"] else 503
+                elif self.path.rstrip("/") == "/health":
+                    body, code = {"status": "ok"}, 200
+                else:
+                    body, code = {"error": "not found"}, 404
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass  # probes every few seconds would drown the action server's log
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="readiness-http", daemon=True).start()
+        logger.info("Readiness endpoint on http://%s:%d/ready", host, port)
+        return self._server
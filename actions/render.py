@@ -0,0 +1,107 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from actions.event_start import parse_date_time
+
+ABOUT_LIMIT = 300
+STYLES = ("emoji", "markdown", "plain")
+
+# Only what the renderer (plus ids/categories for paging and filtering) needs;
+# `about` is cut in SQL so long descriptions never leave the database
+RENDER_COLUMNS = ("id", "title", "date_time", "event_start", "address", "link",
+                  "rating", "category_id")
+EVENT_PROJECTION = ", ".join(RENDER_COLUMNS) + f", LEFT(about, {ABOUT_LIMIT + 1}) AS about"
+
+# Date layouts per locale; names are spelled out here rather than taken from
+# setlocale(), which is process-global and not thread-safe
+_MONTH_NAMES = ["January", "February", "March", "April", "May", "June", "July",
+                "August", "September", "October", "November", "December"]
+_WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+LOCALES = {
+    "en_IN": "{wd}, {d} {month} {y}, {h12}:{mi} {ampm}",
+    "en_GB": "{wd} {d} {month} {y}, {h24}:{mi}",
+    "en_US": "{wd}, {month} {d}, {y}, {h12}:{mi} {ampm}",
+    "iso": "{y}-{m:02d}-{d:02d} {h24}:{mi}",
+}
+DEFAULT_LOCALE = "en_IN"
+
+
+def format_datetime(event: Dict[str, Any], locale: str = DEFAULT_LOCALE) -> str:
+    """Human date for an event row, falling back to the raw `date_time` string."""
+    value = event.get("event_start")
+    if not isinstance(value, datetime):
+        value = parse_date_time(event.get("date_time"))
+    if value is None:
+        return event.get("date_time") or "N/A"
+    return LOCALES.get(locale, LOCALES[DEFAULT_LOCALE]).format(
+        wd=_WEEKDAY_NAMES[value.weekday()], d=value.day, m=value.month,
+        month=_MONTH_NAMES[value.month - 1], y=value.year,
+        h24=f"{value.hour:02d}", h12=(value.hour % 12) or 12, mi=f"{value.minute:02d}",
+        ampm="AM" if value.hour < 12 else "PM",
+    )
+
+
+def truncate(text: Optional[str], limit: int = ABOUT_LIMIT) -> str:
+    if not text:
+        return "N/A"
+    text = " ".join(str(text).split())
+    if len(text) <= limit:
+        return text
+    cut = text[:limit].rsplit(" ", 1)[0] or text[:limit]
+    return cut.rstrip(" ,.;:") + "…"
+
+
+def _rating(event: Dict[str, Any]) -> str:
+    rating = event.get("rating")
+    return "N/A" if rating is None else f"{rating}/5"
+
+
+def render_event(event: Dict[str, Any], index: int, style: str = "emoji",
+                 locale: str = DEFAULT_LOCALE, about_limit: int = ABOUT_LIMIT) -> str:
+    title = event.get("title") or "N/A"
+    when = format_datetime(event, locale)
+    where = event.get("address") or "N/A"
+    link = event.get("link")
+    about = truncate(event.get("about"), about_limit)
+
+    if style == "markdown":
+        lines = [f"**{index}. {title}**", f"- **When:** {when}", f"- **Where:** {where}"]
+        if link:
+            lines.append(f"- **Link:** [{link}]({link})")
+        lines += [f"- **Rating:** {_rating(event)}", f"- **About:** {about}"]
+        return "\n".join(lines)
+
+    if style == "plain":
+        lines = [f"{index}. {title}", f"   Date & Time: {when}", f"   Location: {where}"]
+        if link:
+            lines.append(f"   Link: {link}")
+        lines += [f"   Rating: {_rating(event)}", f"   About: {about}"]
+        return "\n".join(lines)
+
+    return (
+        f"📅 *Event {index}*\n"
+        f"• *Title:* {title}\n"
+        f"• *Date & Time:* {when}\n"
+        f"• *Location:* {where}\n"
+        f"• *Link:* {link or 'N/A'}\n"
+        f"• *Rating:* {_rating(event)}\n"
+        f"• *About:* {about}\n"
+    )
+
+
+def iter_rendered(events: Iterable[Dict[str, Any]], style: str = "emoji",
+                  locale: str = DEFAULT_LOCALE, about_limit: int = ABOUT_LIMIT,
+                  start: int = 1) -> Iterator[str]:
+    """Render rows one at a time, so a streaming cursor never has to be buffered."""
+    for i, event in enumerate(events, start=start):
+        yield render_event(event, i, style, locale, about_limit)
+
+
+def render_events(events: Iterable[Dict[str, Any]], style: str = "emoji",
+                  locale: str = DEFAULT_LOCALE, about_limit: int = ABOUT_LIMIT,
+                  empty: str = "no matching events.", start: int = 1) -> str:
+    """Render a list of events; ``start`` numbers the first one (later pages continue on)."""
+    if style not in STYLES:
+        raise ValueError(f"Unknown style {style!r}; expected one of {', '.join(STYLES)}.")
+    text = "\n\n".join(iter_rendered(events, style, locale, about_limit, start))
+    return text or empty
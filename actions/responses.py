@@ -0,0 +1,223 @@
+"""Compact /ask responses: field selection, msgpack, gzip/brotli and ETags.
+
+``compact_responses`` wraps a Flask view that returns a dict (or a dict and
+a status):
+
+* ``"fields": ["formatted"]`` in the request body (or ``?fields=formatted``)
+  keeps only those of ``results``, ``formatted`` and ``sql`` (with its
+  ``params``); messages, errors and status are always sent.
+* ``Accept: application/msgpack`` gets msgpack instead of JSON when the
+  msgpack package is installed.
+* Bodies of ``min_size`` bytes or more are brotli- or gzip-compressed
+  following ``Accept-Encoding`` (brotli only when the package is installed).
+* A successful answer carries a weak ETag built from its result ids and the
+  DataVersion of `events`: its row count and latest `updated_at`, which
+  MySQL bumps on every insert and edit (``python -m actions.event_start
+  migrate`` adds the column). The ETagCache remembers it per request, so a
+  repeat poll with ``If-None-Match`` gets a 304 after one cheap version
+  check, without planning, querying or formatting anything.
+"""
+import functools
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+try:
+    import msgpack
+except ImportError:  # optional: JSON only
+    msgpack = None
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+from actions.telemetry import current_trace, set_path
+
+FIELDS = {"results": ("results",), "formatted": ("formatted",), "sql": ("sql", "params")}
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# A fingerprint of `events`: the count catches deletes, `updated_at` inserts and edits; both use indexes
+DATA_VERSION_SQL = "SELECT COUNT(*) AS events, MAX(updated_at) AS changed_at FROM events"
+
+
+# --- FIELDS ---
+def parse_fields(value: Any) -> Optional[Set[str]]:
+    """Requested fields from a list or a comma-separated string; None means all of them."""
+    if value in (None, "", []):
+        return None
+    names = value.split(",") if isinstance(value, str) else value
+    if not isinstance(names, list):
+        raise ValueError("fields must be a list or a comma-separated string.")
+    fields = {str(name).strip().lower() for name in names if str(name).strip()}
+    unknown = fields - set(FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields {sorted(unknown)}; choose from {sorted(FIELDS)}.")
+    return fields
+
+
+def select_fields(body: Dict[str, Any], fields: Optional[Set[str]]) -> Dict[str, Any]:
+    if fields is None:
+        return body
+    dropped = {key for name, keys in FIELDS.items() if name not in fields for key in keys}
+    return {key: value for key, value in body.items() if key not in dropped}
+
+
+# --- ETAGS ---
+def request_key(path: str, data: Dict[str, Any], args: Iterable[Tuple[str, str]] = ()) -> str:
+    """Identifies a request's answer: its path, JSON body and query string."""
+    raw = json.dumps([path, data, sorted(args)], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def etag_for(key: str, body: Dict[str, Any], version: str) -> str:
+    """Tag for an answer: its result ids, or its text when it has no rows, and the data version."""
+    rows = body.get("results")
+    content = [row.get("id") for row in rows] if rows else [body.get("message"), body.get("formatted")]
+    raw = json.dumps([key, version, content], default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()[:24]
+
+
+class DataVersion:
+    """Fingerprint of the `events` table from ``fetch``, re-read at most every ``ttl`` seconds."""
+
+    def __init__(self, fetch: Callable[[], Any], ttl: float = 5.0) -> None:
+        self._fetch = fetch
+        self.ttl = ttl
+        self._version: Optional[str] = None
+        self._read_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> str:
+        with self._lock:
+            if self._version is None or time.time() - self._read_at > self.ttl:
+                self._version = hashlib.sha1(repr(self._fetch()).encode()).hexdigest()[:16]
+                self._read_at = time.time()
+            return self._version
+
+
+class ETagCache:
+    """The last ETag and data version per request key, LRU-bounded and expiring after ``ttl`` seconds."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._tags: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0  # answered with 304
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def match(self, key: str, version: str, tags: Any) -> Optional[str]:
+        """The stored tag if it is still current and among the client's ``tags``, else None."""
+        with self._lock:
+            entry = self._tags.get(key)
+            if entry is None or time.time() - entry[2] > self.ttl or entry[1] != version \
+                    or not tags.contains_weak(entry[0]):
+                self.misses += 1
+                return None
+            self._tags.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, tag: str, version: str) -> None:
+        with self._lock:
+            self._tags[key] = (tag, version, time.time())
+            self._tags.move_to_end(key)
+            self.stores += 1
+            while len(self._tags) > self.max_entries:
+                self._tags.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._tags),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
+
+
+# --- ENCODING ---
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def _compress(data: bytes, accept_encodings: Any) -> Tuple[bytes, Optional[str]]:
+    if brotli is not None and accept_encodings.quality("br"):
+        return brotli.compress(data, quality=5), "br"
+    if accept_encodings.quality("gzip"):
+        return gzip.compress(data, compresslevel=6), "gzip"
+    return data, None
+
+
+# --- FLASK ---
+def compact_responses(data_version: DataVersion, etags: ETagCache, min_size: int = 512) -> Callable:
+    """Decorate a Flask view returning a dict, or (dict, status), as described in the module docstring."""
+    from flask import current_app, request, Response
+
+    def decorate(view: Callable) -> Callable:
+        @functools.wraps(view)
+        def wrapper(*args: Any, **kwargs: Any) -> Response:
+            data = request.get_json(silent=True) or {}
+            try:
+                fields = parse_fields(data.get("fields") if "fields" in data else request.args.get("fields"))
+            except ValueError as e:
+                return current_app.json.response({"error": str(e)}), 400
+            key = request_key(request.path, data, request.args.items(multi=True))
+
+            try:
+                version = data_version.current()
+            except Exception:
+                current_app.logger.exception("Data version check failed; answering without an ETag")
+                version = None
+            if version is not None and request.if_none_match:
+                tag = etags.match(key, version, request.if_none_match)
+                if tag is not None:
+                    set_path("not_modified")
+                    response = Response(status=304)
+                    response.set_etag(tag, weak=True)
+                    return response
+
+            result = view(*args, **kwargs)
+            body, status = result if isinstance(result, tuple) else (result, 200)
+            tag = None
+            trace = current_trace()
+            # Degraded or rejected answers aren't tagged, so the next poll tries again
+            if status == 200 and version is not None and (trace is None or trace.status == "ok"):
+                tag = etag_for(key, body, version)
+                etags.put(key, tag, version)
+            body = select_fields(body, fields)
+
+            wanted = request.accept_mimetypes.best_match(("application/json",) + MSGPACK_TYPES)
+            if msgpack is not None and wanted in MSGPACK_TYPES:
+                response = Response(msgpack.packb(body, default=_msgpack_default), status=status,
+                                    mimetype="application/msgpack")
+            else:
+                response = current_app.json.response(body)
+                response.status_code = status
+            if len(response.get_data()) >= min_size:
+                data_bytes, encoding = _compress(response.get_data(), request.accept_encodings)
+                if encoding:
+                    response.set_data(data_bytes)
+                    response.headers["Content-Encoding"] = encoding
+            response.vary.update(("Accept", "Accept-Encoding"))
+            if tag is not None:
+                response.set_etag(tag, weak=True)
+                response.headers["Cache-Control"] = "no-cache"
+            return response
+        return wrapper
+    return decorate
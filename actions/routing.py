@@ -0,0 +1,234 @@
+"""Pick the cheapest way to answer each model call from how complex the question is.
+
+``score_query`` reduces an event question to the filters the rule SQL
+understands (date, month, category, location), the words left over and any
+operators (negation, alternatives, superlatives, comparisons). That gives
+one of four tiers:
+
+* ``local``: every word is a filter the rules handle, so no model is needed.
+* ``search``: a few keywords on top of those filters and no operators. The
+  keyword index ranks them (actions.search); when it finds nothing the
+  caller escalates.
+* ``small``: a few extra words, sent to the small fast model.
+* ``large``: several constraints or any operator, sent to the large model.
+
+Routes are named per action (``action_fetch_event_data``, ``ask_sql``,
+``ask_format``, ...). Each route names its scorer and the model for each
+tier. Aliases ``small``/``large`` resolve to MODEL_SMALL/MODEL_LARGE,
+``rules`` means answer locally and ``index`` means keyword search. MODEL_ROUTES (JSON) overrides them, e.g.::
+
+    MODEL_ROUTES='{"ask_format": {"small": "large"}, "ask_info": {"large": "gpt-4.1"}}'
+
+A tier a route doesn't list falls up to the next tier, and every tier ends
+at ``large``, so MODEL_LARGE (gpt-4o by default) must take any request a
+route sends, JSON mode included. Every decision is
+counted in ``amused_model_routes_total`` and model latency goes to
+``amused_model_seconds``, both labelled by route.
+"""
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, NamedTuple, Optional, Tuple
+
+from actions.dates import parse_date_interval
+from actions.geo import match_location
+from actions.sql_cache import normalize_query
+from actions.telemetry import REGISTRY, current_trace
+
+TIERS = ("local", "search", "small", "large")
+LOCAL_TARGETS = ("rules", "index")
+
+# Words that only connect the filters the rules already understand
+STRUCTURE_WORDS = {
+    "in", "on", "at", "of", "this", "next", "coming", "weekend", "week", "month",
+    "today", "tonight", "tomorrow", "between", "and", "from", "to", "till", "until",
+    "weekday", "weekdays", "during",
+}
+# Function words and numerals: never search terms ("show 10 events with music")
+FUNCTION_WORDS = {
+    "with", "by", "about", "an", "my", "i", "we", "us", "our", "want", "wanna", "like",
+    "would", "could", "do", "does", "get", "see", "give", "have", "has", "here", "it",
+    "that", "these", "those", "be", "will", "let", "lets", "know", "looking", "go", "going",
+    "just", "also", "how", "many", "where", "when", "some",
+    "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten", "twenty",
+}
+# Words that make a question more than a conjunction of filters
+OPERATOR_WORDS = {
+    "not", "no", "without", "except", "or", "but", "best", "top", "cheapest",
+    "highest", "lowest", "most", "least", "rated", "above", "below", "over",
+    "under", "more", "less", "than",
+}
+_SLOTS = re.compile(r"\{(date|month|city|category)\}")
+
+REGISTRY.counter("amused_model_routes_total", "Model routing decisions by route, tier and model.")
+REGISTRY.histogram("amused_model_seconds", "Latency of routed model calls.")
+
+
+class Complexity(NamedTuple):
+    score: int
+    tier: str
+    constraints: int
+    operators: int
+    leftovers: int
+    terms: Tuple[str, ...] = ()  # the leftover words, as keywords
+
+
+class Route(NamedTuple):
+    name: str
+    tier: str
+    model: Optional[str]  # None: answer with the rules or the index, no model call
+    complexity: Complexity
+
+
+def _tier(score: int, small_max: int) -> str:
+    return "small" if score <= small_max else "large"
+
+
+def score_query(text: str, small_max: int = 4,
+                origin: Optional[Tuple[float, float]] = None) -> Complexity:
+    """Complexity of an event search: rule filters, leftover words and operators.
+
+    ``origin`` is the user's position; with it, "near me" counts as a filter.
+    """
+    location, rest = match_location(text, origin)
+    key, _, _ = normalize_query(rest)
+    slots = _SLOTS.findall(key)
+    words = _SLOTS.sub(" ", key).split()
+    operators = sum(1 for w in words if w in OPERATOR_WORDS)
+    terms = tuple(w for w in words if not w.isdigit() and w not in OPERATOR_WORDS
+                  and w not in STRUCTURE_WORDS and w not in FUNCTION_WORDS)
+    constraints = len(slots) + (location is not None)
+    if not any(s in ("date", "month") for s in slots) and parse_date_interval(text):
+        constraints += 1  # relative dates ("this weekend") stay in the key as words
+    score = constraints + len(terms) + 3 * operators
+    # The rule SQL takes one filter of each kind; a city left after the location is a second place
+    rule_filters = "city" not in slots and all(slots.count(kind) <= 1 for kind in set(slots))
+    if rule_filters and not operators:
+        if constraints and not terms:
+            tier = "local"
+        elif terms and score <= small_max:
+            tier = "search"
+        else:
+            tier = _tier(score, small_max)
+    else:
+        tier = _tier(score, small_max)
+    return Complexity(score, tier, constraints, operators, len(terms), terms)
+
+
+def score_text(text: str, small_max: int = 4, origin: Optional[Tuple[float, float]] = None) -> Complexity:
+    """Complexity of a free-text question: its length and operators; never local."""
+    words = re.findall(r"[a-z']+", text.lower())
+    operators = sum(1 for w in words if w in OPERATOR_WORDS)
+    score = len(words) // 8 + 3 * operators
+    return Complexity(score, _tier(score, small_max), 0, operators, len(words))
+
+
+def score_fixed(text: str, small_max: int = 4, origin: Optional[Tuple[float, float]] = None) -> Complexity:
+    """Always the small tier, for routes whose difficulty doesn't depend on the text.
+
+    No default route uses it; set ``{"score": "fixed"}`` in MODEL_ROUTES to pin one.
+    """
+    return Complexity(0, "small", 0, 0, 0)
+
+
+SCORERS = {"sql": score_query, "text": score_text, "fixed": score_fixed}
+
+DEFAULT_ROUTES: Dict[str, Dict[str, str]] = {
+    "action_fetch_event_data": {"score": "sql", "local": "rules", "search": "index", "small": "small",
+                                "large": "large"},
+    "action_general_info": {"score": "text", "small": "small", "large": "large"},
+    "ask_sql": {"score": "sql", "local": "rules", "small": "small", "large": "large"},
+    "ask_info": {"score": "text", "small": "small", "large": "large"},
+    # Formatting is scored on the question: long or comparative ones go to the large model
+    "ask_format": {"score": "text", "small": "small", "large": "large"},
+}
+
+
+class ModelRouter:
+    def __init__(self, routes: Optional[Dict[str, Dict[str, str]]] = None,
+                 small_model: str = "gpt-4o-mini", large_model: str = "gpt-4o",
+                 small_max: int = 4) -> None:
+        self.routes = {name: dict(route) for name, route in DEFAULT_ROUTES.items()}
+        for name, route in (routes or {}).items():
+            self.routes.setdefault(name, {"score": "text", "large": "large"}).update(route)
+        for name, route in self.routes.items():
+            if route.get("score", "text") not in SCORERS:
+                raise ValueError(f"Route {name!r} has unknown scorer {route['score']!r}.")
+            if route.get("score", "text") != "sql" and any(t in route.values() for t in LOCAL_TARGETS):
+                raise ValueError(f"Route {name!r} can't be answered locally; only SQL routes can.")
+        self.aliases: Dict[str, Optional[str]] = {"small": small_model, "large": large_model,
+                                                  "rules": None, "index": None}
+        self.small_max = small_max
+        self._lock = threading.Lock()
+        self._decisions: Dict[str, Dict[str, int]] = {}
+
+    def _target(self, route: Dict[str, str], tier: str) -> Tuple[str, str]:
+        """The tier actually used and its model alias or name."""
+        for candidate in TIERS[TIERS.index(tier):]:
+            if candidate in route:
+                return candidate, route[candidate]
+        return "large", "large"
+
+    def route(self, name: str, text: str, origin: Optional[Tuple[float, float]] = None) -> Route:
+        """Score ``text`` for the named route and pick its model, recording the decision."""
+        config = self.routes.get(name) or {"score": "text", "large": "large"}
+        complexity = SCORERS[config.get("score", "text")](text, self.small_max, origin)
+        return self._decide(name, config, complexity.tier, complexity)
+
+    def escalate(self, route: Route) -> Route:
+        """The next tier up, for when ``route`` couldn't answer (e.g. no keyword hits)."""
+        if route.tier == TIERS[-1]:
+            return route
+        config = self.routes.get(route.name) or {"score": "text", "large": "large"}
+        return self._decide(route.name, config, TIERS[TIERS.index(route.tier) + 1], route.complexity)
+
+    def _decide(self, name: str, config: Dict[str, str], tier: str, complexity: Complexity) -> Route:
+        tier, target = self._target(config, tier)
+        model = self.aliases.get(target, target)
+        decision = Route(name, tier, model, complexity)
+
+        REGISTRY.inc("amused_model_routes_total", route=name, tier=tier, model=model or target)
+        with self._lock:
+            counts = self._decisions.setdefault(name, {})
+            counts[tier] = counts.get(tier, 0) + 1
+        trace = current_trace()
+        if trace is not None:
+            trace.attrs.setdefault("routes", {})[name] = {
+                "tier": tier, "model": model, "score": complexity.score,
+            }
+        return decision
+
+    @contextmanager
+    def timed(self, route: Route) -> Iterator[None]:
+        """Record how long the routed model call in this block took."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            REGISTRY.observe("amused_model_seconds", time.perf_counter() - started,
+                             route=route.name, model=route.model or "rules")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            decisions = {name: dict(counts) for name, counts in self._decisions.items()}
+        return {
+            "models": {alias: model for alias, model in self.aliases.items() if model},
+            "small_max": self.small_max,
+            "routes": self.routes,
+            "decisions": decisions,
+        }
+
+
+def router_from_env() -> ModelRouter:
+    routes = json.loads(os.getenv("MODEL_ROUTES") or "{}")
+    if not isinstance(routes, dict):
+        raise ValueError("MODEL_ROUTES must be a JSON object of route name -> {tier: model}.")
+    return ModelRouter(
+        routes,
+        small_model=os.getenv("MODEL_SMALL", "gpt-4o-mini"),
+        large_model=os.getenv("MODEL_LARGE", "gpt-4o"),
+        small_max=int(os.getenv("ROUTER_SMALL_MAX", "4")),
+    )
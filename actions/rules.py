@@ -0,0 +1,79 @@
+"""Rule-based event SQL: date, category and location filters found without the model.
+
+The action server answers date questions directly. ``fallback_sql`` covers
+every filter the rules understand. The model router uses it for simple
+questions, and every /ask surface uses it as a degraded search when GPT
+is unavailable. Locations are cities from the gazetteer or "near me"
+with the user's coordinates; a GeoIndex resolves them to event ids (see
+actions.geo).
+"""
+import re
+from datetime import date
+from typing import NamedTuple, Optional, Tuple
+
+from actions.dates import parse_date_interval
+from actions.event_start import date_range_sql
+from actions.geo import GeoIndex, LocationFilter, extract_location, location_sql
+from actions.render import EVENT_PROJECTION
+from actions.vocab import CATEGORY_IDS, category_for_word
+
+
+class DateFilter(NamedTuple):
+    start: date  # inclusive
+    end: date  # exclusive
+    category_id: Optional[int] = None
+    location: Optional[LocationFilter] = None
+
+
+def extract_category_id(user_query: str) -> Optional[int]:
+    for word in re.findall(r"[a-z]+", user_query.lower()):
+        category = category_for_word(word)
+        if category:
+            return CATEGORY_IDS[category]
+    return None
+
+
+def extract_date_filter(user_query: str,
+                        origin: Optional[Tuple[float, float]] = None) -> Optional[DateFilter]:
+    interval = parse_date_interval(user_query)
+    if not interval:
+        return None
+    return DateFilter(interval.start, interval.end, extract_category_id(user_query),
+                      extract_location(user_query, origin))
+
+
+def date_filter_sql(date_filter: DateFilter, geo: Optional[GeoIndex] = None) -> str:
+    sql = f"SELECT {EVENT_PROJECTION} FROM events WHERE {date_range_sql(date_filter.start, date_filter.end)}"
+    if date_filter.category_id is not None:
+        sql += f" AND category_id = {date_filter.category_id}"
+    if date_filter.location is not None:
+        sql += f" AND {location_sql(date_filter.location, geo)}"
+    return sql
+
+
+def extract_date_sql_from_query(user_query: str) -> str:
+    """Filter query for a rule-based date match, without ORDER BY/LIMIT (paging adds them)."""
+    date_filter = extract_date_filter(user_query)
+    if not date_filter:
+        return ""  # default fallback if no match
+    return date_filter_sql(date_filter)
+
+
+def fallback_sql(user_query: str, today: Optional[date] = None,
+                 origin: Optional[Tuple[float, float]] = None, geo: Optional[GeoIndex] = None) -> str:
+    """Rule-only query for the question's date range (else upcoming events), category
+    and location, without ORDER BY/LIMIT; "" if it mentions none of them."""
+    date_filter = extract_date_filter(user_query, origin)
+    if date_filter:
+        return date_filter_sql(date_filter, geo)
+    category_id = extract_category_id(user_query)
+    location = extract_location(user_query, origin)
+    if category_id is None and location is None:
+        return ""
+    today = today or date.today()
+    sql = f"SELECT {EVENT_PROJECTION} FROM events WHERE event_start >= '{today.isoformat()}'"
+    if category_id is not None:
+        sql += f" AND category_id = {category_id}"
+    if location is not None:
+        sql += f" AND {location_sql(location, geo)}"
+    return sql
@@ -0,0 +1,447 @@
+"""BM25 keyword search over event titles, descriptions and addresses.
+
+Keyword questions ("holi events", "jazz", "hackathon") are ranked from an
+in-process inverted index instead of asking GPT for ``LIKE '%...%'`` scans.
+Title words count ``FIELD_WEIGHTS["title"]`` times, a simple BM25F.
+
+The index is two segments:
+
+* a read-only base segment, saved as one file and loaded with mmap, so
+  startup doesn't re-tokenize the table and the postings stay in the page
+  cache (shared by every process that maps the file);
+* an in-memory delta holding events added since, plus tombstones for base
+  events that were replaced or removed.
+
+``EventSearch`` keeps it in step with `events` like EventSnapshot does.
+New ids past the watermark go into the delta, and once the delta holds
+``compact_after`` events both segments are merged into a new file. A full
+rebuild every ``full_refresh`` seconds picks up edits and deletes.
+
+File layout (little-endian): the 8-byte MAGIC, a uint64 header length and
+a JSON header, then 8-byte aligned sections:
+
+* doc_ids: int64, ascending
+* doc_lens: uint32
+* offsets: int64, one more than the term count
+* post_docs: uint32 doc positions
+* post_tfs: uint16
+* terms: UTF-8, newline-separated and sorted
+
+The header records each section's offset.
+"""
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"AMBM25\x00\x01"
+FIELD_WEIGHTS = {"title": 3, "address": 1, "about": 1}
+STOPWORDS = {
+    "a", "about", "all", "also", "an", "and", "any", "are", "as", "at", "be", "by", "can",
+    "do", "event", "for", "from", "get", "has", "have", "here", "how", "i", "in", "is", "it",
+    "its", "me", "near", "nearby", "of", "on", "or", "our", "please", "show", "so", "that",
+    "the", "their", "there", "this", "to", "us", "was", "we", "what", "when", "where",
+    "which", "will", "with", "you", "your",
+}
+_TOKEN = re.compile(r"[a-z0-9]+")
+_SECTIONS = (("doc_ids", np.int64), ("doc_lens", np.uint32), ("offsets", np.int64),
+             ("post_docs", np.uint32), ("post_tfs", np.uint16))
+
+
+def stem(word: str) -> str:
+    """Light plural stripping, so "concerts" finds "concert" and "parties" finds "party"."""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("sses", "xes", "ches", "shes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return [stem(w) for w in _TOKEN.findall((text or "").lower()) if w not in STOPWORDS and len(w) > 1]
+
+
+def _weighted_terms(fields: Dict[str, Optional[str]]) -> Tuple[Dict[str, int], int]:
+    counts: Dict[str, int] = {}
+    length = 0
+    for field, weight in FIELD_WEIGHTS.items():
+        for term in tokenize(fields.get(field)):
+            counts[term] = counts.get(term, 0) + weight
+            length += weight
+    return counts, length
+
+
+# --- INDEX ---
+class SearchIndex:
+    """Base segment (possibly mmapped) plus an in-memory delta; not thread-safe."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.watermark = 0
+        self.built_at = time.time()
+        self._mmap: Optional[mmap.mmap] = None
+        self._base_ids = np.empty(0, dtype=np.int64)
+        self._base_lens = np.empty(0, dtype=np.uint32)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._post_docs = np.empty(0, dtype=np.uint32)
+        self._post_tfs = np.empty(0, dtype=np.uint16)
+        self._terms: Dict[str, int] = {}
+        self._dead: Optional[np.ndarray] = None
+        self._dead_count = 0
+        self._delta: Dict[str, Dict[int, int]] = {}
+        self._delta_docs: Dict[int, Tuple[Dict[str, int], int]] = {}
+        self._total_len = 0
+
+    # --- updates ---
+    def _base_position(self, doc_id: int) -> Optional[int]:
+        i = int(np.searchsorted(self._base_ids, doc_id))
+        return i if i < len(self._base_ids) and self._base_ids[i] == doc_id else None
+
+    def remove(self, doc_id: int) -> None:
+        entry = self._delta_docs.pop(doc_id, None)
+        if entry is not None:
+            for term in entry[0]:
+                postings = self._delta[term]
+                del postings[doc_id]
+                if not postings:
+                    del self._delta[term]
+            self._total_len -= entry[1]
+        position = self._base_position(doc_id)
+        if position is not None:
+            if self._dead is None:
+                self._dead = np.zeros(len(self._base_ids), dtype=bool)
+            if not self._dead[position]:
+                self._dead[position] = True
+                self._dead_count += 1
+                self._total_len -= int(self._base_lens[position])
+
+    def add(self, doc_id: int, title: Optional[str] = None, about: Optional[str] = None,
+            address: Optional[str] = None) -> None:
+        """Index an event, replacing any earlier version of it."""
+        self.remove(doc_id)
+        counts, length = _weighted_terms({"title": title, "about": about, "address": address})
+        self._delta_docs[doc_id] = (counts, length)
+        for term, tf in counts.items():
+            self._delta.setdefault(term, {})[doc_id] = tf
+        self._total_len += length
+
+    # --- queries ---
+    def __len__(self) -> int:
+        return len(self._base_ids) - self._dead_count + len(self._delta_docs)
+
+    @property
+    def delta_size(self) -> int:
+        return len(self._delta_docs)
+
+    def _base_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        i = self._terms.get(term)
+        if i is None:
+            return self._post_docs[:0], self._post_tfs[:0]
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._post_docs[start:end], self._post_tfs[start:end]
+
+    def search(self, query: str, limit: int = 50,
+               candidates: Optional[Sequence[int]] = None) -> List[Tuple[float, int]]:
+        """``(score, event_id)`` best first; ``candidates`` limits the events considered."""
+        terms = set(tokenize(query))
+        docs_total = len(self)
+        if not terms or not docs_total:
+            return []
+        avgdl = max(self._total_len / docs_total, 1.0)
+        k1, b = self.k1, self.b
+        base_scores: Optional[np.ndarray] = None
+        delta_scores: Dict[int, float] = {}
+
+        for term in terms:
+            docs, tfs = self._base_postings(term)
+            delta = self._delta.get(term, {})
+            df = len(docs) + len(delta)
+            if not df:
+                continue
+            idf = math.log(1 + (docs_total - df + 0.5) / (df + 0.5))
+            if len(docs):
+                if base_scores is None:
+                    base_scores = np.zeros(len(self._base_ids), dtype=np.float32)
+                tf = tfs.astype(np.float32)
+                norm = k1 * (1 - b + b * self._base_lens[docs] / avgdl)
+                base_scores[docs] += idf * tf * (k1 + 1) / (tf + norm)
+            for doc_id, tf in delta.items():
+                norm = k1 * (1 - b + b * self._delta_docs[doc_id][1] / avgdl)
+                delta_scores[doc_id] = delta_scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        allowed = None if candidates is None else np.asarray(candidates, dtype=np.int64)
+        results: List[Tuple[float, int]] = []
+        if base_scores is not None:
+            if self._dead is not None:
+                base_scores[self._dead] = 0
+            if allowed is not None:
+                base_scores[~np.isin(self._base_ids, allowed)] = 0
+            hits = np.flatnonzero(base_scores)
+            top = hits[np.argsort(-base_scores[hits], kind="stable")[:limit]]
+            results = [(float(base_scores[i]), int(self._base_ids[i])) for i in top]
+        if delta_scores:
+            if allowed is not None:
+                keep = set(allowed.tolist())
+                delta_scores = {k: v for k, v in delta_scores.items() if k in keep}
+            results += [(score, doc_id) for doc_id, score in delta_scores.items()]
+        results.sort(key=lambda hit: (-hit[0], hit[1]))
+        return results[:limit]
+
+    # --- persistence ---
+    def save(self, path: str) -> None:
+        """Merge both segments into one file at ``path`` (written atomically)."""
+        live = ~self._dead if self._dead is not None else np.ones(len(self._base_ids), dtype=bool)
+        delta_ids = np.fromiter(self._delta_docs, dtype=np.int64, count=len(self._delta_docs))
+        delta_lens = np.fromiter((v[1] for v in self._delta_docs.values()), dtype=np.uint32,
+                                 count=len(self._delta_docs))
+        doc_ids = np.concatenate([self._base_ids[live], delta_ids])
+        doc_lens = np.concatenate([self._base_lens[live], delta_lens])
+        order = np.argsort(doc_ids, kind="stable")
+        doc_ids, doc_lens = doc_ids[order], doc_lens[order]
+
+        terms = sorted(set(self._terms) | set(self._delta))
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        post_docs: List[np.ndarray] = []
+        post_tfs: List[np.ndarray] = []
+        for i, term in enumerate(terms):
+            docs, tfs = self._base_postings(term)
+            keep = live[docs]
+            ids = self._base_ids[docs[keep]]
+            tfs = tfs[keep]
+            delta = self._delta.get(term)
+            if delta:
+                ids = np.concatenate([ids, np.fromiter(delta, dtype=np.int64, count=len(delta))])
+                tfs = np.concatenate([tfs, np.fromiter((min(v, 65535) for v in delta.values()),
+                                                       dtype=np.uint16, count=len(delta))])
+            post_docs.append(np.searchsorted(doc_ids, ids).astype(np.uint32))
+            post_tfs.append(tfs.astype(np.uint16))
+            offsets[i + 1] = offsets[i] + len(ids)
+
+        sections = {
+            "doc_ids": doc_ids, "doc_lens": doc_lens, "offsets": offsets,
+            "post_docs": np.concatenate(post_docs) if post_docs else np.empty(0, dtype=np.uint32),
+            "post_tfs": np.concatenate(post_tfs) if post_tfs else np.empty(0, dtype=np.uint16),
+        }
+        blob = "\n".join(terms).encode("utf-8")
+        header = {"version": 1, "watermark": self.watermark, "built_at": self.built_at,
+                  "total_len": int(doc_lens.sum()), "terms": len(terms), "terms_bytes": len(blob),
+                  "sections": {}}
+        # Section offsets are relative to the 8-byte aligned end of the header
+        position = 0
+        for name, _ in _SECTIONS:
+            header["sections"][name] = [position, len(sections[name])]
+            position += -(-sections[name].nbytes // 8) * 8
+        header["sections"]["terms"] = [position, len(blob)]
+        encoded = json.dumps(header).encode()
+        data_start = -(-(len(MAGIC) + 8 + len(encoded)) // 8) * 8
+
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC + struct.pack("<Q", len(encoded)) + encoded)
+            f.write(b"\0" * (data_start - f.tell()))
+            for name, _ in _SECTIONS:
+                data = sections[name].tobytes()
+                f.write(data + b"\0" * (-len(data) % 8))
+            f.write(blob)
+        os.replace(tmp, path)  # processes that mapped the old file keep reading it
+
+    @classmethod
+    def load(cls, path: str, k1: float = 1.2, b: float = 0.75) -> "SearchIndex":
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(MAGIC)] != MAGIC:
+            mapped.close()
+            raise ValueError(f"{path} is not a search index file.")
+        (header_len,) = struct.unpack("<Q", mapped[len(MAGIC):len(MAGIC) + 8])
+        header = json.loads(mapped[len(MAGIC) + 8:len(MAGIC) + 8 + header_len])
+        data_start = -(-(len(MAGIC) + 8 + header_len) // 8) * 8
+
+        arrays = {}
+        for name, dtype in _SECTIONS:
+            offset, count = header["sections"][name]
+            arrays[name] = np.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + offset)
+
+        index = cls(k1, b)
+        index._mmap = mapped
+        index._base_ids, index._base_lens = arrays["doc_ids"], arrays["doc_lens"]
+        index._offsets, index._post_docs, index._post_tfs = arrays["offsets"], arrays["post_docs"], arrays["post_tfs"]
+        offset, size = header["sections"]["terms"]
+        blob = mapped[data_start + offset:data_start + offset + size].decode("utf-8")
+        index._terms = {term: i for i, term in enumerate(blob.split("\n"))} if blob else {}
+        index._total_len = header["total_len"]
+        index.watermark = header["watermark"]
+        index.built_at = header["built_at"]
+        return index
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self),
+            "terms": len(self._terms) + sum(1 for t in self._delta if t not in self._terms),
+            "postings": len(self._post_docs),
+            "delta_documents": len(self._delta_docs),
+            "tombstones": self._dead_count,
+            "mmapped": self._mmap is not None,
+        }
+
+
+# --- EVENT SEARCH ---
+class EventSearch:
+    """SearchIndex over `events`, persisted at ``path`` and refreshed past an id watermark."""
+
+    def __init__(self, fetch: Callable[[str, Optional[tuple]], List[Dict[str, Any]]],
+                 path: Optional[str] = None, max_age: float = 300.0, full_refresh: float = 86400.0,
+                 compact_after: int = 5000, batch_size: int = 5000) -> None:
+        self._fetch = fetch
+        self.path = path
+        self.max_age = max_age
+        self.full_refresh = full_refresh
+        self.compact_after = compact_after
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._index: Optional[SearchIndex] = None
+        self._refreshed_at = 0.0
+
+        self.searches = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.compactions = 0
+
+    def _rows_after(self, watermark: int) -> Iterable[List[Dict[str, Any]]]:
+        while True:
+            rows = self._fetch(
+                "SELECT id, title, about, address FROM events WHERE id > %s ORDER BY id LIMIT %s",
+                (watermark, self.batch_size),
+            )
+            if not rows:
+                return
+            yield rows
+            watermark = int(rows[-1]["id"])
+            if len(rows) < self.batch_size:
+                return
+
+    def _persist(self, index: SearchIndex) -> SearchIndex:
+        """Write the index to disk and return its mmapped copy (the index itself without a path)."""
+        if not self.path:
+            return index
+        index.save(self.path)
+        return SearchIndex.load(self.path, index.k1, index.b)
+
+    def load(self) -> bool:
+        """Map the saved index, if there is one; a refresh then only reads newer events."""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            index = SearchIndex.load(self.path)
+        except (OSError, ValueError, KeyError):
+            logger.exception("Ignoring unreadable search index %s", self.path)
+            return False
+        with self._lock:
+            self._index = index
+        logger.info("Loaded search index %s: %d events", self.path, len(index))
+        return True
+
+    def refresh(self, full: bool = False) -> int:
+        """Index events past the watermark (or rebuild when ``full``); returns events read."""
+        if not self._refreshing.acquire(blocking=False):
+            return 0  # another thread is already refreshing
+        try:
+            current = self._index
+            full = full or current is None or time.time() - current.built_at > self.full_refresh
+            if full:
+                index = SearchIndex()
+                count = 0
+                for rows in self._rows_after(0):
+                    for row in rows:
+                        index.add(int(row["id"]), row.get("title"), row.get("about"), row.get("address"))
+                    index.watermark = int(rows[-1]["id"])
+                    count += len(rows)
+                index = self._persist(index)
+                with self._lock:
+                    self._index = index
+            else:
+                count = 0
+                for rows in self._rows_after(current.watermark):
+                    with self._lock:
+                        for row in rows:
+                            current.add(int(row["id"]), row.get("title"), row.get("about"), row.get("address"))
+                        current.watermark = int(rows[-1]["id"])
+                    count += len(rows)
+                if self.path and current.delta_size >= self.compact_after:
+                    # Only this thread changes the index, so it can be written while searches read it
+                    current.save(self.path)
+                    index = SearchIndex.load(self.path, current.k1, current.b)
+                    with self._lock:
+                        self._index = index
+                    self.compactions += 1
+            self._refreshed_at = time.time()
+            self.refreshes += 1
+            logger.debug("Search index %s refresh: %d event(s)", "full" if full else "incremental", count)
+            return count
+        finally:
+            self._refreshing.release()
+
+    def refresh_in_background(self) -> None:
+        if self._refreshing.locked():
+            return
+
+        def run():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Search index refresh failed")
+
+        threading.Thread(target=run, name="search-index-refresh", daemon=True).start()
+
+    @property
+    def ready(self) -> bool:
+        return self._index is not None
+
+    @property
+    def stale(self) -> bool:
+        return not self.ready or time.time() - self._refreshed_at > self.max_age
+
+    def search(self, query: str, limit: int = 50,
+               candidates: Optional[Sequence[int]] = None) -> Optional[List[int]]:
+        """Event ids best first, or None if the index isn't loaded yet.
+
+        A stale index still answers (new events are missing until the
+        background refresh lands); only a missing one sends the caller elsewhere.
+        """
+        if not self.ready:
+            self.misses += 1
+            return None
+        if self.stale:
+            self.refresh_in_background()
+        with self._lock:
+            hits = self._index.search(query, limit, candidates)
+        self.searches += 1
+        return [doc_id for _, doc_id in hits]
+
+    def stats(self) -> Dict[str, Any]:
+        index = self._index
+        return {
+            **(index.stats() if index is not None else {"documents": 0}),
+            "watermark": index.watermark if index is not None else 0,
+            "age_seconds": round(time.time() - self._refreshed_at, 1) if self._refreshed_at else None,
+            "searches": self.searches,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "compactions": self.compactions,
+        }
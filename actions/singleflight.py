@@ -0,0 +1,108 @@
+"""Single-flight request coalescing.
+
+When several callers ask for the same key while a computation for it is
+already running, they wait for that one computation and share its
+result (or its exception) instead of starting their own. Nothing is
+kept once the computation finishes; this is not a cache.
+"""
+import asyncio
+import re
+import threading
+from typing import Any, Awaitable, Callable, Dict
+
+
+def query_key(text: str) -> str:
+    """Normalized form of a user question: lowercase words and numbers only."""
+    return " ".join(re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+
+class _Counters:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.calls = 0
+        self.executions = 0
+        self.collapsed = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "in_flight": len(self._inflight),
+            "calls": self.calls,
+            "executions": self.executions,
+            "collapsed": self.collapsed,
+        }
+
+
+# --- ASYNCIO ---
+class SingleFlight(_Counters):
+    """Coalesces concurrent coroutine calls on one event loop."""
+
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _done(self, key: str, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here so abandoned failures aren't logged as unhandled
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.collapsed += 1
+        # A caller that times out or is cancelled mustn't cancel the shared work
+        return await asyncio.shield(task)
+
+
+# --- THREADS ---
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class ThreadedSingleFlight(_Counters):
+    """Coalesces concurrent blocking calls across threads (e.g. a threaded Flask server)."""
+
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self._inflight: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.calls += 1
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self.executions += 1
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
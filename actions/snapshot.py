@@ -0,0 +1,246 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from actions.event_start import parse_date_time
+from actions.occurrences import RECURRENCE_COLUMNS, OccurrenceIndex, decode, parse_recurrence
+from actions.render import EVENT_PROJECTION
+
+logger = logging.getLogger(__name__)
+
+# Fields kept for rendering, plus the recurrence rule (parsed and dropped on load)
+SNAPSHOT_COLUMNS = f"{EVENT_PROJECTION}, {', '.join(RECURRENCE_COLUMNS)}"
+
+NO_START = np.iinfo(np.int64).min
+NO_CATEGORY = -1
+
+
+def _epoch(value: Optional[datetime]) -> int:
+    return int(value.timestamp()) if value else NO_START
+
+
+# --- EVENT SNAPSHOT ---
+class EventSnapshot:
+    """In-process, column-oriented copy of the `events` table.
+
+    Date ranges are a binary search in an OccurrenceIndex, so recurring
+    events show up on each day they happen. Category ids, ratings and ids
+    live in NumPy arrays so the other filters are vectorized comparisons;
+    the display fields are kept per row for the matches. New rows are
+    pulled in incrementally past an ``id`` watermark, and the whole table
+    is reloaded every ``full_refresh`` seconds to pick up edits and deletes.
+    """
+
+    def __init__(self, fetch: Callable[[str, Optional[tuple]], List[Dict[str, Any]]],
+                 max_age: float = 300.0, full_refresh: float = 3600.0,
+                 occurrences: Optional[OccurrenceIndex] = None) -> None:
+        self._fetch = fetch
+        self.max_age = max_age
+        self.full_refresh = full_refresh
+        self.occurrences = occurrences or OccurrenceIndex()
+
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._ids = np.empty(0, dtype=np.int64)
+        self._starts = np.empty(0, dtype=np.int64)
+        self._categories = np.empty(0, dtype=np.int16)
+        self._ratings = np.empty(0, dtype=np.float32)
+        self._rows: List[Dict[str, Any]] = []
+        self._watermark = 0
+        self._loaded_at = 0.0
+        self._refreshed_at = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    # --- loading ---
+    def _events(self, rows: List[Dict[str, Any]]) -> List[Tuple[int, Optional[datetime], Any]]:
+        """``(id, first start, recurrence)`` per row, dropping the raw recurrence columns."""
+        events = []
+        for row in rows:
+            rule = parse_recurrence(row)
+            for column in RECURRENCE_COLUMNS:
+                row.pop(column, None)
+            events.append((row["id"], row.get("event_start") or parse_date_time(row.get("date_time")), rule))
+        return events
+
+    def _columns(self, rows: List[Dict[str, Any]], events: List[Tuple[int, Optional[datetime], Any]]):
+        starts = np.fromiter((_epoch(first) for _, first, _ in events), dtype=np.int64, count=len(rows))
+        ids = np.fromiter((row["id"] for row in rows), dtype=np.int64, count=len(rows))
+        categories = np.fromiter(
+            (row["category_id"] if row.get("category_id") is not None else NO_CATEGORY for row in rows),
+            dtype=np.int16, count=len(rows),
+        )
+        ratings = np.fromiter(
+            (float(row["rating"]) if row.get("rating") is not None else np.nan for row in rows),
+            dtype=np.float32, count=len(rows),
+        )
+        return ids, starts, categories, ratings
+
+    def refresh(self, full: bool = False) -> int:
+        """Pull rows past the watermark (or everything when ``full``); returns rows loaded."""
+        if not self._refreshing.acquire(blocking=False):
+            return 0  # another thread is already refreshing
+        try:
+            full = full or not self._loaded_at or time.time() - self._loaded_at > self.full_refresh
+            watermark = 0 if full else self._watermark
+            rows = self._fetch(
+                f"SELECT {SNAPSHOT_COLUMNS} FROM events WHERE id > %s ORDER BY id", (watermark,)
+            )
+            events = self._events(rows)
+            ids, starts, categories, ratings = self._columns(rows, events)
+            if full:
+                occurrences = OccurrenceIndex(self.occurrences.lookback_days, self.occurrences.horizon_days)
+                occurrences.build(events)
+            with self._lock:
+                if full:
+                    self._ids, self._starts = ids, starts
+                    self._categories, self._ratings = categories, ratings
+                    self._rows = rows
+                    self.occurrences = occurrences
+                    self._loaded_at = time.time()
+                else:
+                    if rows:
+                        self._ids = np.concatenate([self._ids, ids])
+                        self._starts = np.concatenate([self._starts, starts])
+                        self._categories = np.concatenate([self._categories, categories])
+                        self._ratings = np.concatenate([self._ratings, ratings])
+                        self._rows = self._rows + rows
+                        self.occurrences.upsert(events)
+                    self.occurrences.advance()
+                if len(self._ids):
+                    self._watermark = int(self._ids.max())
+                self._refreshed_at = time.time()
+                self.refreshes += 1
+            logger.debug("Event snapshot %s refresh: %d row(s)", "full" if full else "incremental", len(rows))
+            return len(rows)
+        finally:
+            self._refreshing.release()
+
+    def refresh_in_background(self) -> None:
+        if self._refreshing.locked():
+            return
+
+        def run():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Event snapshot refresh failed")
+
+        threading.Thread(target=run, name="event-snapshot-refresh", daemon=True).start()
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._loaded_at)
+
+    @property
+    def stale(self) -> bool:
+        return not self.ready or time.time() - self._refreshed_at > self.max_age
+
+    # --- queries ---
+    def query(self, start: Optional[datetime], end: Optional[datetime], category_id: Optional[int] = None,
+              limit: int = 10,
+              after: Optional[Tuple[datetime, int]] = None,
+              ids: Optional[Sequence[int]] = None,
+              min_rating: Optional[float] = None) -> Optional[List[Dict[str, Any]]]:
+        """Occurrences with ``start <= event_start < end``, earliest first (open-ended when a bound is None).
+
+        A recurring event's row is returned once per occurrence, with
+        ``event_start`` set to it. ``after`` is a keyset position
+        ``(event_start, id)``; only occurrences past it are returned. ``ids``
+        limits the rows to those events (a GeoIndex match) and ``min_rating``
+        to those rated at least that, unrated ones excluded. Returns None when
+        the snapshot can't answer (not loaded yet or stale), so the caller
+        knows to go to the database instead.
+        """
+        if self.stale:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            starts, event_ids = decode(self.occurrences.between(start, end, after))
+            positions = np.searchsorted(self._ids, event_ids)
+            keep = np.flatnonzero(self._filter(positions, category_id, ids, min_rating))[:limit]
+            selected = []
+            for i in keep:
+                row = self._rows[positions[i]]
+                if starts[i] != self._starts[positions[i]]:
+                    row = dict(row, event_start=datetime.fromtimestamp(int(starts[i])))
+                selected.append(row)
+            self.hits += 1
+        return selected
+
+    def _filter(self, positions: np.ndarray, category_id: Optional[int],
+                ids: Optional[Sequence[int]], min_rating: Optional[float] = None) -> np.ndarray:
+        """Which of the rows at ``positions`` pass the category, id and rating filters."""
+        mask = np.ones(len(positions), dtype=bool)
+        if category_id is not None:
+            mask &= self._categories[positions] == category_id
+        if min_rating is not None:
+            # float32 on both sides, so 3.7 >= 3.7; NaN (unrated) fails, as NULL does in SQL
+            mask &= self._ratings[positions] >= np.float32(min_rating)
+        if ids is not None:
+            mask &= np.isin(self._ids[positions], np.asarray(ids, dtype=np.int64))
+        return mask
+
+    def matching_ids(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     category_id: Optional[int] = None,
+                     ids: Optional[Sequence[int]] = None,
+                     min_rating: Optional[float] = None) -> Optional[np.ndarray]:
+        """Ids of the events passing the filters, with an occurrence in the date range
+        (open-ended when a bound is None), or None if stale."""
+        if self.stale:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            _, event_ids = decode(self.occurrences.between(start, end))
+            positions = np.searchsorted(self._ids, np.unique(event_ids))
+            matches = self._ids[positions[self._filter(positions, category_id, ids, min_rating)]]
+            self.hits += 1
+        return matches
+
+    def rows_for(self, ids: Sequence[int], after: Optional[datetime] = None) -> Optional[List[Dict[str, Any]]]:
+        """Rows for ``ids`` in the order given, skipping unknown ids; None if stale.
+
+        With ``after``, a recurring event's ``event_start`` is its next occurrence from then.
+        """
+        if self.stale:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            # Rows are loaded in id order, so the id column is sorted
+            wanted = np.asarray(ids, dtype=np.int64)
+            positions = np.searchsorted(self._ids, wanted)
+            found = positions < len(self._ids)
+            found[found] = self._ids[positions[found]] == wanted[found]
+            selected = [self._rows[i] for i in positions[found]]
+            self.hits += 1
+        if after is not None:
+            selected = [self.next_occurrence(row, after) for row in selected]
+        return selected
+
+    def next_occurrence(self, row: Dict[str, Any], after: datetime) -> Dict[str, Any]:
+        """``row`` with a recurring event's ``event_start`` moved to its next occurrence from ``after``."""
+        first = row.get("event_start") or parse_date_time(row.get("date_time"))
+        if first is None:
+            return row
+        start = self.occurrences.next_start(row["id"], first, after)
+        return row if start == first else dict(row, event_start=start)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rows": len(self._ids),
+            "watermark": self._watermark,
+            **self.occurrences.stats(),
+            "age_seconds": round(time.time() - self._refreshed_at, 1) if self._refreshed_at else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+        }
@@ -0,0 +1,292 @@
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from actions.dates import DateInterval, parse_date_interval
+from actions.event_start import month_bounds
+from actions.vocab import CATEGORY_IDS, CITIES, MONTHS, MONTH_ABBREVIATIONS, category_for_word
+
+logger = logging.getLogger(__name__)
+
+# Words that don't change which events a query asks for
+FILLER_WORDS = {
+    "a", "all", "any", "are", "can", "event", "events", "find", "for",
+    "happening", "is", "list",
+    "me", "please", "show", "some", "tell", "the", "there", "upcoming", "what",
+    "whats", "which", "you",
+}
+
+_MONTH_WORDS = "|".join(sorted(list(MONTHS) + list(MONTH_ABBREVIATIONS), key=len, reverse=True))
+_DAY_MONTH = re.compile(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?({_MONTH_WORDS})\b")
+_MONTH_DAY = re.compile(rf"\b({_MONTH_WORDS})\s+(\d{{1,2}})(?:st|nd|rd|th)?\b")
+_MONTH_NAME = re.compile(rf"\b({'|'.join(MONTHS)})\b")
+_CITY = re.compile(rf"\b({'|'.join(sorted(CITIES, key=len, reverse=True))})\b")
+_LEFTOVER_DATE = re.compile(r"\b(?:19|20)\d{2}\b")
+
+# Regexes that locate a slot's literal inside generated SQL or a filter spec
+# (actions.filters). Only the named group is replaced by a placeholder, so
+# the surrounding context keeps e.g. category 6 and June (month 6) apart.
+_SQL_CONTEXT = {
+    "category": r"(?i:category_id\s*=\s*|\"categories\":\s*\[(?:\d+,\s*)*)(?P<v>{v})\b",
+    "month": r"(?i:MONTH\((?:[^()]|\([^()]*\))*\)\s*=\s*)(?P<v>{v})\b",
+    "year": r"(?i:YEAR\((?:[^()]|\([^()]*\))*\)\s*=\s*)(?P<v>{v})\b",
+    "city": r"(?i)(?<![a-z])(?P<v>{v})(?![a-z])",
+    "date": r"(?P<v>{v})(?![\d])",
+}
+
+
+def _slot_kind(name: str) -> str:
+    return name.split("_", 1)[0]
+
+
+def _relative_slots(text: str, today: date) -> Dict[str, str]:
+    """Literals a relative phrase resolves to today; re-bound on every lookup.
+
+    Bounds come from ``dates.parse_date_interval``, the parser that resolved
+    the phrase when the query was first planned, so the two always agree.
+    """
+    slots: Dict[str, str] = {}
+
+    def interval(phrase: str) -> DateInterval:
+        return parse_date_interval(phrase, today, fallback=False)
+
+    def bounds(key: str, phrase: str, last: str = "last") -> DateInterval:
+        found = interval(phrase)
+        slots[f"date_{key}start"] = found.start.isoformat()
+        slots[f"date_{key}{last}"] = (found.end - timedelta(days=1)).isoformat()
+        slots[f"date_{key}after"] = found.end.isoformat()
+        return found
+
+    if "today" in text or "tonight" in text:
+        slots["date_today"] = interval("today").start.isoformat()
+    if "tomorrow" in text:
+        slots["date_tomorrow"] = interval("tomorrow").start.isoformat()
+    if "weekend" in text:
+        bounds("weekend", "next weekend" if "next weekend" in text else "this weekend", last="end")
+    if "week" in text.replace("weekend", ""):
+        bounds("week", "next week" if "next week" in text else "this week")
+    for phrase in ("this month", "next month"):
+        if phrase in text:
+            key = phrase.replace(" ", "")
+            found = bounds(key, phrase)
+            slots[f"month_{key}"] = str(found.start.month)
+            slots[f"year_{key}"] = str(found.start.year)
+    return slots
+
+
+def normalize_query(user_query: str, today: Optional[date] = None) -> Tuple[str, Dict[str, str], List[str]]:
+    """Split a question into a template key and its slot values.
+
+    Returns ``(key, slots, required)`` where ``slots`` maps slot names to the
+    SQL literal each one stands for and ``required`` lists the slots taken
+    from the user's own words, which must be present in any cached SQL
+    (directly, or through their ``date_<name>start``/``date_<name>after`` bounds).
+    """
+    today = today or datetime.now().date()
+    text = user_query.lower().replace("’", "'")
+    text = re.sub(r"[^a-z0-9\s']", " ", text).replace("'", "")
+    slots: Dict[str, str] = {}
+    required: List[str] = []
+    counters: Dict[str, int] = {}
+
+    def take(kind: str, value: str) -> str:
+        counters[kind] = counters.get(kind, 0) + 1
+        name = f"{kind}_{counters[kind]}"
+        slots[name] = value
+        required.append(name)
+        return f"{{{kind}}}"
+
+    def day_month(m: "re.Match") -> str:
+        day, word = (m.group(1), m.group(2)) if m.re is _DAY_MONTH else (m.group(2), m.group(1))
+        try:
+            value = date(today.year, MONTHS.get(word) or MONTH_ABBREVIATIONS[word], int(day))
+        except ValueError:
+            return m.group(0)
+        placeholder = take("date", value.isoformat())
+        # the day as a half-open range on event_start
+        slots[f"date_{required[-1]}after"] = (value + timedelta(days=1)).isoformat()
+        return placeholder
+
+    def month(m: "re.Match") -> str:
+        num = MONTHS[m.group(1)]
+        placeholder = take("month", str(num))
+        start, end = month_bounds(today.year, num)
+        slots[f"date_{required[-1]}start"] = start.isoformat()
+        slots[f"date_{required[-1]}after"] = end.isoformat()
+        return placeholder
+
+    text = _DAY_MONTH.sub(day_month, text)
+    text = _MONTH_DAY.sub(day_month, text)
+    if counters.get("date") or _MONTH_NAME.search(text):
+        slots["year_current"] = str(today.year)
+    text = _MONTH_NAME.sub(month, text)
+    text = _CITY.sub(lambda m: take("city", m.group(1).title()), text)
+
+    words = []
+    for word in text.split():
+        category = category_for_word(word)
+        if category:
+            words.append(take("category", str(CATEGORY_IDS[category])))
+        elif word not in FILLER_WORDS:
+            words.append(word)
+    key = " ".join(words)
+
+    slots.update(_relative_slots(key, today))
+    return key, slots, required
+
+
+def templatize(sql: str, slots: Dict[str, str], required: List[str]) -> Optional[str]:
+    """Replace slot literals in ``sql`` with placeholders, or None if unsafe to cache."""
+    seen: Dict[Tuple[str, str], str] = {}
+    counts: Dict[str, int] = {}
+    template = sql
+    for name, value in sorted(slots.items(), key=lambda kv: -len(kv[1])):
+        kind = _slot_kind(name)
+        if (kind, value.lower()) in seen:
+            # Two slots share a literal, e.g. "between 5 June and 5 June"
+            if name in required:
+                return None
+            continue
+        seen[(kind, value.lower())] = name
+        pattern = re.compile(_SQL_CONTEXT[kind].format(v=re.escape(value)))
+        template, counts[name] = pattern.subn(
+            lambda m: m.group(0)[:m.start("v") - m.start()] + f"<<{name}>>", template
+        )
+
+    for name in required:
+        bounds = (f"date_{name}start", f"date_{name}after")
+        if not counts.get(name) and not any(counts.get(bound) for bound in bounds):
+            return None
+
+    # Any remaining year or date literal is time-dependent and not tied to a slot
+    if _LEFTOVER_DATE.search(template):
+        return None
+    if bind(template, slots).lower() != sql.lower():
+        return None
+    return template
+
+
+def bind(template: str, slots: Dict[str, str]) -> str:
+    for name, value in slots.items():
+        template = template.replace(f"<<{name}>>", value)
+    return template
+
+
+# --- TEMPLATE CACHE ---
+class TemplateCache:
+    """LRU/TTL cache of GPT-generated SQL or filter specs keyed on a normalized query template.
+
+    Entries live in memory and in a SQLite file so they survive restarts.
+    ``version`` is folded into every key; bump it when the prompt contract
+    changes so templates generated under the old contract are never served.
+    """
+
+    def __init__(self, path: str, max_entries: int = 512, ttl: float = 7 * 86400,
+                 max_disk_entries: int = 10000, version: str = "1") -> None:
+        self.version = version
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sql_templates ("
+            " key TEXT PRIMARY KEY,"
+            " template TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._db.commit()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.uncacheable = 0
+        self.evictions = 0
+
+    def _expired(self, created_at: float) -> bool:
+        return time.time() - created_at > self.ttl
+
+    def _remember(self, key: str, template: str, created_at: float) -> None:
+        self._memory[key] = (template, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, user_query: str, today: Optional[date] = None) -> Optional[str]:
+        key, slots, _ = normalize_query(user_query, today)
+        key = f"{self.version}:{key}"
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and self._expired(entry[1]):
+                del self._memory[key]
+                entry = None
+            if entry:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return bind(entry[0], slots)
+
+            row = self._db.execute(
+                "SELECT template, created_at FROM sql_templates WHERE key = ?", (key,)
+            ).fetchone()
+            if row and not self._expired(row[1]):
+                self._db.execute(
+                    "UPDATE sql_templates SET last_used = ? WHERE key = ?", (time.time(), key)
+                )
+                self._db.commit()
+                self._remember(key, row[0], row[1])
+                self.hits += 1
+                self.disk_hits += 1
+                return bind(row[0], slots)
+            if row:
+                self._db.execute("DELETE FROM sql_templates WHERE key = ?", (key,))
+                self._db.commit()
+            self.misses += 1
+            return None
+
+    def put(self, user_query: str, sql: str, today: Optional[date] = None) -> bool:
+        key, slots, required = normalize_query(user_query, today)
+        key = f"{self.version}:{key}"
+        template = templatize(sql, slots, required)
+        with self._lock:
+            if template is None:
+                self.uncacheable += 1
+                logger.debug("Not caching SQL for %r: literals could not be templated", key)
+                return False
+            now = time.time()
+            self._remember(key, template, now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO sql_templates (key, template, created_at, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                (key, template, now, now),
+            )
+            self._db.execute(
+                "DELETE FROM sql_templates WHERE created_at < ? OR key IN ("
+                " SELECT key FROM sql_templates ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (now - self.ttl, self.max_disk_entries),
+            )
+            self._db.commit()
+            self.stores += 1
+            return True
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stores": self.stores,
+                "uncacheable": self.uncacheable,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,305 @@
+"""Per-request traces, Prometheus-style metrics and structured request logs.
+
+A handler opens a RequestTrace with ``trace_request`` and code under it
+records stage timings with ``span(...)``, token usage with
+``add_tokens(...)`` and row counts, without passing the trace around
+(it lives in a context variable, so it follows asyncio tasks and
+ConnectionPool.run). When the request finishes, the trace is added to
+the metrics registry and logged as one JSON line on the
+``actions.telemetry`` logger.
+
+``REGISTRY.render()`` returns the Prometheus text exposition format; it is
+served at /metrics by the action server's readiness endpoint and by the
+trial Flask apps. No prometheus_client dependency is needed.
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROW_BUCKETS = (0, 1, 5, 10, 25, 50, 100)
+
+_current: "contextvars.ContextVar[Optional[RequestTrace]]" = contextvars.ContextVar(
+    "request_trace", default=None
+)
+
+
+# --- METRICS REGISTRY ---
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _value(value: float) -> str:
+    """A sample value without losing precision: {:g} would print 1234567 as 1.23457e+06."""
+    if isinstance(value, int):
+        return str(value)
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    """Counters, histograms and callback gauges, rendered as Prometheus text."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Tuple, float]] = {}
+        self._histograms: Dict[str, Dict[Tuple, _Histogram]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._gauges: List[Tuple[str, str, Callable[[], Dict[str, Any]]]] = []
+
+    def counter(self, name: str, help_text: str) -> None:
+        self._help[name] = ("counter", help_text)
+        self._counters.setdefault(name, {})
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = SECONDS_BUCKETS) -> None:
+        self._help[name] = ("histogram", help_text)
+        self._histograms.setdefault(name, {})
+        self._buckets[name] = buckets
+
+    def gauges(self, prefix: str, help_text: str, source: Callable[[], Dict[str, Any]]) -> None:
+        """Expose every numeric value of ``source()`` as a gauge ``<prefix>_<key>`` at scrape time."""
+        self._gauges.append((prefix, help_text, source))
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms[name]
+            if key not in series:
+                series[key] = _Histogram(self._buckets[name])
+            series[key].observe(value)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, series in self._counters.items():
+                lines += [f"# HELP {name} {self._help[name][1]}", f"# TYPE {name} counter"]
+                lines += [f"{name}{_labels(k)} {_value(v)}" for k, v in series.items()]
+            for name, series in self._histograms.items():
+                lines += [f"# HELP {name} {self._help[name][1]}", f"# TYPE {name} histogram"]
+                for key, hist in series.items():
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        lines.append(f"{name}_bucket{_labels(key + (('le', f'{bound:g}'),))} {count}")
+                    lines.append(f"{name}_bucket{_labels(key + (('le', '+Inf'),))} {hist.count}")
+                    lines.append(f"{name}_sum{_labels(key)} {hist.total:.6f}")
+                    lines.append(f"{name}_count{_labels(key)} {hist.count}")
+        for prefix, help_text, source in self._gauges:
+            try:
+                values = source()
+            except Exception:
+                logger.exception("Metrics source %s failed", prefix)
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{prefix}_{key}"
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {_value(value)}"]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+REGISTRY.counter("amused_requests_total", "Handled requests by handler, path and status.")
+REGISTRY.histogram("amused_request_seconds", "End-to-end request latency.")
+REGISTRY.histogram("amused_stage_seconds", "Latency of one pipeline stage within a request.")
+REGISTRY.counter("amused_llm_tokens_total", "OpenAI tokens used, by kind.")
+REGISTRY.histogram("amused_result_rows", "Event rows returned per request.", ROW_BUCKETS)
+
+
+# --- REQUEST TRACES ---
+class RequestTrace:
+    def __init__(self, handler: str, **attrs: Any) -> None:
+        self.handler = handler
+        self.request_id = uuid.uuid4().hex[:12]
+        self.path = "unknown"
+        self.status = "ok"
+        self.spans: Dict[str, float] = {}
+        self.tokens: Dict[str, int] = {}
+        self.rows: Optional[int] = None
+        self.attrs = attrs
+        self._started = time.perf_counter()
+        self.total: Optional[float] = None
+
+    def add_span(self, stage: str, seconds: float) -> None:
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    def add_tokens(self, usage: Any) -> None:
+        """Add an OpenAI ``usage`` object (or dict) to the request's token counts."""
+        if usage is None:
+            return
+        for kind in ("prompt_tokens", "completion_tokens"):
+            value = usage.get(kind) if isinstance(usage, dict) else getattr(usage, kind, None)
+            if value:
+                self.tokens[kind] = self.tokens.get(kind, 0) + int(value)
+
+    def add_rows(self, count: int) -> None:
+        self.rows = (self.rows or 0) + count
+
+    def finish(self, registry: Registry = REGISTRY) -> None:
+        if self.total is not None:
+            return
+        self.total = time.perf_counter() - self._started
+        registry.inc("amused_requests_total", handler=self.handler, path=self.path, status=self.status)
+        registry.observe("amused_request_seconds", self.total, handler=self.handler, path=self.path)
+        for stage, seconds in self.spans.items():
+            registry.observe("amused_stage_seconds", seconds, handler=self.handler, stage=stage)
+        for kind, count in self.tokens.items():
+            registry.inc("amused_llm_tokens_total", count, handler=self.handler, kind=kind.split("_")[0])
+        if self.rows is not None:
+            registry.observe("amused_result_rows", self.rows, handler=self.handler)
+        logger.info(json.dumps(self.as_dict(), ensure_ascii=False, default=str))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "event": "request",
+            "request_id": self.request_id,
+            "handler": self.handler,
+            "path": self.path,
+            "status": self.status,
+            "total_ms": round((self.total or 0.0) * 1000, 2),
+            "spans_ms": {k: round(v * 1000, 2) for k, v in self.spans.items()},
+            "tokens": self.tokens,
+            "rows": self.rows,
+            **self.attrs,
+        }
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current.get()
+
+
+@contextmanager
+def trace_request(handler: str, **attrs: Any) -> Iterator[RequestTrace]:
+    """Open a trace for one request; it is recorded and logged when the block exits."""
+    trace = RequestTrace(handler, **attrs)
+    token = _current.set(trace)
+    try:
+        yield trace
+    except BaseException:
+        if trace.status == "ok":
+            trace.status = "error"
+        raise
+    finally:
+        _current.reset(token)
+        trace.finish()
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a block into the current trace (a no-op outside one)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace = _current.get()
+        if trace is not None:
+            trace.add_span(stage, time.perf_counter() - started)
+
+
+def set_path(path: str) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.path = path
+
+
+def add_tokens(usage: Any) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.add_tokens(usage)
+
+
+def add_rows(count: int) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.add_rows(count)
+
+
+class TimedRows:
+    """Iterates ``rows`` while adding up the time spent waiting on it (i.e. on the database)."""
+
+    def __init__(self, rows: Iterable[Any]) -> None:
+        self._rows = iter(rows)
+        self.seconds = 0.0
+
+    def __iter__(self) -> "TimedRows":
+        return self
+
+    def __next__(self) -> Any:
+        started = time.perf_counter()
+        try:
+            return next(self._rows)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+
+# --- FLASK ---
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def instrument_flask(app: Any, handler: str, endpoints: Iterable[str] = ("ask",)) -> None:
+    """Trace requests to ``endpoints`` of a Flask app and add a ``GET /metrics`` route."""
+    from flask import Response, g, request
+
+    endpoints = set(endpoints)
+
+    @app.before_request
+    def _start_trace():
+        if request.endpoint in endpoints:
+            g.request_trace = RequestTrace(handler, endpoint=request.endpoint)
+            g.request_trace_token = _current.set(g.request_trace)
+
+    @app.after_request
+    def _record_status(response):
+        trace = g.get("request_trace")
+        if trace is not None and trace.status == "ok" and response.status_code >= 400:
+            trace.status = "error" if response.status_code >= 500 else "rejected"
+        return response
+
+    @app.teardown_request
+    def _finish_trace(exc):
+        trace = g.pop("request_trace", None)
+        if trace is None:
+            return
+        if exc is not None:
+            trace.status = "error"
+        _current.reset(g.pop("request_trace_token"))
+        trace.finish()
+
+    app.add_url_rule("/metrics", "metrics",
+                     lambda: Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE))
@@ -0,0 +1,69 @@
+from typing import Dict, Optional
+
+# Shared vocabulary for query parsing. Keep in sync with the category mapping
+# the GPT prompts describe.
+
+MONTHS: Dict[str, int] = {
+    "january": 1,
+    "february": 2,
+    "march": 3,
+    "april": 4,
+    "may": 5,
+    "june": 6,
+    "july": 7,
+    "august": 8,
+    "september": 9,
+    "october": 10,
+    "november": 11,
+    "december": 12,
+}
+
+MONTH_ABBREVIATIONS: Dict[str, int] = {
+    name[:3]: num for name, num in MONTHS.items()
+}
+MONTH_ABBREVIATIONS["sept"] = 9
+
+CATEGORY_IDS: Dict[str, int] = {
+    "music": 6,
+    "sports": 3,
+    "art": 4,
+    "education": 5,
+    "tech": 2,
+    "food": 7,
+}
+
+# Words users type that mean one of the categories above
+CATEGORY_SYNONYMS: Dict[str, str] = {
+    "musical": "music",
+    "concert": "music",
+    "concerts": "music",
+    "sport": "sports",
+    "arts": "art",
+    "educational": "education",
+    "technology": "tech",
+}
+
+CITIES = (
+    "delhi",
+    "new delhi",
+    "mumbai",
+    "bangalore",
+    "bengaluru",
+    "pune",
+    "hyderabad",
+    "kolkata",
+    "chennai",
+    "lucknow",
+    "jaipur",
+    "goa",
+    "ahmedabad",
+    "chandigarh",
+    "malta",
+)
+
+
+def category_for_word(word: str) -> Optional[str]:
+    word = word.lower()
+    if word in CATEGORY_IDS:
+        return word
+    return CATEGORY_SYNONYMS.get(word)
@@ -0,0 +1,180 @@
+"""Accuracy and speed of actions.dates against the old regex + dateparser path.
+
+Utterances come from data/nlu.yml and tests/test_stories.yml; expected
+intervals are labelled below relative to a fixed "today" (Wednesday
+18 June 2025). Anything not labelled must parse to no date at all.
+
+    python -m benchmarks.date_parser              # exits 1 on any mismatch
+    python -m benchmarks.date_parser --repeat 2000
+"""
+import argparse
+import re
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from actions.dates import parse_date_interval
+from actions.vocab import MONTHS
+
+ROOT = Path(__file__).resolve().parent.parent
+TODAY = date(2025, 6, 18)
+
+EXPECTED = {
+    "what are the events in May?": ("2026-05-01", "2026-06-01"),
+    "are there any events between 15 June to 30 June?": ("2025-06-15", "2025-07-01"),
+    "events happening this weekend": ("2025-06-21", "2025-06-23"),
+    "art events next month": ("2025-07-01", "2025-08-01"),
+    "concerts in Mumbai in July": ("2025-07-01", "2025-08-01"),
+    "is there any events thhes week": ("2025-06-18", "2025-06-23"),
+    "show me events next month": ("2025-07-01", "2025-08-01"),
+    "is there any events this week": ("2025-06-18", "2025-06-23"),
+    "are there any events tomorrow?": ("2025-06-19", "2025-06-20"),
+    "what events are happening tonight?": ("2025-06-18", "2025-06-19"),
+    "music shows this Friday": ("2025-06-20", "2025-06-21"),
+    "events in Delhi this Sunday": ("2025-06-22", "2025-06-23"),
+    "workshops in August in Hyderabad": ("2025-08-01", "2025-09-01"),
+    "seminars happening next weekend": ("2025-06-28", "2025-06-30"),
+    "art exhibitions in October": ("2025-10-01", "2025-11-01"),
+    "any events today?": ("2025-06-18", "2025-06-19"),
+    "tell me about weekend events": ("2025-06-21", "2025-06-23"),
+    "tech meetups in September": ("2025-09-01", "2025-10-01"),
+    "food events this evening": ("2025-06-18", "2025-06-19"),
+    "concerts next month": ("2025-07-01", "2025-08-01"),
+    "cultural programs in November": ("2025-11-01", "2025-12-01"),
+    "any live shows this week?": ("2025-06-18", "2025-06-23"),
+    "events near Pune this month": ("2025-06-01", "2025-07-01"),
+    "yoga sessions in March": ("2026-03-01", "2026-04-01"),
+    "educational events this Saturday": ("2025-06-21", "2025-06-22"),
+    "what’s happening in Mumbai this week?": ("2025-06-18", "2025-06-23"),
+    "events in Chennai in December": ("2025-12-01", "2026-01-01"),
+    "gaming events this month": ("2025-06-01", "2025-07-01"),
+    "business conferences in January": ("2026-01-01", "2026-02-01"),
+    "what events are planned for June?": ("2025-06-01", "2025-07-01"),
+    "nightlife events this weekend": ("2025-06-21", "2025-06-23"),
+    "parties happening on 31st Dec": ("2025-12-31", "2026-01-01"),
+    "events in Jaipur this weekend": ("2025-06-21", "2025-06-23"),
+    "shows in Goa in April": ("2026-04-01", "2026-05-01"),
+    "any art events on Saturday?": ("2025-06-21", "2025-06-22"),
+    "upcoming events this quarter": ("2025-04-01", "2025-07-01"),
+    "events between 10th and 20th August": ("2025-08-10", "2025-08-21"),
+    "is there anything happening on New Year?": ("2026-01-01", "2026-01-02"),
+    "kids events next week": ("2025-06-23", "2025-06-30"),
+    "startup events this week": ("2025-06-18", "2025-06-23"),
+    "top events happening this month": ("2025-06-01", "2025-07-01"),
+    # Phrasings from the fallback/utter_default examples and known regressions
+    "Show events happening in June": ("2025-06-01", "2025-07-01"),
+    "Events between 5th and 10th July": ("2025-07-05", "2025-07-11"),
+    "Music shows next month 🎶": ("2025-07-01", "2025-08-01"),
+    "events between 5 and 10 July": ("2025-07-05", "2025-07-11"),
+    "events from 28 Dec to 3 Jan": ("2025-12-28", "2026-01-04"),
+    "show 10 events": None,
+    "may I add an event?": None,
+}
+
+
+def load_utterances() -> List[str]:
+    utterances: List[str] = []
+    for line in (ROOT / "data" / "nlu.yml").read_text(encoding="utf-8").splitlines():
+        m = re.match(r"\s+-\s*(.+)", line)
+        if m:
+            utterances.append(m.group(1).strip())
+    lines = (ROOT / "tests" / "test_stories.yml").read_text(encoding="utf-8").splitlines()
+    for i, line in enumerate(lines):
+        if line.strip() == "- user: |" and i + 1 < len(lines):
+            utterances.append(lines[i + 1].strip())
+    utterances.extend(q for q in EXPECTED if q not in utterances)
+    return list(dict.fromkeys(utterances))
+
+
+def legacy_parse(user_query: str) -> Optional[Tuple[date, date]]:
+    """The regex + dateparser logic extract_date_sql_from_query used before."""
+    from dateparser import parse as parse_date
+
+    user_query = user_query.lower()
+    year = TODAY.year
+    settings = {"RELATIVE_BASE": datetime(TODAY.year, TODAY.month, TODAY.day)}
+    date_range = re.findall(r"(?:between|from)\s+(.*?)\s+(?:and|to)\s+(.*)", user_query)
+    if date_range:
+        start = parse_date(date_range[0][0] + f" {year}", settings=settings)
+        end = parse_date(date_range[0][1] + f" {year}", settings=settings)
+        if start and end:
+            return start.date(), end.date() + timedelta(days=1)
+    single = re.search(r"\d{1,2}\s+\w+|\w+\s+\d{1,2}", user_query)
+    if single:
+        parsed = parse_date(single.group() + f" {year}", settings=settings)
+        if parsed:
+            return parsed.date(), parsed.date() + timedelta(days=1)
+    for phrase, offset in (("this month", 0), ("next month", 1)):
+        if phrase in user_query:
+            month = (TODAY.month - 1 + offset) % 12 + 1
+            start = date(year + (TODAY.month - 1 + offset) // 12, month, 1)
+            return start, (start + timedelta(days=32)).replace(day=1)
+    for name, num in MONTHS.items():
+        if name in user_query:
+            start = date(year, num, 1)
+            return start, (start + timedelta(days=32)).replace(day=1)
+    return None
+
+
+def grammar_parse(user_query: str) -> Optional[Tuple[date, date]]:
+    interval = parse_date_interval(user_query, today=TODAY)
+    return (interval.start, interval.end) if interval else None
+
+
+def expected_for(utterance: str) -> Optional[Tuple[date, date]]:
+    value = EXPECTED.get(utterance)
+    return (date.fromisoformat(value[0]), date.fromisoformat(value[1])) if value else None
+
+
+def accuracy(parse, utterances: List[str]) -> Tuple[int, List[str]]:
+    wrong = []
+    for utterance in utterances:
+        got = parse(utterance)
+        if got != expected_for(utterance):
+            wrong.append(f"{utterance!r}: got {got}, expected {expected_for(utterance)}")
+    return len(utterances) - len(wrong), wrong
+
+
+def timing(parse, utterances: List[str], repeat: int) -> Tuple[float, float]:
+    started = time.perf_counter()
+    parse(utterances[0])
+    cold = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for utterance in utterances:
+            parse(utterance)
+    per_call = (time.perf_counter() - started) / (repeat * len(utterances))
+    return cold, per_call
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--skip-legacy", action="store_true", help="don't time the dateparser path")
+    args = parser.parse_args()
+
+    utterances = load_utterances()
+    print(f"{len(utterances)} utterances, {sum(1 for u in utterances if expected_for(u))} with dates")
+
+    runs = [("grammar", grammar_parse, args.repeat)]
+    if not args.skip_legacy:
+        runs.append(("legacy", legacy_parse, max(1, args.repeat // 50)))
+
+    failures = []
+    for label, parse, repeat in runs:
+        cold, per_call = timing(parse, utterances, repeat)
+        correct, wrong = accuracy(parse, utterances)
+        print(f"  {label:8} accuracy {correct}/{len(utterances)}  "
+              f"cold {cold * 1000:8.2f} ms  warm {per_call * 1e6:9.1f} µs/call")
+        if label == "grammar":
+            failures = wrong
+
+    for line in failures:
+        print(f"  MISMATCH {line}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
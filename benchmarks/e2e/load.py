@@ -0,0 +1,175 @@
+"""Throughput of the async /ask service (service.app) as worker processes are added.
+
+For each --workers value the service is started as a subprocess against a
+seeded local database (benchmarks.e2e.seed) and the in-process mock OpenAI,
+then --concurrency closed-loop clients replay the NLU query mix for
+--duration seconds over keep-alive connections. Reported per worker count:
+throughput of answered requests, p50/p95/p99 latency, and how many
+requests were turned away with 429 (backpressure) or failed.
+
+    python -m benchmarks.e2e.load --rows 1k --workers 1,2,4 --concurrency 64 --duration 20
+
+Raising --concurrency past workers x ASK_MAX_IN_FLIGHT (+ ASK_MAX_QUEUE)
+shows the 429s taking over instead of latency growing without bound.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.e2e.run import RESULTS, ROOT, git_revision, load_query_mix, summarize
+
+
+def wait_ready(port: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/ready")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.25)
+    raise TimeoutError(f"service on port {port} not ready after {timeout:.0f}s")
+
+
+def drive(port: int, queries: List[str], concurrency: int, duration: float, seed: int) -> Dict[str, Any]:
+    """Closed-loop load: each client sends its next request as soon as the last one is answered."""
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client(number: int) -> None:
+        rng = random.Random(seed + number)
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        while time.monotonic() < stop_at:
+            body = json.dumps({"query": rng.choice(queries)})
+            started = time.perf_counter()
+            try:
+                conn.request("POST", "/ask", body, {"Content-Type": "application/json"})
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                status = 0
+            elapsed = time.perf_counter() - started
+            with lock:
+                statuses[status] += 1
+                if status == 200:
+                    latencies.append(elapsed)
+            if status == 429:
+                time.sleep(0.05)  # what a polite client does with Retry-After, compressed
+        conn.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    summary = summarize(latencies, elapsed)
+    summary["statuses"] = {str(k): v for k, v in sorted(statuses.items())}
+    summary["rejected_429"] = statuses.get(429, 0)
+    summary["failed"] = sum(v for k, v in statuses.items() if k not in (200, 429))
+    return summary
+
+
+def run_workers(workers: int, args: argparse.Namespace, env: Dict[str, str],
+                queries: List[str]) -> Dict[str, Any]:
+    port = args.port
+    command = shlex.split(args.command) + ["--port", str(port), "--workers", str(workers)]
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port, args.startup_timeout)
+        return drive(port, queries, args.concurrency, args.duration, args.seed)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main() -> int:
+    from benchmarks.e2e.mock_openai import MockOpenAI
+    from benchmarks.e2e.seed import database_name, ensure_seeded, parse_size
+
+    parser = argparse.ArgumentParser(description="Load test the async /ask service by worker count")
+    parser.add_argument("--rows", default="1k", help="database size (1k, 100k, 1m or a number)")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--concurrency", type=int, default=64, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per worker count")
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-jitter", type=float, default=0.3)
+    parser.add_argument("--no-seed", action="store_true", help="use the database as it is")
+    parser.add_argument("--database", help="defaults to amused_bench_<rows>")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--command", default=f"{shlex.quote(sys.executable)} -m service.app",
+                        help="server command; --port and --workers are appended")
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="JSON path (default benchmarks/results/load-<time>.json)")
+    args = parser.parse_args()
+
+    rows = parse_size(args.rows)
+    database = args.database or database_name(rows)
+    if not args.no_seed:
+        ensure_seeded(rows, database)
+
+    mock = MockOpenAI(args.llm_latency_ms, args.llm_jitter, seed=args.seed)
+    env = dict(os.environ, DB_NAME=database, OPENAI_API_KEY="bench", OPENAI_BASE_URL=mock.serve(),
+               LOG_LEVEL="WARNING")
+    queries = [q for qs in load_query_mix().values() for q in qs]
+
+    runs: Dict[str, Any] = {}
+    for workers in [int(w) for w in args.workers.split(",") if w.strip()]:
+        llm_before = mock.requests
+        runs[str(workers)] = run_workers(workers, args, env, queries)
+        runs[str(workers)]["llm_requests"] = mock.requests - llm_before
+    mock.shutdown()
+
+    print(f"{'workers':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'429':>6} {'failed':>6}")
+    for workers, r in runs.items():
+        print(f"{workers:>7} {r.get('throughput_per_s', 0):>8.1f} {r.get('p50_ms', 0):>9.1f} "
+              f"{r.get('p95_ms', 0):>9.1f} {r.get('p99_ms', 0):>9.1f} {r['rejected_429']:>6} {r['failed']:>6}")
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git": git_revision(),
+            "database": database,
+            "rows": rows,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_jitter": args.llm_jitter,
+        },
+        "runs": runs,
+    }
+    output = Path(args.output) if args.output else RESULTS / f"load-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\nSaved {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""OpenAI-compatible stand-in for `POST /v1/chat/completions`.
+
+Replies are canned but shaped like the real thing:
+
+* filter spec prompts (actions.filters) get the JSON spec built from the
+  question itself (date range, category, city), the way GPT-4 answers them;
+* event-formatting prompts get a short formatted list;
+* anything else gets a 3-4 line FAQ answer.
+
+Latency is ``--latency-ms`` scaled by a random factor in [1 - jitter, 1 + jitter],
+and ``--error-rate`` of requests fail with 429 or 500 to exercise retries.
+Point clients at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+    python -m benchmarks.e2e.mock_openai --port 8089 --latency-ms 900
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from actions.dates import parse_date_interval
+from actions.vocab import CITIES, category_for_word
+
+FAQ_ANSWER = (
+    "To add an event, open the app, tap 'Add Event' and fill in the title, date and time, "
+    "venue address, category and a short description.\n"
+    "You can attach a link for tickets and mark the event as recurring.\n"
+    "Events are reviewed and usually go live within a few hours."
+)
+
+
+def canned_spec(question: str) -> str:
+    text = question.lower()
+    spec: Dict[str, object] = {}
+    interval = parse_date_interval(question)
+    if interval:
+        spec.update({"from": interval.start.isoformat(), "before": interval.end.isoformat()})
+    for word in re.findall(r"[a-z]+", text):
+        category = category_for_word(word)
+        if category:
+            spec["categories"] = [category]
+            break
+    for city in sorted(CITIES, key=len, reverse=True):
+        if re.search(rf"\b{re.escape(city)}\b", text):
+            spec["city"] = city.title()
+            break
+    return json.dumps(spec)
+
+
+def canned_reply(prompt: str) -> str:
+    if "JSON object" in prompt and "Search:" in prompt:
+        match = re.search(r'Search:\s*"(.*)"', prompt)
+        return canned_spec(match.group(1) if match else prompt)
+    if "event data" in prompt or "Data:" in prompt:
+        titles = re.findall(r"'title': '([^']*)'", prompt)[:10]
+        return "\n\n".join(f"🎭 {t}" for t in titles) or "No events to format."
+    return FAQ_ANSWER
+
+
+class MockOpenAI:
+    def __init__(self, latency_ms: float = 800.0, jitter: float = 0.3,
+                 error_rate: float = 0.0, seed: Optional[int] = None) -> None:
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self.requests = 0
+        self.errors = 0
+
+    def _delay(self) -> Tuple[float, bool]:
+        with self._lock:
+            factor = self._rng.uniform(1 - self.jitter, 1 + self.jitter)
+            fail = self._rng.random() < self.error_rate
+        return max(self.latency_ms * factor, 0.0) / 1000, fail
+
+    def completion(self, body: Dict) -> Dict:
+        prompt = "\n".join(m.get("content") or "" for m in body.get("messages", []))
+        content = canned_reply(prompt)
+        with self._lock:
+            self.requests += 1
+            number = self.requests
+        prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+        return {
+            "id": f"chatcmpl-mock-{number}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def serve(self, port: int = 0, host: str = "127.0.0.1") -> str:
+        """Start on a daemon thread; returns the base URL (port 0 picks a free one)."""
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, code: int, payload: Dict) -> None:
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    return self._send(404, {"error": {"message": "not found"}})
+                delay, fail = mock._delay()
+                time.sleep(delay)
+                if fail:
+                    with mock._lock:
+                        mock.errors += 1
+                        code = mock._rng.choice([429, 500])
+                    return self._send(code, {"error": {"message": "mock failure", "code": code}})
+                self._send(200, mock.completion(body))
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="mock-openai", daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}/v1"
+
+    def shutdown(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    mock = MockOpenAI(args.latency_ms, args.jitter, args.error_rate)
+    url = mock.serve(args.port, args.host)
+    print(f"Mock OpenAI listening on {url} (latency {args.latency_ms:.0f} ms ±{args.jitter:.0%})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mock.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""End-to-end latency of the event actions and the Flask /ask handlers, offline.
+
+Each run seeds (or reuses) a local MySQL database of the requested size,
+starts benchmarks.e2e.mock_openai in-process, points the code under test
+at both through DB_* and OPENAI_BASE_URL, and replays a query mix taken
+from data/nlu.yml and tests/test_stories.yml against:
+
+* action_fetch_event_data and action_general_info, through the real
+  Rasa SDK Action.run with the given concurrency;
+* trial/app2.py and trial/app.py /ask, through Flask's test client.
+  Both share one module-level cursor, so they are always driven serially.
+
+Per-stage latency comes from timing wrappers around the module functions
+each stage goes through (parse, nl2sql, snapshot, db/render, llm).
+p50/p95/p99, mean and throughput are printed and written as JSON; with
+--baseline, any stage whose p95 regressed by more than --tolerance makes
+the run exit 1.
+
+    python -m benchmarks.e2e.run --rows 1k
+    python -m benchmarks.e2e.run --rows 1k,100k,1m --requests 300 --concurrency 16
+    python -m benchmarks.e2e.run --rows 100k --baseline benchmarks/results/last.json
+
+Needs a local MySQL reachable with DB_HOST/DB_USER/DB_PASSWORD (see
+benchmarks.e2e.seed); nothing talks to OpenAI or the production database.
+"""
+import argparse
+import asyncio
+import functools
+import inspect
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from statistics import mean, quantiles
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[2]
+RESULTS = ROOT / "benchmarks" / "results"
+TARGETS = ("action_fetch_event_data", "action_general_info", "flask_app2", "flask_app")
+
+
+# --- QUERY MIX ---
+def load_query_mix() -> Dict[str, List[str]]:
+    """Utterances by intent from the NLU data and the test stories."""
+    mix: Dict[str, List[str]] = defaultdict(list)
+    intent = None
+    for line in (ROOT / "data" / "nlu.yml").read_text(encoding="utf-8").splitlines():
+        found = re.match(r"-\s*intent:\s*(\S+)", line)
+        if found:
+            intent = found.group(1)
+            continue
+        example = re.match(r"\s+-\s*(.+)", line)
+        if intent and example:
+            mix[intent].append(example.group(1).strip())
+    lines = (ROOT / "tests" / "test_stories.yml").read_text(encoding="utf-8").splitlines()
+    for i, line in enumerate(lines):
+        if line.strip() == "- user: |" and i + 2 < len(lines):
+            found = re.match(r"\s*intent:\s*(\S+)", lines[i + 2])
+            mix[found.group(1) if found else "unknown"].append(lines[i + 1].strip())
+    return {k: list(dict.fromkeys(v)) for k, v in mix.items()}
+
+
+# --- TIMING ---
+def summarize(samples: List[float], elapsed: Optional[float] = None) -> Dict[str, Any]:
+    if not samples:
+        return {"count": 0}
+    cuts = quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else [samples[0]] * 99
+    summary = {
+        "count": len(samples),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "mean_ms": round(mean(samples) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+    }
+    if elapsed:
+        summary["throughput_per_s"] = round(len(samples) / elapsed, 2)
+    return summary
+
+
+class StageTimer:
+    """Collects per-stage durations by wrapping the functions each stage runs through."""
+
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.samples = defaultdict(list)
+
+    def wrap(self, owner: Any, attr: str, stage: str) -> None:
+        fn = getattr(owner, attr)
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - started)
+        else:
+            @functools.wraps(fn)
+            def timed(*args, **kwargs):
+                started = time.perf_counter()
+                result = fn(*args, **kwargs)
+                if not inspect.isawaitable(result):
+                    self.record(stage, time.perf_counter() - started)
+                    return result
+
+                # e.g. the OpenAI client's create(), a plain function returning a coroutine
+                async def finish():
+                    try:
+                        return await result
+                    finally:
+                        self.record(stage, time.perf_counter() - started)
+                return finish()
+        setattr(owner, attr, timed)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        stages = {name: summarize(values) for name, values in self.samples.items() if name != "total"}
+        return {"total": summarize(self.samples.get("total", []), elapsed), "stages": stages}
+
+
+# --- TARGETS ---
+def run_actions(timer: StageTimer, target: str, queries: List[str], concurrency: int) -> Dict[str, Any]:
+    from rasa_sdk import Tracker
+    from rasa_sdk.executor import CollectingDispatcher
+
+    import actions.actions as A
+
+    action = A.ActionFetchEventData() if target == "action_fetch_event_data" else A.ActionGeneralInfo()
+    errors = 0
+
+    async def one(query: str) -> None:
+        nonlocal errors
+        tracker = Tracker("bench", {}, {"text": query}, [], False, None, {}, None)
+        dispatcher = CollectingDispatcher()
+        started = time.perf_counter()
+        try:
+            await action.run(dispatcher, tracker, {})
+            if any((m.get("text") or "").startswith(("⚠️", "⏳")) for m in dispatcher.messages):
+                errors += 1
+        except Exception:
+            errors += 1
+        timer.record("total", time.perf_counter() - started)
+
+    async def drive() -> float:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded(query: str) -> None:
+            async with semaphore:
+                await one(query)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(bounded(q) for q in queries))
+        return time.perf_counter() - started
+
+    async def main() -> float:
+        await one(queries[0])  # first call opens the client's HTTP connection
+        timer.reset()
+        return await drive()
+
+    elapsed = asyncio.run(main())
+    report = timer.report(elapsed)
+    report.update(errors=errors, concurrency=concurrency)
+    return report
+
+
+def run_flask(timer: StageTimer, module: Any, queries: List[str]) -> Dict[str, Any]:
+    client = module.app.test_client()
+    errors = 0
+    started = time.perf_counter()
+    for query in queries:
+        begun = time.perf_counter()
+        response = client.post("/ask", json={"query": query})
+        timer.record("total", time.perf_counter() - begun)
+        errors += response.status_code >= 500
+    report = timer.report(time.perf_counter() - started)
+    report.update(errors=errors, concurrency=1)
+    return report
+
+
+def instrument_actions(timer: StageTimer) -> None:
+    import actions.actions as A
+
+    for attr, stage in (("extract_date_filter", "parse"), ("generate_spec_from_gpt", "nl2sql"),
+                        ("snapshot_page", "snapshot"),
+                        ("stream_page", "db_render"), ("fetch_page_rows", "prefetch")):
+        if hasattr(A, attr):
+            timer.wrap(A, attr, stage)
+
+
+def instrument_flask(timer: StageTimer, module: Any) -> None:
+    for attr, stage in (("plan_sql", "nl2sql"), ("fetch_all", "db"), ("format_results", "render"),
+                        ("format_results_with_gpt", "format_llm"), ("generate_info_answer", "llm_info")):
+        if hasattr(module, attr):
+            timer.wrap(module, attr, stage)
+
+
+def run_size(rows: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """Benchmark every target against one database size in this process."""
+    from benchmarks.e2e.mock_openai import MockOpenAI
+    from benchmarks.e2e.seed import database_name, ensure_seeded
+
+    database = args.database or database_name(rows)
+    if not args.no_seed:
+        ensure_seeded(rows, database)
+
+    mock = MockOpenAI(args.llm_latency_ms, args.llm_jitter, seed=args.seed)
+    os.environ.update({
+        "DB_NAME": database,
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": mock.serve(),
+        "SQL_CACHE_PATH": ":memory:",
+        "ACTIONS_WARMUP": "1",
+    })
+    if args.no_cache:
+        os.environ.update({"SQL_CACHE_TTL": "0", "ANSWER_CACHE_THRESHOLD": "1.01"})
+
+    mix = load_query_mix()
+    rng = random.Random(args.seed)
+    pools = {
+        "action_fetch_event_data": mix.get("ask_event", []),
+        "action_general_info": mix.get("ask_general_info", []),
+        "flask_app2": [q for qs in mix.values() for q in qs],
+        "flask_app": [q for qs in mix.values() for q in qs],
+    }
+
+    results: Dict[str, Any] = {"database": database, "rows": rows}
+    timer = StageTimer()
+    instrumented = set()
+    for target in args.targets:
+        queries = [rng.choice(pools[target]) for _ in range(args.requests)]
+        llm_before = mock.requests
+        timer.reset()
+        if target.startswith("action_"):
+            import actions.actions as A
+
+            A.readiness.wait(args.warmup_timeout)
+            if "actions" not in instrumented:
+                instrument_actions(timer)
+                instrumented.add("actions")
+            # Each target runs its own event loop; the client's connections belong to the last one
+            A._client = None
+            timer.wrap(A.llm().chat.completions, "create", "llm")
+            results[target] = run_actions(timer, target, queries, args.concurrency)
+        else:
+            import importlib
+
+            module = importlib.import_module(f"trial.{target.split('_', 1)[1]}")
+            if target not in instrumented:
+                instrument_flask(timer, module)
+                instrumented.add(target)
+            results[target] = run_flask(timer, module, queries)
+        results[target]["llm_requests"] = mock.requests - llm_before
+    mock.shutdown()
+    return results
+
+
+# --- REPORTING ---
+def print_report(results: Dict[str, Any]) -> None:
+    for size, targets in results["runs"].items():
+        print(f"\n== {size} rows ({targets['database']}) ==")
+        for target in TARGETS:
+            report = targets.get(target)
+            if not report:
+                continue
+            total = report["total"]
+            print(f"  {target:24} p50 {total.get('p50_ms', 0):9.2f}  p95 {total.get('p95_ms', 0):9.2f}  "
+                  f"p99 {total.get('p99_ms', 0):9.2f} ms  {total.get('throughput_per_s', 0):8.2f} req/s  "
+                  f"errors {report['errors']}")
+            for stage, summary in sorted(report["stages"].items()):
+                print(f"    {stage:22} p50 {summary.get('p50_ms', 0):9.2f}  p95 {summary.get('p95_ms', 0):9.2f}  "
+                      f"p99 {summary.get('p99_ms', 0):9.2f} ms  n={summary['count']}")
+
+
+def regressions(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    found = []
+    for size, targets in current["runs"].items():
+        for target in TARGETS:
+            now, then = targets.get(target), baseline.get("runs", {}).get(size, {}).get(target)
+            if not now or not then:
+                continue
+            pairs = [("total", now["total"], then["total"])]
+            pairs += [(s, v, then["stages"].get(s, {})) for s, v in now["stages"].items()]
+            for stage, new, old in pairs:
+                if "p95_ms" not in new or "p95_ms" not in old:
+                    continue
+                # Ignore sub-millisecond noise on fast stages
+                if new["p95_ms"] > old["p95_ms"] * (1 + tolerance) and new["p95_ms"] - old["p95_ms"] > 1.0:
+                    found.append(f"{size}/{target}/{stage}: p95 {old['p95_ms']:.2f} -> {new['p95_ms']:.2f} ms")
+    return found
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    from benchmarks.e2e.seed import SIZES, parse_size
+
+    parser = argparse.ArgumentParser(description="Offline end-to-end latency benchmarks")
+    parser.add_argument("--rows", default="1k", help=f"comma-separated sizes ({', '.join(SIZES)} or numbers)")
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--requests", type=int, default=200, help="requests per target")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent action runs")
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-jitter", type=float, default=0.3)
+    parser.add_argument("--no-cache", action="store_true", help="disable the SQL template and answer caches")
+    parser.add_argument("--no-seed", action="store_true", help="use the database as it is")
+    parser.add_argument("--database", help="database name (single size only)")
+    parser.add_argument("--warmup-timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="JSON path (default benchmarks/results/e2e-<time>.json)")
+    parser.add_argument("--baseline", help="earlier JSON output to compare p95s against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth, 0.2 = 20%%")
+    args = parser.parse_args()
+    args.targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = set(args.targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+    sizes = [s.strip() for s in args.rows.split(",") if s.strip()]
+
+    runs: Dict[str, Any] = {}
+    if len(sizes) == 1:
+        runs[sizes[0]] = run_size(parse_size(sizes[0]), args)
+    else:
+        # actions.actions reads DB_NAME at import, so each size gets its own process
+        for size in sizes:
+            with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+                out = tmp.name
+            argv = [a for a in sys.argv[1:]]
+            argv += ["--rows", size, "--output", out]
+            subprocess.run([sys.executable, "-m", "benchmarks.e2e.run", *argv], cwd=ROOT, check=True,
+                           stdout=subprocess.DEVNULL)
+            runs.update(json.loads(Path(out).read_text())["runs"])
+            os.unlink(out)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git": git_revision(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_jitter": args.llm_jitter,
+            "no_cache": args.no_cache,
+        },
+        "runs": runs,
+    }
+    output = Path(args.output) if args.output else RESULTS / f"e2e-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print_report(results)
+    print(f"\nSaved {output}")
+
+    if args.baseline:
+        found = regressions(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for line in found:
+            print(f"  REGRESSION {line}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
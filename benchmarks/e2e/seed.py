@@ -0,0 +1,212 @@
+"""Create and fill a local `events` table for the end-to-end benchmarks.
+
+Rows are deterministic for a given ``--rows``/``--seed``: cities, categories,
+coordinates, 200-3000 character descriptions, mixed `date_time` spellings
+('20/06/2025,20:30' and '20/06/2025,20 : 30') and start times spread from
+six months ago to a year ahead. `event_start`, its index and the sync
+triggers are added with actions.event_start.migrate, as in production.
+
+Any local MySQL 8 will do, e.g.
+
+    docker run -d --name amused-bench -p 3306:3306 -e MYSQL_ROOT_PASSWORD=bench mysql:8
+    DB_HOST=127.0.0.1 DB_USER=root DB_PASSWORD=bench \\
+        python -m benchmarks.e2e.seed --rows 100k         # database amused_bench_100k
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Iterator, Tuple
+
+import mysql.connector
+
+from actions.event_start import migrate
+from actions.vocab import CATEGORY_IDS, CITIES
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+SCHEMA = """
+CREATE TABLE events (
+    id INT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    title VARCHAR(255) NOT NULL,
+    address VARCHAR(255),
+    lat DOUBLE,
+    `long` DOUBLE,
+    date_time VARCHAR(32),
+    about TEXT,
+    category_id INT,
+    rating DECIMAL(2, 1),
+    user_id INT,
+    created_at DATETIME,
+    link VARCHAR(512),
+    visible_date VARCHAR(32),
+    recurring TINYINT(1) DEFAULT 0,
+    end_date VARCHAR(32),
+    weekdays TEXT,
+    dates TEXT,
+    all_time TINYINT(1) DEFAULT 0,
+    selected_weeks TEXT
+)
+"""
+
+COLUMNS = ("title", "address", "lat", "`long`", "date_time", "about", "category_id", "rating",
+           "user_id", "created_at", "link", "visible_date", "recurring", "end_date", "weekdays",
+           "dates", "all_time", "selected_weeks")
+
+# Rough city centres, so coordinates cluster the way real listings do
+CITY_CENTRES = {
+    "delhi": (28.61, 77.21), "new delhi": (28.61, 77.21), "mumbai": (19.08, 72.88),
+    "bangalore": (12.97, 77.59), "bengaluru": (12.97, 77.59), "pune": (18.52, 73.86),
+    "hyderabad": (17.39, 78.49), "kolkata": (22.57, 88.36), "chennai": (13.08, 80.27),
+    "lucknow": (26.85, 80.95), "jaipur": (26.91, 75.79), "goa": (15.30, 74.12),
+    "ahmedabad": (23.02, 72.57), "chandigarh": (30.73, 76.78), "malta": (35.90, 14.51),
+}
+TITLE_WORDS = {
+    "music": ["Live Jazz Night", "Indie Concert", "Sufi Evening", "DJ Night", "Unplugged Session"],
+    "sports": ["City Marathon", "Football Cup", "Cricket League", "Cycling Meetup", "Yoga Run"],
+    "art": ["Art Exhibition", "Pottery Workshop", "Photography Walk", "Sketching Meetup"],
+    "education": ["Career Seminar", "Coding Bootcamp", "Science Fair", "Language Workshop"],
+    "tech": ["Startup Meetup", "AI Summit", "Hackathon", "Cloud Conference", "Product Demo Day"],
+    "food": ["Food Festival", "Street Food Walk", "Wine Tasting", "Baking Class", "Chef's Table"],
+}
+ABOUT_WORDS = ("join us for an evening of live music food stalls workshops talks games "
+               "community family friendly networking with local artists and experts "
+               "tickets available at the venue parking limited bring your friends").split()
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def parse_size(value: str) -> int:
+    return SIZES.get(value.lower()) or int(value.replace("_", ""))
+
+
+def generate_events(rows: int, seed: int = 42,
+                    today: date = None) -> Iterator[Tuple]:
+    rng = random.Random(seed)
+    today = today or date.today()
+    base = datetime.combine(today - timedelta(days=180), datetime.min.time())
+    span_minutes = 545 * 24 * 60
+    categories = list(CATEGORY_IDS.items())
+    cities = list(CITIES)
+    for i in range(1, rows + 1):
+        category, category_id = rng.choice(categories)
+        city = rng.choice(cities)
+        lat, lng = CITY_CENTRES.get(city, (20.59, 78.96))
+        start = base + timedelta(minutes=rng.randrange(0, span_minutes // 30) * 30)
+        sep = " : " if rng.random() < 0.5 else ":"
+        recurring = rng.random() < 0.15
+        about_words = rng.randint(30, 450)
+        dates = [(start + timedelta(days=7 * k)).strftime("%d/%m/%Y") for k in range(rng.randint(1, 12))]
+        yield (
+            f"{rng.choice(TITLE_WORDS[category])} #{i}",
+            f"{rng.randint(1, 250)} {rng.choice(['MG Road', 'Park Street', 'Main Bazaar', 'Ring Road'])}, "
+            f"{city.title()}",
+            round(lat + rng.uniform(-0.15, 0.15), 6),
+            round(lng + rng.uniform(-0.15, 0.15), 6),
+            start.strftime(f"%d/%m/%Y,%H{sep}%M"),
+            " ".join(rng.choice(ABOUT_WORDS) for _ in range(about_words)).capitalize() + ".",
+            category_id,
+            round(rng.uniform(2.5, 5.0), 1),
+            rng.randint(1, 5000),
+            start - timedelta(days=rng.randint(1, 90)),
+            f"https://example.com/events/{i}",
+            (start - timedelta(days=30)).strftime("%d/%m/%Y"),
+            int(recurring),
+            (start + timedelta(days=90)).strftime("%d/%m/%Y") if recurring else None,
+            json.dumps(rng.sample(WEEKDAYS, rng.randint(1, 3))) if recurring else None,
+            json.dumps(dates),
+            0,
+            json.dumps(sorted(rng.sample([1, 2, 3, 4], rng.randint(1, 4)))) if recurring else None,
+        )
+
+
+def database_name(rows: int) -> str:
+    label = next((k for k, v in SIZES.items() if v == rows), str(rows))
+    return f"amused_bench_{label}"
+
+
+def connect(database: str = None):
+    return mysql.connector.connect(
+        host=os.getenv("DB_HOST", "127.0.0.1"),
+        user=os.getenv("DB_USER", "root"),
+        password=os.getenv("DB_PASSWORD", ""),
+        port=int(os.getenv("DB_PORT", "3306")),
+        database=database,
+    )
+
+
+def row_count(database: str) -> int:
+    """Rows in ``database``.events, or -1 if it doesn't exist yet."""
+    try:
+        conn = connect(database)
+    except mysql.connector.Error:
+        return -1
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM events")
+        return int(cur.fetchone()[0])
+    except mysql.connector.Error:
+        return -1
+    finally:
+        conn.close()
+
+
+def seed(rows: int, database: str, batch_size: int = 5000, seed_value: int = 42) -> float:
+    """(Re)create ``database`` with ``rows`` events; returns seconds taken."""
+    started = time.perf_counter()
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute(f"DROP DATABASE IF EXISTS `{database}`")
+    cur.execute(f"CREATE DATABASE `{database}` CHARACTER SET utf8mb4")
+    cur.execute(f"USE `{database}`")
+    cur.execute(SCHEMA)
+    migrate(conn, triggers=True)
+
+    insert = f"INSERT INTO events ({', '.join(COLUMNS)}) VALUES ({', '.join(['%s'] * len(COLUMNS))})"
+    batch = []
+    for values in generate_events(rows, seed_value):
+        batch.append(values)
+        if len(batch) == batch_size:
+            cur.executemany(insert, batch)
+            conn.commit()
+            batch.clear()
+    if batch:
+        cur.executemany(insert, batch)
+        conn.commit()
+    cur.execute("ANALYZE TABLE events")
+    cur.fetchall()
+    cur.close()
+    conn.close()
+    return time.perf_counter() - started
+
+
+def ensure_seeded(rows: int, database: str = None) -> str:
+    """Seed unless the database already holds exactly ``rows`` events; returns its name."""
+    database = database or database_name(rows)
+    if row_count(database) != rows:
+        logging.info("Seeding %s with %d events", database, rows)
+        seed(rows, database)
+    return database
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Seed a local events table for benchmarks")
+    parser.add_argument("--rows", default="100k", help="1k, 100k, 1m or a number")
+    parser.add_argument("--database", help="defaults to amused_bench_<rows>")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    rows = parse_size(args.rows)
+    database = args.database or database_name(rows)
+    seconds = seed(rows, database, args.batch_size, args.seed)
+    print(f"Seeded {database}.events with {rows} rows in {seconds:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""Before/after EXPLAIN and timing for date filters on `events`.
+
+"before" is the old STR_TO_DATE(date_time, ...) predicate, "after" is the
+half-open range on the indexed `event_start` column built by
+actions.event_start.month_range_sql.
+
+    python -m benchmarks.event_start_explain              # seeded SQLite stand-in
+    python -m benchmarks.event_start_explain --rows 500000
+    python -m benchmarks.event_start_explain --mysql      # EXPLAIN on the DB_* database
+"""
+import argparse
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from actions.event_start import month_range_sql, parse_date_time
+
+BEFORE = (
+    "SELECT * FROM events WHERE MONTH(STR_TO_DATE(date_time, '%d/%m/%Y,%H:%i')) = {month} "
+    "AND YEAR(STR_TO_DATE(date_time, '%d/%m/%Y,%H:%i')) = {year}"
+)
+AFTER = "SELECT * FROM events WHERE {predicate}"
+
+
+def seed_sqlite(rows: int) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    conn.create_function("STR_TO_DATE", 2, lambda s, _fmt: (
+        parsed.isoformat(sep=" ") if (parsed := parse_date_time(s)) else None
+    ), deterministic=True)
+    conn.create_function("MONTH", 1, lambda s: int(s[5:7]) if s else None, deterministic=True)
+    conn.create_function("YEAR", 1, lambda s: int(s[:4]) if s else None, deterministic=True)
+    conn.execute(
+        "CREATE TABLE events (id INTEGER PRIMARY KEY, title TEXT, address TEXT, "
+        "date_time TEXT, event_start TEXT, about TEXT, category_id INTEGER, rating REAL)"
+    )
+    rng = random.Random(42)
+    base = datetime(2024, 1, 1)
+    batch = []
+    for i in range(1, rows + 1):
+        start = base + timedelta(minutes=rng.randrange(0, 3 * 365 * 24 * 60))
+        sep = " : " if i % 2 else ":"
+        batch.append((
+            i, f"Event {i}", "Delhi", start.strftime(f"%d/%m/%Y,%H{sep}%M"),
+            start.isoformat(sep=" "), "x" * 200, rng.choice([2, 3, 4, 5, 6, 7]), rng.randint(1, 5),
+        ))
+    conn.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+    conn.execute("CREATE INDEX idx_events_event_start ON events (event_start, id)")
+    conn.commit()
+    return conn
+
+
+def timed(conn, sql: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(sql).fetchall()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run_sqlite(rows: int, repeat: int) -> None:
+    conn = seed_sqlite(rows)
+    before = BEFORE.format(month=6, year=2025)
+    after = AFTER.format(predicate=month_range_sql(2025, 6))
+    print(f"SQLite stand-in, {rows} rows, best of {repeat}")
+    for label, sql in (("before", before), ("after", after)):
+        plan = " | ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}"))
+        matched = len(conn.execute(sql).fetchall())
+        print(f"  {label:6} {timed(conn, sql, repeat) * 1000:9.2f} ms  rows={matched:<6} plan: {plan}")
+
+
+def run_mysql() -> None:
+    from actions.event_start import _connect
+
+    conn = _connect()
+    cur = conn.cursor(dictionary=True)
+    today = datetime.now()
+    before = BEFORE.format(month=today.month, year=today.year)
+    after = AFTER.format(predicate=month_range_sql(today.year, today.month))
+    for label, sql in (("before", before), ("after", after)):
+        cur.execute(f"EXPLAIN {sql}")
+        for row in cur.fetchall():
+            print(f"  {label:6} type={row['type']} key={row['key']} rows={row['rows']} extra={row['Extra']}")
+    cur.close()
+    conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="EXPLAIN/timing for event_start date filters")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mysql", action="store_true", help="EXPLAIN against the DB_* database")
+    args = parser.parse_args()
+    if args.mysql:
+        run_mysql()
+    else:
+        run_sqlite(args.rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
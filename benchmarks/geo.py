@@ -0,0 +1,59 @@
+"""Radius queries on the GeoIndex grid vs a linear haversine scan over every event.
+
+    python -m benchmarks.geo                  # 100k events spread over the gazetteer cities
+    python -m benchmarks.geo --events 1000000 --radius 5
+"""
+import argparse
+import random
+import time
+from statistics import median
+
+from actions.geo import GAZETTEER, GridIndex, haversine_km
+
+
+def sample_points(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    places = list(GAZETTEER.values())
+    for i in range(1, count + 1):
+        place = rng.choice(places)
+        yield i, place.lat + rng.uniform(-0.3, 0.3), place.lon + rng.uniform(-0.3, 0.3)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--radius", type=float, default=10.0, help="km")
+    parser.add_argument("--cell", type=float, default=0.1, help="grid cell size in degrees")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    points = list(sample_points(args.events))
+    started = time.perf_counter()
+    grid = GridIndex(args.cell)
+    for key, lat, lon in points:
+        grid.add(key, lat, lon)
+    print(f"{args.events} events, build {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    centres = [(p.lat, p.lon) for p in GAZETTEER.values()]
+    grid_samples, scan_samples = [], []
+    for i in range(args.repeat):
+        lat, lon = centres[i % len(centres)]
+        started = time.perf_counter()
+        found = grid.within(lat, lon, args.radius)
+        grid_samples.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        scanned = [key for key, plat, plon in points if haversine_km(lat, lon, plat, plon) <= args.radius]
+        scan_samples.append(time.perf_counter() - started)
+        assert sorted(key for _, key in found) == sorted(scanned)
+
+    print(f"  grid  median {median(grid_samples) * 1000:8.2f} ms  ({len(found)} matches in the last query)")
+    print(f"  scan  median {median(scan_samples) * 1000:8.2f} ms")
+
+    started = time.perf_counter()
+    for key, lat, lon in sample_points(1000, seed=8):
+        grid.add(args.events + key, lat, lon)
+    print(f"  incremental add of 1000 events {(time.perf_counter() - started) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Date-range lookups on the OccurrenceIndex vs expanding every recurrence rule per query.
+
+    python -m benchmarks.occurrences                  # 100k events, 15% recurring
+    python -m benchmarks.occurrences --events 1000000 --days 30
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+from statistics import median
+
+from actions.occurrences import OccurrenceIndex, Recurrence, decode, expand
+
+
+def sample_events(count: int, today: date, seed: int = 7):
+    rng = random.Random(seed)
+    base = datetime.combine(today - timedelta(days=180), datetime.min.time())
+    for i in range(1, count + 1):
+        first = base + timedelta(minutes=rng.randrange(0, 545 * 24 * 2) * 30)
+        rule = None
+        if rng.random() < 0.15:
+            rule = Recurrence(
+                repeats=True,
+                weekdays=frozenset(rng.sample(range(7), rng.randint(1, 3))),
+                weeks=frozenset(rng.sample(range(1, 5), rng.randint(1, 4))),
+                until=None if rng.random() < 0.2 else (first + timedelta(days=90)).date(),
+            )
+        yield i, first, rule
+
+
+def scan(events, start: datetime, end: datetime):
+    """What answering without the index costs: every rule expanded for the range."""
+    found = []
+    for event_id, first, rule in events:
+        if start <= first < end:
+            found.append((first, event_id))
+        if rule is not None:
+            found.extend((at, event_id) for at in expand(first, rule, start.date(), end.date()))
+    return sorted(found)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=7, help="length of each queried range")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    today = date.today()
+    events = list(sample_events(args.events, today))
+    started = time.perf_counter()
+    index = OccurrenceIndex(today=today)
+    occurrences = index.build(events, today=today)
+    print(f"{args.events} events, {occurrences} occurrences, build {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    rng = random.Random(8)
+    index_samples, scan_samples = [], []
+    for _ in range(args.repeat):
+        start = datetime.combine(today + timedelta(days=rng.randint(0, 120)), datetime.min.time())
+        end = start + timedelta(days=args.days)
+        started = time.perf_counter()
+        starts, ids = decode(index.between(start, end))
+        index_samples.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        scanned = scan(events, start, end)
+        scan_samples.append(time.perf_counter() - started)
+        assert [(int(at.timestamp()), i) for at, i in scanned] == list(zip(starts.tolist(), ids.tolist()))
+
+    print(f"  index median {median(index_samples) * 1000:8.3f} ms  ({len(ids)} occurrences in the last range)")
+    print(f"  scan  median {median(scan_samples) * 1000:8.3f} ms")
+
+    started = time.perf_counter()
+    added = index.upsert(sample_events(1000, today, seed=9))
+    print(f"  incremental upsert of 1000 events ({added} occurrences) {(time.perf_counter() - started) * 1000:.2f} ms")
+    started = time.perf_counter()
+    added = index.advance(today + timedelta(days=1))
+    print(f"  advance the window one day ({added} occurrences) {(time.perf_counter() - started) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
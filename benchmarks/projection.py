@@ -0,0 +1,144 @@
+"""Bytes and memory per request: `SELECT *` + fetchall vs projection + streaming.
+
+"before" selects every column of the matching rows and renders from a
+fetched list; "after" selects actions.render.EVENT_PROJECTION (with
+`about` cut in SQL) and renders rows as they come off the cursor.
+Bytes are the size of the values in the result set, a stand-in for what
+crosses the wire; memory is the tracemalloc peak while fetching and
+rendering.
+
+    python -m benchmarks.projection                   # seeded SQLite stand-in
+    python -m benchmarks.projection --limit 50 --about 4000
+    python -m benchmarks.projection --mysql           # Bytes_sent on the DB_* database
+"""
+import argparse
+import json
+import random
+import sqlite3
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+from actions.event_start import month_range_sql
+from actions.render import ABOUT_LIMIT, EVENT_PROJECTION, render_events
+
+COLUMNS = ("id", "title", "address", "lat", "long", "date_time", "event_start", "about",
+           "category_id", "rating", "user_id", "created_at", "link", "visible_date",
+           "recurring", "end_date", "weekdays", "dates", "all_time", "selected_weeks")
+BEFORE = "SELECT * FROM events WHERE {predicate} LIMIT {limit}"
+AFTER = "SELECT {projection} FROM events WHERE {predicate} LIMIT {limit}"
+
+
+def seed_sqlite(rows: int, about: int) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    conn.execute(f"CREATE TABLE events ({', '.join(f'`{c}`' for c in COLUMNS)})")
+    rng = random.Random(42)
+    base = datetime(2025, 1, 1)
+    words = "live music art food tech workshop evening community session guided".split()
+    batch = []
+    for i in range(1, rows + 1):
+        start = base + timedelta(minutes=rng.randrange(0, 365 * 24 * 60))
+        text = " ".join(rng.choice(words) for _ in range(about // 7))[:about]
+        dates = [(start + timedelta(days=7 * k)).strftime("%d/%m/%Y") for k in range(12)]
+        batch.append((
+            i, f"Event {i}", f"{i} Main Road, Delhi", 28.6 + rng.random(), 77.2 + rng.random(),
+            start.strftime("%d/%m/%Y,%H:%M"), start.isoformat(sep=" "), text,
+            rng.choice([2, 3, 4, 5, 6, 7]), rng.randint(1, 5), rng.randint(1, 500),
+            start.isoformat(sep=" "), f"https://example.com/e/{i}", start.date().isoformat(),
+            i % 3 == 0, (start + timedelta(days=90)).date().isoformat(),
+            json.dumps(["Mon", "Wed", "Fri"]), json.dumps(dates), 0, json.dumps([1, 2, 3, 4]),
+        ))
+    conn.executemany(f"INSERT INTO events VALUES ({', '.join('?' * len(COLUMNS))})", batch)
+    conn.execute("CREATE INDEX idx_events_event_start ON events (event_start, id)")
+    conn.commit()
+    return conn
+
+
+def _size(value: Any) -> int:
+    return 0 if value is None else len(str(value).encode("utf-8"))
+
+
+def _rows(cur: sqlite3.Cursor, counter: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+    names = [d[0] for d in cur.description]
+    for values in cur:
+        counter["bytes"] += sum(_size(v) for v in values)
+        yield dict(zip(names, values))
+
+
+def measure(conn: sqlite3.Connection, sql: str, stream: bool) -> Tuple[int, int, float]:
+    counter = {"bytes": 0}
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows: Iterable[Dict[str, Any]] = _rows(conn.execute(sql), counter)
+    if not stream:
+        rows = list(rows)
+    render_events(rows)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return counter["bytes"], peak, elapsed
+
+
+def run_sqlite(rows: int, limit: int, about: int) -> None:
+    conn = seed_sqlite(rows, about)
+    predicate = month_range_sql(2025, 6)
+    # LEFT is a join keyword in SQLite; SUBSTR is its equivalent here
+    projection = EVENT_PROJECTION.replace("LEFT(about, ", "SUBSTR(about, 1, ")
+    runs = (
+        ("before", BEFORE.format(predicate=predicate, limit=limit), False),
+        ("after", AFTER.format(projection=projection, predicate=predicate, limit=limit), True),
+    )
+    print(f"SQLite stand-in, {rows} rows, LIMIT {limit}, about={about} chars "
+          f"(cut to {ABOUT_LIMIT + 1} in SQL)")
+    for label, sql, stream in runs:
+        measure(conn, sql, stream)  # warm the page cache
+        sent, peak, elapsed = measure(conn, sql, stream)
+        print(f"  {label:6} {sent / 1024:9.1f} KiB/request  peak {peak / 1024:9.1f} KiB  "
+              f"{elapsed * 1000:7.2f} ms")
+
+
+def run_mysql(limit: int) -> None:
+    from actions.event_start import _connect
+
+    conn = _connect()
+    today = datetime.now()
+    predicate = month_range_sql(today.year, today.month)
+    runs = (
+        ("before", BEFORE.format(predicate=predicate, limit=limit), False),
+        ("after", AFTER.format(projection=EVENT_PROJECTION, predicate=predicate, limit=limit), True),
+    )
+    for label, sql, stream in runs:
+        status = conn.cursor(buffered=True)
+        status.execute("SHOW SESSION STATUS LIKE 'Bytes_sent'")
+        sent_before = int(status.fetchone()[1])
+        tracemalloc.start()
+        cur = conn.cursor(dictionary=True)
+        cur.execute(sql)
+        render_events(cur if stream else cur.fetchall())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        cur.close()
+        status.execute("SHOW SESSION STATUS LIKE 'Bytes_sent'")
+        # The second SHOW's own bytes are included; they're the same for both runs
+        sent = int(status.fetchone()[1]) - sent_before
+        status.close()
+        print(f"  {label:6} {sent / 1024:9.1f} KiB sent  peak {peak / 1024:9.1f} KiB")
+    conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bytes/memory for projected, streamed event fetches")
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--about", type=int, default=2000, help="length of seeded descriptions")
+    parser.add_argument("--mysql", action="store_true", help="measure against the DB_* database")
+    args = parser.parse_args()
+    if args.mysql:
+        run_mysql(args.limit)
+    else:
+        run_sqlite(args.rows, args.limit, args.about)
+
+
+if __name__ == "__main__":
+    main()
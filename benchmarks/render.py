@@ -0,0 +1,96 @@
+"""Local event renderer vs the GPT formatting round trip in trial/app2.py.
+
+    python -m benchmarks.render               # local styles only
+    python -m benchmarks.render --llm 3       # also time 3 real GPT-4 calls (needs OPENAI_API_KEY)
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from statistics import median
+
+from actions.render import STYLES, render_events, truncate
+
+LLM_PROMPT = """
+You are an AI assistant that formats a list of event data into a friendly summary.
+Include:
+- Title 🎭
+- Date & Time 📅
+- Location 📍
+- Link 🌐 (if available)
+- Rating ⭐
+- About ℹ️ (max 300 chars)
+
+Use line breaks, no JSON or markdown.
+
+Data:
+{results}
+"""
+
+
+def sample_rows(count: int = 10):
+    start = datetime(2025, 6, 20, 18, 30)
+    return [
+        {
+            "id": i,
+            "title": f"Sample Event {i}",
+            "date_time": (start + timedelta(days=i)).strftime("%d/%m/%Y,%H : %M"),
+            "address": "Connaught Place, New Delhi",
+            "link": f"https://example.com/events/{i}",
+            "rating": 4,
+            "about": "Live music, food stalls and workshops for the whole family. " * 30,
+            "category_id": 6,
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def time_local(rows, repeat: int) -> None:
+    for style in STYLES:
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            text = render_events(rows, style=style)
+            samples.append(time.perf_counter() - started)
+        print(f"  local/{style:9} median {median(samples) * 1e6:8.1f} µs  output {len(text):6d} chars")
+
+
+def time_llm(rows, calls: int) -> None:
+    from openai import OpenAI
+
+    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    for label, payload in (("full rows", rows),
+                           ("truncated", [{**r, "about": truncate(r["about"])} for r in rows])):
+        prompt = LLM_PROMPT.format(results=payload)
+        samples, out_tokens, in_tokens = [], 0, 0
+        for _ in range(calls):
+            started = time.perf_counter()
+            res = client.chat.completions.create(
+                model="gpt-4", messages=[{"role": "user", "content": prompt}], temperature=0.5
+            )
+            samples.append(time.perf_counter() - started)
+            in_tokens += res.usage.prompt_tokens
+            out_tokens += res.usage.completion_tokens
+        print(f"  llm/{label:10} median {median(samples) * 1000:8.1f} ms  "
+              f"tokens in/out per call {in_tokens // calls}/{out_tokens // calls}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=1000)
+    parser.add_argument("--llm", type=int, default=0, metavar="CALLS",
+                        help="also time this many GPT formatting calls per payload")
+    args = parser.parse_args()
+
+    rows = sample_rows(args.rows)
+    print(f"{args.rows} rows, LLM prompt payload {len(LLM_PROMPT.format(results=rows))} chars "
+          f"({len(json.dumps(rows))} bytes of JSON rows)")
+    time_local(rows, args.repeat)
+    if args.llm:
+        time_llm(rows, args.llm)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Keyword search on the BM25 index vs a LIKE-style substring scan, and mmap load time.
+
+    python -m benchmarks.search                  # 50k synthetic events
+    python -m benchmarks.search --events 200000 --path /tmp/search_index.bin
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from statistics import median
+
+from actions.search import SearchIndex
+
+TOPICS = ["jazz", "holi", "yoga", "hackathon", "comedy", "diwali", "marathon", "poetry",
+          "startup", "pottery", "salsa", "theatre", "photography", "wine", "robotics"]
+FILLER = [f"word{i}" for i in range(5000)]
+
+
+def sample_rows(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    for i in range(1, count + 1):
+        topic = rng.choice(TOPICS)
+        title = f"{topic.title()} {rng.choice(FILLER)} {rng.choice(['night', 'festival', 'meetup', 'workshop'])}"
+        about = " ".join(rng.choices(FILLER, k=60) + [rng.choice(TOPICS)])
+        yield {"id": i, "title": title, "about": about, "address": f"{rng.randint(1, 99)} MG Road"}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--path", default=os.path.join(tempfile.gettempdir(), "bench_search_index.bin"))
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    rows = list(sample_rows(args.events))
+    started = time.perf_counter()
+    index = SearchIndex()
+    for row in rows:
+        index.add(row["id"], row["title"], row["about"], row["address"])
+    print(f"{args.events} events, build {(time.perf_counter() - started):.2f} s")
+
+    started = time.perf_counter()
+    index.save(args.path)
+    print(f"  save {(time.perf_counter() - started) * 1000:.0f} ms, {os.path.getsize(args.path) // 1024} KB")
+    started = time.perf_counter()
+    mapped = SearchIndex.load(args.path)
+    print(f"  mmap load {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    index_samples, scan_samples = [], []
+    for i in range(args.repeat):
+        query = f"{TOPICS[i % len(TOPICS)]} festival"
+        started = time.perf_counter()
+        hits = mapped.search(query, limit=50)
+        index_samples.append(time.perf_counter() - started)
+        words = query.split()
+        started = time.perf_counter()
+        scanned = [row["id"] for row in rows
+                   if any(w in f"{row['title']} {row['about']}".lower() for w in words)]
+        scan_samples.append(time.perf_counter() - started)
+
+    print(f"  index median {median(index_samples) * 1000:8.2f} ms  (top {len(hits)} ranked)")
+    print(f"  scan  median {median(scan_samples) * 1000:8.2f} ms  ({len(scanned)} unranked matches)")
+    os.remove(args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Async HTTP /ask service that replaces the trial Flask apps (see service.app)."""
@@ -0,0 +1,87 @@
+"""Bounded concurrency with a short wait queue, for backpressure instead of pile-ups.
+
+At most ``max_in_flight`` requests run at once. Up to ``max_queue`` more may
+wait (at most ``queue_timeout`` seconds) for a slot; anything beyond that is
+turned away at once with ``Overloaded``, which the service answers with a
+429 and a Retry-After header. ``drain()`` is used at shutdown: new requests
+are refused while the ones already admitted are given time to finish.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+
+
+class Overloaded(RuntimeError):
+    def __init__(self, message: str, retry_after: float = 1.0, draining: bool = False) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.draining = draining
+
+
+class AdmissionGate:
+    def __init__(self, max_in_flight: int = 32, max_queue: int = 64,
+                 queue_timeout: float = 2.0) -> None:
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1.")
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.draining = False
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._in_flight = 0
+        self._waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        if self.draining:
+            self.rejected += 1
+            raise Overloaded("Server is shutting down.", retry_after=1.0, draining=True)
+        if self._slots.locked() and self._waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded("Too many requests in flight.", retry_after=self.queue_timeout)
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise Overloaded("Timed out waiting for a free slot.", retry_after=self.queue_timeout)
+        finally:
+            self._waiting -= 1
+
+        self._in_flight += 1
+        self.admitted += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+            if self._in_flight == 0:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """Refuse new requests and wait for admitted ones; False if some were still running."""
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "queue_timeouts": self.timed_out,
+            "draining": self.draining,
+        }
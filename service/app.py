@@ -0,0 +1,395 @@
+"""Async /ask service: trial/app2.py's behaviour behind a production HTTP server.
+
+Greetings/exits get canned replies, informational questions go to GPT, and
+everything else becomes a GPT filter spec compiled into parameterized SQL
+(actions.filters) and run on a connection pool, with the
+rows rendered locally (or by GPT with "format": "llm"). Unlike the Flask
+dev servers there is no global cursor and nothing blocks the event loop:
+
+* at most ASK_MAX_IN_FLIGHT requests run at once per worker, ASK_MAX_QUEUE
+  more wait up to ASK_QUEUE_TIMEOUT seconds, and the rest get a 429 with
+  Retry-After;
+* each request has an ASK_DEADLINE (504 when exceeded), inside which the
+  LLM_TIMEOUT and DB_QUERY_TIMEOUT per-call limits still apply;
+* GPT calls go through actions.llm's governor; when it gives up, searches
+  fall back to rule-based date/category SQL and formatting to the local
+  renderer;
+* on SIGTERM/SIGINT new requests get a 503, /ready turns 503, and the ones
+  in flight get SHUTDOWN_GRACE seconds to finish before the pool closes.
+
+    python -m service.app --port 5000 --workers 4
+
+It is a Sanic app (Sanic already ships with rasa_sdk), so any ASGI server
+can host it as well: ``uvicorn service.app:app``.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from openai import AsyncOpenAI, BadRequestError
+from sanic import Sanic
+from sanic.response import json as json_response, text
+
+from actions.db import ConnectionPool
+from actions.filters import (FilterSpec, UnsafeQueryError, compile_spec, parse_spec, spec_from_rules,
+                             spec_options, spec_prompt)
+from actions.geo import GeoIndex, parse_origin
+from actions.llm import LLMGovernor, LLMUnavailable, settings_from_env as llm_settings
+from actions.render import DEFAULT_LOCALE, STYLES, render_events, truncate
+from actions.routing import Route, router_from_env
+from actions.singleflight import SingleFlight, query_key
+from actions.telemetry import (METRICS_CONTENT_TYPE, REGISTRY, add_rows, add_tokens, current_trace,
+                               set_path, span, trace_request)
+from service.admission import AdmissionGate, Overloaded
+
+load_dotenv()
+
+ASK_MAX_IN_FLIGHT = int(os.getenv("ASK_MAX_IN_FLIGHT", "32"))
+ASK_MAX_QUEUE = int(os.getenv("ASK_MAX_QUEUE", "64"))
+ASK_QUEUE_TIMEOUT = float(os.getenv("ASK_QUEUE_TIMEOUT", "2"))
+ASK_DEADLINE = float(os.getenv("ASK_DEADLINE", "25"))
+SHUTDOWN_GRACE = float(os.getenv("SHUTDOWN_GRACE", "20"))
+
+DB_QUERY_TIMEOUT = float(os.getenv("DB_QUERY_TIMEOUT", "10"))
+SQL_MAX_LIMIT = int(os.getenv("SQL_MAX_LIMIT", "50"))
+SQL_MAX_EXECUTION_MS = int(os.getenv("SQL_MAX_EXECUTION_MS", "2000"))
+SPEC_MAX_TOKENS = int(os.getenv("SPEC_MAX_TOKENS", "150"))
+
+# Results are rendered locally; "llm" re-enables GPT formatting as an opt-in
+FORMAT_MODE = os.getenv("FORMAT_MODE", "emoji")
+
+GREETINGS = ["hi", "hello", "hey", "hola", "hii", "hiii", "greetings"]
+EXITS = ["ok", "bye", "goodbye", "thank you", "thanks", "see you"]
+
+logger = logging.getLogger(__name__)
+
+app = Sanic("amused_ask")
+app.config.GRACEFUL_SHUTDOWN_TIMEOUT = SHUTDOWN_GRACE
+app.config.RESPONSE_TIMEOUT = ASK_DEADLINE + 5
+
+_dumps = functools.partial(json.dumps, default=str, ensure_ascii=False)
+
+
+# --- LIFECYCLE ---
+@app.before_server_start
+async def setup(app: Sanic, _loop=None) -> None:
+    """Per-worker state: each worker process gets its own pool, client and gate."""
+    app.ctx.pool = ConnectionPool(
+        {
+            "host": os.getenv("DB_HOST"),
+            "user": os.getenv("DB_USER"),
+            "password": os.getenv("DB_PASSWORD"),
+            "database": os.getenv("DB_NAME"),
+            "port": int(os.getenv("DB_PORT", "3306")),
+        },
+        size=int(os.getenv("DB_POOL_SIZE", "5")),
+        timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+        ping_interval=float(os.getenv("DB_POOL_PING_INTERVAL", "30")),
+        connect_retries=int(os.getenv("DB_CONNECT_RETRIES", "2")),
+    )
+    app.ctx.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+    app.ctx.gpt = LLMGovernor(lambda: app.ctx.client, **llm_settings())
+    app.ctx.router = router_from_env()
+    app.ctx.geo = GeoIndex(
+        app.ctx.pool.fetch_all,
+        max_age=float(os.getenv("GEO_MAX_AGE", "300")),
+        full_refresh=float(os.getenv("GEO_FULL_REFRESH", "3600")),
+        cell_deg=float(os.getenv("GEO_CELL_DEG", "0.1")),
+        max_ids=int(os.getenv("GEO_MAX_IDS", "500")),
+    )
+    app.ctx.gate = AdmissionGate(ASK_MAX_IN_FLIGHT, ASK_MAX_QUEUE, ASK_QUEUE_TIMEOUT)
+    # Identical questions arriving together share one GPT call and one DB query
+    app.ctx.sql_flight = SingleFlight("nl2sql")
+    app.ctx.db_flight = SingleFlight("db")
+
+    REGISTRY.gauges("amused_ask_admission", "Admission gate state.", app.ctx.gate.stats)
+    REGISTRY.gauges("amused_db_pool", "Connection pool state.", app.ctx.pool.metrics)
+    REGISTRY.gauges("amused_singleflight_nl2sql", "NL->SQL coalescing counters.", app.ctx.sql_flight.stats)
+    REGISTRY.gauges("amused_singleflight_db", "DB query coalescing counters.", app.ctx.db_flight.stats)
+    REGISTRY.gauges("amused_llm", "OpenAI governor state and counters.", app.ctx.gpt.stats)
+    REGISTRY.gauges("amused_geo", "Event location index state.", app.ctx.geo.stats)
+    try:
+        await app.ctx.pool.run(app.ctx.geo.refresh, True)
+    except Exception:
+        # Location filters fall back to address/bounding-box SQL until a refresh succeeds
+        logger.exception("Initial geo index load failed")
+
+
+@app.before_server_stop
+async def drain(app: Sanic, _loop=None) -> None:
+    if not await app.ctx.gate.drain(SHUTDOWN_GRACE):
+        logger.warning("Shutting down with %d requests still in flight", app.ctx.gate.stats()["in_flight"])
+
+
+@app.after_server_stop
+async def teardown(app: Sanic, _loop=None) -> None:
+    app.ctx.pool.close()
+    await app.ctx.client.close()
+
+
+# --- QUERY ROUTING ---
+def is_info_query(query: str) -> bool:
+    """Detects if the query is informational (non-SQL)."""
+    query_lower = query.lower()
+
+    # Prevent from treating date-based searches as info queries
+    if any(keyword in query_lower for keyword in [
+        " on ", " at ", " in ", "near", "around", "next", "today", "tomorrow", "weekend",
+        "january", "february", "march", "april", "may", "june", "july", "august", "september",
+        "october", "november", "december", "2025", "2024"
+    ]):
+        return False
+
+    info_patterns = [
+        r"\bwhat\s+(happens|is|are|do|does|happening)\b.*\b(event|events|festival|function)?",
+        r"\btell\s+me\s+about\b",
+        r"\bhow\s+(do|can|to)\b.*\b(add|organize|create)\b.*\b(event|events)?",
+        r"\bfields.*event\b",
+        r"\bparameters.*event\b",
+        r"\bdescribe\b.*\b(event|festival)",
+        r"\b(event|festival)\s+details\b",
+        r"\bwhat\s+is\s+[a-z\s]+\b"
+    ]
+
+    return any(re.search(p, query_lower) for p in info_patterns)
+
+
+# --- GPT ---
+async def complete(ctx: Any, route: Route, prompt: str, temperature: float, **options: Any) -> str:
+    with span("llm"), ctx.router.timed(route):
+        response = await ctx.gpt.chat(
+            model=route.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            **options,
+        )
+    add_tokens(response.usage)
+    return response.choices[0].message.content.strip()
+
+
+async def get_spec_from_gpt(ctx: Any, route: Route, user_query: str) -> FilterSpec:
+    """The model's JSON filter spec for the question; raises UnsafeQueryError."""
+    spec = await complete(ctx, route, spec_prompt(user_query), temperature=0,
+                          max_tokens=SPEC_MAX_TOKENS, **spec_options(route.model))
+    return parse_spec(spec)
+
+
+def compile_sql(ctx: Any, spec: FilterSpec,
+                origin: Optional[Tuple[float, float]] = None) -> Tuple[str, Tuple[Any, ...]]:
+    return compile_spec(spec, max_limit=SQL_MAX_LIMIT, origin=origin, geo=ctx.geo,
+                        max_execution_ms=SQL_MAX_EXECUTION_MS)
+
+
+def rule_sql(ctx: Any, user_query: str,
+             origin: Optional[Tuple[float, float]] = None) -> Optional[Tuple[str, Tuple[Any, ...]]]:
+    """Date/category/location SQL and params without GPT; None if the question has none of them."""
+    spec = spec_from_rules(user_query, origin)
+    return compile_sql(ctx, spec, origin) if spec else None
+
+
+async def plan_sql(ctx: Any, user_query: str,
+                   origin: Optional[Tuple[float, float]] = None) -> Tuple[str, Tuple[Any, ...]]:
+    """Rule filters for simple questions, else the routed model's filter spec, compiled into
+    parameterized SQL; raises UnsafeQueryError."""
+    route = ctx.router.route("ask_sql", user_query, origin)
+    if route.model is None:
+        set_path("local_sql")
+        return rule_sql(ctx, user_query, origin) or compile_sql(ctx, FilterSpec())
+    try:
+        spec = await get_spec_from_gpt(ctx, route, user_query)
+    except BadRequestError as e:
+        # The API refused the request itself (a model or option it doesn't take); rules still answer
+        logger.warning("GPT rejected the spec request (%s); planning %r with rules", e, user_query)
+        set_path("local_sql")
+        return rule_sql(ctx, user_query, origin) or compile_sql(ctx, FilterSpec())
+    return compile_sql(ctx, spec, origin)
+
+
+async def format_results_with_gpt(ctx: Any, results: list, user_query: str) -> str:
+    prompt = f"""
+You are an AI assistant that formats a list of event data into a friendly summary.
+Include:
+- Title 🎭
+- Date & Time 📅
+- Location 📍
+- Link 🌐 (if available)
+- Rating ⭐
+- About ℹ️ (max 300 chars)
+
+Use line breaks, no JSON or markdown.
+
+Data:
+{[{**row, "about": truncate(row.get("about"))} for row in results]}
+"""
+    return await complete(ctx, ctx.router.route("ask_format", user_query), prompt, temperature=0.5)
+
+
+async def generate_info_answer(ctx: Any, query: str) -> str:
+    prompt = f"""
+You are an AI expert on event descriptions.
+
+Answer the following user question with informative and friendly detail (max 300 words).
+
+User question: "{query}"
+"""
+    return await complete(ctx, ctx.router.route("ask_info", query), prompt, temperature=0.7)
+
+
+# --- PIPELINE ---
+async def answer(ctx: Any, user_query: str, data: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    query_lower = user_query.lower()
+    if query_lower in GREETINGS:
+        set_path("canned")
+        return {
+            "message": "👋 Hello! I'm your event assistant. Ask things like 'Events in June', 'Concerts in Delhi', or 'What happens in Holi events?'"
+        }, 200
+    if query_lower in EXITS:
+        set_path("canned")
+        return {"message": "👋 Thank you! Have a great day. I'm here if you need help with events later!"}, 200
+
+    # Handle informational queries (e.g. “What happens in music events?”)
+    if is_info_query(user_query):
+        set_path("info_llm")
+        try:
+            return {"message": "ℹ️ Informational answer:",
+                    "formatted": await generate_info_answer(ctx, user_query)}, 200
+        except LLMUnavailable:
+            current_trace().status = "degraded"
+            return {"message": "⏳ I can't answer that right now. Please try again in a moment."}, 200
+
+    # {"location": {"lat": .., "lon": ..}} lets "near me" questions be answered
+    origin = parse_origin(data.get("location"))
+    set_path("gpt_sql")
+    try:
+        key = f"{query_key(user_query)}@{origin}" if origin else query_key(user_query)
+        with span("plan"):
+            sql, params = await ctx.sql_flight.do(key, lambda: plan_sql(ctx, user_query, origin))
+    except LLMUnavailable:
+        current_trace().status = "degraded"
+        planned = rule_sql(ctx, user_query, origin)
+        if not planned:
+            return {
+                "message": "🤖 I can't search free text right now. Try a date or a category, like 'music events this weekend'."
+            }, 200
+        sql, params = planned
+        set_path("degraded_rule_sql")
+    except UnsafeQueryError:
+        current_trace().status = "rejected"
+        return {
+            "message": "❓ Sorry, I couldn't understand your request. Try asking about events by date, location, or category."
+        }, 200
+
+    with span("db"):
+        results = await ctx.db_flight.do(
+            f"{sql}:{params}",
+            lambda: asyncio.wait_for(ctx.pool.afetch_all(sql, params), timeout=DB_QUERY_TIMEOUT),
+        )
+    add_rows(len(results))
+    if not results:
+        return {
+            "sql": sql,
+            "params": params,
+            "results": [],
+            "message": "❌ No matching event details found. Try different keywords, dates, or categories."
+        }, 200
+
+    mode = data.get("format", FORMAT_MODE)
+    with span("format"):
+        formatted = None
+        if mode == "llm":
+            try:
+                formatted = await format_results_with_gpt(ctx, results, user_query)
+            except LLMUnavailable:
+                pass  # GPT is down; the local renderer still answers
+        if formatted is None:
+            formatted = render_events(results, style=mode if mode in STYLES else "emoji",
+                                      locale=data.get("locale", DEFAULT_LOCALE))
+    return {"sql": sql, "params": params, "results": results, "formatted": formatted}, 200
+
+
+# --- ROUTES ---
+@app.post("/ask")
+async def ask(request):
+    data = request.json if isinstance(request.json, dict) else {}
+    user_query = str(data.get("query") or "").strip()
+    if not user_query:
+        return json_response({"error": "Missing query"}, status=400)
+
+    ctx = request.app.ctx
+    try:
+        async with ctx.gate.admit():
+            with trace_request("service_ask") as trace:
+                try:
+                    body, status = await asyncio.wait_for(answer(ctx, user_query, data), timeout=ASK_DEADLINE)
+                except asyncio.TimeoutError:
+                    logger.warning("Request deadline exceeded for query %r", user_query)
+                    trace.status = "timeout"
+                    body, status = {
+                        "message": "⏳ That took longer than usual. Please try again in a moment."
+                    }, 504
+                except Exception as e:
+                    logger.exception("Failed to answer %r", user_query)
+                    trace.status = "error"
+                    body, status = {
+                        "error": str(e),
+                        "message": "⚠️ Something went wrong. Try again or ask in a different way."
+                    }, 500
+    except Overloaded as e:
+        message = ("🔄 I'm restarting. Please try again in a moment." if e.draining
+                   else "🚦 I'm handling a lot of questions right now. Please try again shortly.")
+        return json_response(
+            {"error": str(e), "message": message},
+            status=503 if e.draining else 429,
+            headers={"Retry-After": str(max(1, round(e.retry_after)))},
+        )
+    return json_response(body, status=status, dumps=_dumps)
+
+
+@app.get("/health")
+async def health(request):
+    return json_response({"status": "ok"})
+
+
+@app.get("/ready")
+async def ready(request):
+    draining = request.app.ctx.gate.draining
+    return json_response({"ready": not draining}, status=503 if draining else 200)
+
+
+@app.get("/metrics")
+async def metrics(request):
+    return text(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/stats")
+async def stats(request):
+    ctx = request.app.ctx
+    return json_response({
+        "admission": ctx.gate.stats(),
+        "pool": ctx.pool.metrics(),
+        "coalescing": [ctx.sql_flight.stats(), ctx.db_flight.stats()],
+        "llm": ctx.gpt.stats(),
+        "routing": ctx.router.stats(),
+    })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Async /ask service")
+    parser.add_argument("--host", default=os.getenv("ASK_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("ASK_PORT", "5000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("ASK_WORKERS", "1")),
+                        help="worker processes, each with its own pool and limits")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    app.run(host=args.host, port=args.port, workers=args.workers, access_log=False,
+            single_process=args.workers == 1, motd=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,29 @@ from flask import Flask, request, jsonify
 import mysql.connector
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
-from datetime import datetime
+from openai import BadRequestError, OpenAI
+
+from actions.db import ConnectionPool
+from actions.filters import (FilterSpec, UnsafeQueryError, compile_spec, parse_spec, spec_from_rules,
+                             spec_options, spec_prompt)
+from actions.geo import parse_origin
+from actions.llm import LLMUnavailable, ThreadedLLMGovernor, settings_from_env as llm_settings
+from actions.render import render_events
+from actions.responses import DATA_VERSION_SQL, DataVersion, ETagCache, compact_responses
+from actions.routing import router_from_env
+from actions.singleflight import ThreadedSingleFlight, query_key
+from actions.telemetry import REGISTRY, add_rows, add_tokens, current_trace, instrument_flask, set_path, span
 
 # Loading  environment variables from the .env file
 load_dotenv()
 
 # Setting the  OpenAI API key
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+# Rate limit, in-flight cap, deadline, retries and circuit breaker for every GPT call
+gpt = ThreadedLLMGovernor(lambda: client, **llm_settings())
+# Which model, if any, each call uses (actions.routing)
+router = router_from_env()
 
 # MySQL database configuration
 db_config = {
@@ -31,50 +45,64 @@ except Exception as e:
     exit()
 
 app = Flask(__name__)
-
-# Fix hardcoded years in SQL (like 2022)
-def fix_sql_year(sql):
-    current_year = str(datetime.now().year)
-    return sql.replace("2022", current_year)
-
-# Converting user query intto SQL
-def get_sql_from_gpt(user_query):
-    prompt = f"""
-You are an AI that converts natural language questions into MySQL SELECT queries.
-
-The database has a table named `events` with the following columns:
-id, title, address, lat, long, date_time, about, category_id, rating, user_id, created_at, link, visible_date, recurring, end_date, weekdays, dates, all_time, selected_weeks.
-
-Formatting rules:
-- `date_time` is a string like '20/06/2025,20 : 30'
-- Use STR_TO_DATE(date_time, '%d/%m/%Y,%H : %i') for comparisons
-- Use:
-    STR_TO_DATE(date_time, '%d/%m/%Y,%H : %i') >= ...
-    AND STR_TO_DATE(date_time, '%d/%m/%Y,%H : %i') < ...
-- Category mappings (category_id):
-    • music → 6
-    • sports → 3
-    • art → 4
-    • education → 5
-    • tech → 2
-    • food → 7
-
-Return only a valid SELECT query.
-No markdown, no comments.
-Always use LIMIT 10.
-
-User query: "{user_query}"
-"""
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0
+instrument_flask(app, "app_ask")
+
+def fetch_all(sql, params=None):
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+# Identical questions arriving together share one GPT call and one DB query
+sql_flight = ThreadedSingleFlight("nl2sql")
+db_flight = ThreadedSingleFlight("db")
+REGISTRY.gauges("amused_singleflight_nl2sql", "NL->SQL coalescing counters.", sql_flight.stats)
+REGISTRY.gauges("amused_singleflight_db", "DB query coalescing counters.", db_flight.stats)
+REGISTRY.gauges("amused_llm", "OpenAI governor state and counters.", gpt.stats)
+
+# Repeat polls of /ask get a 304 while the result ids and this fingerprint of `events` hold
+# checked on its own pooled connection: request threads may be using the shared cursor
+version_pool = ConnectionPool(db_config, size=1)
+data_version = DataVersion(lambda: version_pool.fetch_all(DATA_VERSION_SQL),
+                           ttl=float(os.getenv("DATA_VERSION_TTL", "5")))
+etags = ETagCache(max_entries=int(os.getenv("ETAG_CACHE_SIZE", "1024")), ttl=float(os.getenv("ETAG_TTL", "300")))
+REGISTRY.gauges("amused_etags", "Conditional /ask response counters.", etags.stats)
+
+# Converting user query into a filter spec
+def get_spec_from_gpt(user_query, model="gpt-4o"):
+    """The model's JSON filter spec for the question (actions.filters); raises UnsafeQueryError."""
+    response = gpt.chat(
+        model=model,
+        messages=[{"role": "user", "content": spec_prompt(user_query)}],
+        max_tokens=150,
+        temperature=0,
+        **spec_options(model)
     )
-    sql = response.choices[0].message.content.strip().strip('`').replace("```sql", "").replace("```", "")
-    return sql
+    add_tokens(response.usage)
+    return parse_spec(response.choices[0].message.content)
+
+def rule_sql(user_query, origin=None):
+    """Date/category/location SQL and params without GPT; None if the question has none of them."""
+    spec = spec_from_rules(user_query, origin)
+    return compile_spec(spec, origin=origin) if spec else None
+
+def plan_sql(user_query, origin=None):
+    """Rule filters for simple questions, else the routed model's filter spec, compiled into
+    parameterized SQL; returns (sql, params) and raises UnsafeQueryError."""
+    route = router.route("ask_sql", user_query, origin)
+    if route.model is None:
+        set_path("local_sql")
+        return rule_sql(user_query, origin) or compile_spec(FilterSpec())
+    try:
+        with span("llm"), router.timed(route):
+            spec = get_spec_from_gpt(user_query, route.model)
+    except BadRequestError:
+        # The API refused the request itself (a model or option it doesn't take); rules still answer
+        app.logger.warning("GPT rejected the spec request for %r; planning it with rules", user_query)
+        set_path("local_sql")
+        return rule_sql(user_query, origin) or compile_spec(FilterSpec())
+    return compile_spec(spec, origin=origin)
 
 # Format SQL result to user-friendly text
-def format_results_with_gpt(results):
+def format_results_with_gpt(results, user_query=""):
     prompt = f"""
 You are an AI assistant that formats a list of event data into a user-friendly summary.
 Include:
@@ -90,69 +118,101 @@ Use line breaks, no JSON, no markdown.
 Data:
 {results}
 """
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.5
-    )
+    route = router.route("ask_format", user_query)
+    with router.timed(route):
+        response = gpt.chat(
+            model=route.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.5
+        )
+    add_tokens(response.usage)
     return response.choices[0].message.content.strip()
 
 #  /ask endpoint
 @app.route("/ask", methods=["POST"])
+@compact_responses(data_version, etags)
 def ask():
     data = request.get_json()
     user_query = data.get("query", "").strip()
+    # {"location": {"lat": .., "lon": ..}} lets "near me" questions be answered
+    origin = parse_origin(data.get("location"))
 
     if not user_query:
-        return jsonify({"error": "Missing query"}), 400
+        return {"error": "Missing query"}, 400
 
     query_lower = user_query.lower()
     greetings = ["hi", "hello", "hey", "hola", "hii", "hiii", "greetings"]
     exits = ["ok", "bye", "goodbye", "thank you", "thanks", "see you"]
 
+    if query_lower in greetings or query_lower in exits:
+        set_path("canned")
+
     if query_lower in greetings:
-        return jsonify({
+        return {
             "message": " Hello! I'm your event assistant. Ask me things like 'Events in June', 'Concerts in Malta', or 'What's happening next weekend?'"
-        })
+        }
 
     if query_lower in exits:
-        return jsonify({
+        return {
             "message": " Thank you! Have a great day. I'm here if you need help with events later!"
-        })
+        }
 
     try:
-        sql = get_sql_from_gpt(user_query)
-
-        if not sql.lower().startswith("select"):
-            return jsonify({
+        set_path("gpt_sql")
+        try:
+            with span("plan"):
+                key = f"{query_key(user_query)}@{origin}" if origin else query_key(user_query)
+                sql, params = sql_flight.do(key, lambda: plan_sql(user_query, origin))
+        except LLMUnavailable:
+            current_trace().status = "degraded"
+            planned = rule_sql(user_query, origin)
+            if not planned:
+                return {
+                    "message": "🤖 I can't search free text right now. Try a date or a category, like 'music events this weekend'."
+                }
+            sql, params = planned
+            set_path("degraded_rule_sql")
+        except UnsafeQueryError:
+            current_trace().status = "rejected"
+            return {
                 "message": " Sorry, I couldn't understand your request. Try asking about events by date, location, or category."
-            })
+            }
 
-        sql = fix_sql_year(sql)
-
-        cursor.execute(sql)
-        results = cursor.fetchall()
+        with span("db"):
+            results = db_flight.do(f"{sql}:{params}", lambda: fetch_all(sql, params))
+        add_rows(len(results))
 
         if not results:
-            return jsonify({
+            return {
                 "sql": sql,
+                "params": params,
                 "results": [],
                 "message": " No matching event details found. Try using different keywords, dates, or categories."
-            })
+            }
 
-        formatted_output = format_results_with_gpt(results)
+        with span("format"):
+            try:
+                formatted_output = format_results_with_gpt(results, user_query)
+            except LLMUnavailable:
+                formatted_output = render_events(results)
 
-        return jsonify({
+        return {
             "sql": sql,
+            "params": params,
             "results": results,
             "formatted": formatted_output
-        })
+        }
 
     except Exception as e:
-        return jsonify({
+        return {
             "error": str(e),
             "message": " Something went wrong. Try again or ask in a different way."
-        }), 500
+        }, 500
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify({"coalescing": [sql_flight.stats(), db_flight.stats()], "llm": gpt.stats(),
+                    "routing": router.stats()})
 
 #  Running the  server
 if __name__ == "__main__":
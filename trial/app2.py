@@ -1,17 +1,32 @@
 from flask import Flask, request, jsonify
-import mysql.connector
+import contextvars
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from openai import OpenAI
-from datetime import datetime
+from openai import BadRequestError, OpenAI
+
+from actions.db import ConnectionPool
+from actions.filters import (FilterSpec, UnsafeQueryError, compile_spec, parse_spec, spec_from_rules,
+                             spec_options, spec_prompt)
+from actions.geo import parse_origin
+from actions.llm import LLMUnavailable, ThreadedLLMGovernor, settings_from_env as llm_settings
+from actions.render import DEFAULT_LOCALE, EVENT_PROJECTION, STYLES, render_events, truncate
+from actions.responses import DATA_VERSION_SQL, DataVersion, ETagCache, compact_responses
+from actions.routing import router_from_env
+from actions.singleflight import ThreadedSingleFlight, query_key
+from actions.telemetry import REGISTRY, add_rows, add_tokens, current_trace, instrument_flask, set_path, span
 
 # Load environment variables
 load_dotenv()
 
 # OpenAI client setup
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+# Rate limit, in-flight cap, deadline, retries and circuit breaker for every GPT call
+gpt = ThreadedLLMGovernor(lambda: client, **llm_settings())
+# Which model, if any, each call uses (actions.routing)
+router = router_from_env()
 
 # MySQL configuration
 db_config = {
@@ -22,23 +37,45 @@ db_config = {
     "port": 3306
 }
 
-# Connect to MySQL
+# Connect to MySQL: a pool, so concurrent /ask and /ask/batch requests each get their own connection
+pool = ConnectionPool(db_config, size=int(os.getenv("DB_POOL_SIZE", "5")),
+                      timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")))
 try:
-    db = mysql.connector.connect(**db_config)
-    cursor = db.cursor(dictionary=True)
+    pool.prime()
     print("✅ Connected to MySQL database.")
 except Exception as e:
     print("❌ Failed to connect to database:", e)
     exit()
 
 app = Flask(__name__)
+instrument_flask(app, "app2_ask", endpoints=("ask", "ask_batch"))
 
-# --- Utilities ---
+def fetch_all(sql, params=None):
+    return pool.fetch_all(sql, params)
+
+# Identical questions arriving together share one GPT call and one DB query
+sql_flight = ThreadedSingleFlight("nl2sql")
+db_flight = ThreadedSingleFlight("db")
+REGISTRY.gauges("amused_singleflight_nl2sql", "NL->SQL coalescing counters.", sql_flight.stats)
+REGISTRY.gauges("amused_singleflight_db", "DB query coalescing counters.", db_flight.stats)
+REGISTRY.gauges("amused_llm", "OpenAI governor state and counters.", gpt.stats)
+REGISTRY.gauges("amused_db_pool", "Connection pool state.", pool.metrics)
+
+# Repeat polls of /ask get a 304 while the result ids and this fingerprint of `events` hold
+data_version = DataVersion(lambda: fetch_all(DATA_VERSION_SQL), ttl=float(os.getenv("DATA_VERSION_TTL", "5")))
+etags = ETagCache(max_entries=int(os.getenv("ETAG_CACHE_SIZE", "1024")), ttl=float(os.getenv("ETAG_TTL", "300")))
+REGISTRY.gauges("amused_etags", "Conditional /ask response counters.", etags.stats)
+
+# Results are rendered locally; "llm" re-enables GPT formatting as an opt-in
+FORMAT_MODE = os.getenv("FORMAT_MODE", "emoji")
 
-def fix_sql_year(sql):
-    """Replaces hardcoded 2022 with the current year in SQL query."""
-    current_year = str(datetime.now().year)
-    return sql.replace("2022", current_year)
+# /ask/batch: at most this many questions per request, and GPT calls for all
+# batches together run on this many threads (the governor still rate-limits them)
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "50"))
+batch_pool = ThreadPoolExecutor(max_workers=int(os.getenv("BATCH_CONCURRENCY", "8")),
+                                thread_name_prefix="ask-batch")
+
+# --- Utilities ---
 
 def is_info_query(query):
     """Detects if the query is informational (non-SQL)."""
@@ -65,41 +102,86 @@ def is_info_query(query):
 
     return any(re.search(p, query_lower) for p in info_patterns)
 
-def get_sql_from_gpt(user_query):
-    prompt = f"""
-You are an AI that converts natural language questions into MySQL SELECT queries.
-
-The database has a table named `events` with these columns:
-id, title, address, lat, long, date_time, about, category_id, rating, user_id, created_at, link, visible_date, recurring, end_date, weekdays, dates, all_time, selected_weeks.
-
-Rules:
-- `date_time` is a string like '20/06/2025,20 : 30'
-- Use STR_TO_DATE(date_time, '%d/%m/%Y,%H : %i') for comparisons
-- Use:
-    STR_TO_DATE(date_time, '%d/%m/%Y,%H : %i') >= ...
-    AND STR_TO_DATE(date_time, '%d/%m/%Y,%H : %i') < ...
-- `category_id` mappings:
-    • music → 6
-    • sports → 3
-    • art → 4
-    • education → 5
-    • tech → 2
-    • food → 7
-
-Return only a valid SELECT query. No markdown, no comments.
-Always use LIMIT 10.
-
-User query: "{user_query}"
-"""
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0
+def get_spec_from_gpt(user_query, model="gpt-4o"):
+    """The model's JSON filter spec for the question (actions.filters); raises UnsafeQueryError."""
+    response = gpt.chat(
+        model=model,
+        messages=[{"role": "user", "content": spec_prompt(user_query)}],
+        max_tokens=150,
+        temperature=0,
+        **spec_options(model)
     )
-    sql = response.choices[0].message.content.strip().strip('`').replace("```sql", "").replace("```", "")
-    return sql
-
-def format_results_with_gpt(results):
+    add_tokens(response.usage)
+    return parse_spec(response.choices[0].message.content)
+
+def plan_spec(user_query, origin=None, route=None):
+    """Rule filters for simple questions, else the routed model's filter spec; raises UnsafeQueryError."""
+    route = route or router.route("ask_sql", user_query, origin)
+    if route.model is None:
+        set_path("local_sql")
+        return spec_from_rules(user_query, origin) or FilterSpec()
+    try:
+        with span("llm"), router.timed(route):
+            return get_spec_from_gpt(user_query, route.model)
+    except BadRequestError:
+        # The API refused the request itself (a model or option it doesn't take); rules still answer
+        app.logger.warning("GPT rejected the spec request for %r; planning it with rules", user_query)
+        set_path("local_sql")
+        return spec_from_rules(user_query, origin) or FilterSpec()
+
+def plan_sql(user_query, origin=None):
+    """``plan_spec`` compiled into parameterized SQL; returns (sql, params)."""
+    return compile_spec(plan_spec(user_query, origin), origin=origin)
+
+def planned_spec(user_query, origin=None, route=None):
+    """(spec, None), or (None, reply) when the question can't be turned into a search."""
+    try:
+        key = f"{query_key(user_query)}@{origin}" if origin else query_key(user_query)
+        return sql_flight.do(key, lambda: plan_spec(user_query, origin, route)), None
+    except LLMUnavailable:
+        current_trace().status = "degraded"
+        spec = spec_from_rules(user_query, origin)
+        if spec is None:
+            return None, {
+                "message": "🤖 I can't search free text right now. Try a date or a category, like 'music events this weekend'."
+            }
+        set_path("degraded_rule_sql")
+        return spec, None
+    except UnsafeQueryError:
+        current_trace().status = "rejected"
+        return None, {
+            "message": "❓ Sorry, I couldn't understand your request. Try asking about events by date, location, or category."
+        }
+
+def results_reply(sql, params, results, fmt=FORMAT_MODE, locale=DEFAULT_LOCALE, user_query=""):
+    """The response body for a search's rows."""
+    if not results:
+        return {
+            "sql": sql,
+            "params": params,
+            "results": [],
+            "message": "❌ No matching event details found. Try different keywords, dates, or categories."
+        }
+    with span("format"):
+        formatted_output = format_results(results, mode=fmt, locale=locale, user_query=user_query)
+    return {
+        "sql": sql,
+        "params": params,
+        "results": results,
+        "formatted": formatted_output
+    }
+
+def format_results(results, mode=FORMAT_MODE, locale=DEFAULT_LOCALE, user_query=""):
+    """Formats rows locally, or with GPT when mode is "llm"."""
+    if mode == "llm":
+        try:
+            return format_results_with_gpt([{**row, "about": truncate(row.get("about"))} for row in results],
+                                           user_query)
+        except LLMUnavailable:
+            mode = "emoji"  # GPT is down; the local renderer still answers
+    return render_events(results, style=mode if mode in STYLES else "emoji", locale=locale)
+
+def format_results_with_gpt(results, user_query=""):
     prompt = f"""
 You are an AI assistant that formats a list of event data into a friendly summary.
 Include:
@@ -115,11 +197,14 @@ Use line breaks, no JSON or markdown.
 Data:
 {results}
 """
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.5
-    )
+    route = router.route("ask_format", user_query)
+    with router.timed(route):
+        response = gpt.chat(
+            model=route.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.5
+        )
+    add_tokens(response.usage)
     return response.choices[0].message.content.strip()
 
 def generate_info_answer(query):
@@ -130,78 +215,237 @@ Answer the following user question with informative and friendly detail (max 300
 
 User question: "{query}"
 """
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7
-    )
+    route = router.route("ask_info", query)
+    with router.timed(route):
+        response = gpt.chat(
+            model=route.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7
+        )
+    add_tokens(response.usage)
     return response.choices[0].message.content.strip()
 
+GREETINGS = ["hi", "hello", "hey", "hola", "hii", "hiii", "greetings"]
+EXITS = ["ok", "bye", "goodbye", "thank you", "thanks", "see you"]
+
+def canned_reply(user_query):
+    """The fixed reply to a greeting or goodbye, else None."""
+    query_lower = user_query.lower()
+    if query_lower in GREETINGS:
+        set_path("canned")
+        return {
+            "message": "👋 Hello! I'm your event assistant. Ask things like 'Events in June', 'Concerts in Delhi', or 'What happens in Holi events?'"
+        }
+    if query_lower in EXITS:
+        set_path("canned")
+        return {
+            "message": "👋 Thank you! Have a great day. I'm here if you need help with events later!"
+        }
+    return None
+
+def info_reply(user_query):
+    """GPT's answer to an informational question (e.g. "What happens in music events?")."""
+    set_path("info_llm")
+    try:
+        with span("llm"):
+            answer = generate_info_answer(user_query)
+    except LLMUnavailable:
+        current_trace().status = "degraded"
+        return {
+            "message": "⏳ I can't answer that right now. Please try again in a moment."
+        }
+    return {
+        "message": "ℹ️ Informational answer:",
+        "formatted": answer
+    }
+
+ERROR_REPLY = "⚠️ Something went wrong. Try again or ask in a different way."
+
 # --- Main Endpoint ---
 
 @app.route("/ask", methods=["POST"])
+@compact_responses(data_version, etags)
 def ask():
     data = request.get_json()
     user_query = data.get("query", "").strip()
+    # {"location": {"lat": .., "lon": ..}} lets "near me" questions be answered
+    origin = parse_origin(data.get("location"))
 
     if not user_query:
-        return jsonify({"error": "Missing query"}), 400
-
-    query_lower = user_query.lower()
-    greetings = ["hi", "hello", "hey", "hola", "hii", "hiii", "greetings"]
-    exits = ["ok", "bye", "goodbye", "thank you", "thanks", "see you"]
+        return {"error": "Missing query"}, 400
 
-    if query_lower in greetings:
-        return jsonify({
-            "message": "👋 Hello! I'm your event assistant. Ask things like 'Events in June', 'Concerts in Delhi', or 'What happens in Holi events?'"
-        })
-
-    if query_lower in exits:
-        return jsonify({
-            "message": "👋 Thank you! Have a great day. I'm here if you need help with events later!"
-        })
+    reply = canned_reply(user_query)
+    if reply:
+        return reply
 
     # Handle informational queries (e.g. “What happens in music events?”)
     if is_info_query(user_query):
-        answer = generate_info_answer(user_query)
-        return jsonify({
-            "message": "ℹ️ Informational answer:",
-            "formatted": answer
-        })
+        return info_reply(user_query)
 
     # Handle SQL-based queries
     try:
-        sql = get_sql_from_gpt(user_query)
-
-        if not sql.lower().startswith("select"):
-            return jsonify({
-                "message": "❓ Sorry, I couldn't understand your request. Try asking about events by date, location, or category."
-            })
-
-        sql = fix_sql_year(sql)
-        cursor.execute(sql)
-        results = cursor.fetchall()
+        set_path("gpt_sql")
+        with span("plan"):
+            spec, reply = planned_spec(user_query, origin)
+        if reply:
+            return reply
+        sql, params = compile_spec(spec, origin=origin)
 
-        if not results:
-            return jsonify({
-                "sql": sql,
-                "results": [],
-                "message": "❌ No matching event details found. Try different keywords, dates, or categories."
-            })
+        with span("db"):
+            results = db_flight.do(f"{sql}:{params}", lambda: fetch_all(sql, params))
+        add_rows(len(results))
 
-        formatted_output = format_results_with_gpt(results)
-
-        return jsonify({
-            "sql": sql,
-            "results": results,
-            "formatted": formatted_output
-        })
+        return results_reply(sql, params, results, data.get("format", FORMAT_MODE),
+                                     data.get("locale", DEFAULT_LOCALE), user_query)
 
     except Exception as e:
-        return jsonify({
+        return {
             "error": str(e),
-            "message": "⚠️ Something went wrong. Try again or ask in a different way."
-        }), 500
+            "message": ERROR_REPLY
+        }, 500
+
+# --- Batch Endpoint ---
+
+def _in_context(fn, *args):
+    """Submit ``fn`` to the batch pool inside this request's trace."""
+    return batch_pool.submit(contextvars.copy_context().run, fn, *args)
+
+def _order(spec):
+    """Sort key for rows, matching the ORDER BY compile_spec gives the spec (MySQL sorts NULL last on DESC)."""
+    if spec.sort == "rating":
+        return lambda row: (row.get("rating") is None, -float(row.get("rating") or 0), row["event_start"], row["id"])
+    return lambda row: (row["event_start"], row["id"])
+
+def fetch_batch(plans):
+    """Rows for several (spec, origin) plans, a list or an exception per plan.
+
+    Two round trips however many plans there are: one UNION ALL of every
+    plan's id query (tagged with its slot, identical ones shared), then one
+    fetch of all the rows they name, fanned back out in each plan's order.
+    If the combined query fails, each plan is fetched alone so only the
+    broken one fails.
+    """
+    slots, parts, part_params = {}, [], []
+    plan_slots = []
+    for spec, origin in plans:
+        sql, params = compile_spec(spec, origin=origin, columns="%s AS q, id")
+        slot = slots.get((sql, params))
+        if slot is None:
+            slot = slots[(sql, params)] = len(parts)
+            parts.append(f"({sql})")
+            part_params.extend([slot, *params])
+        plan_slots.append(slot)
+    try:
+        with span("db_ids"):
+            tagged = fetch_all(" UNION ALL ".join(parts), tuple(part_params))
+        ids = sorted({row["id"] for row in tagged})
+        rows = {}
+        if ids:
+            with span("db_rows"):
+                found = fetch_all(f"SELECT {EVENT_PROJECTION} FROM events WHERE id IN "
+                                  f"({', '.join(['%s'] * len(ids))})", tuple(ids))
+            rows = {row["id"]: row for row in found}
+    except Exception:
+        app.logger.exception("Combined batch query failed; fetching each query alone")
+        results = []
+        for spec, origin in plans:
+            sql, params = compile_spec(spec, origin=origin)
+            try:
+                results.append(fetch_all(sql, params))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    per_slot = {slot: [] for slot in range(len(parts))}
+    for row in tagged:
+        if row["id"] in rows:
+            per_slot[int(row["q"])].append(rows[row["id"]])
+    return [sorted(per_slot[slot], key=_order(spec)) for slot, (spec, _) in zip(plan_slots, plans)]
+
+@app.route("/ask/batch", methods=["POST"])
+def ask_batch():
+    """Answer many questions at once: {"queries": ["...", {"query": "...", "location": {..}}], ...}.
+
+    Rule questions are planned here, GPT calls run concurrently on the batch
+    pool and the searches share two DB round trips (``fetch_batch``). Each
+    result has the body /ask would return plus its "status"; one failing
+    question never fails the others.
+    """
+    data = request.get_json(silent=True) or {}
+    queries = data.get("queries")
+    if not isinstance(queries, list) or not queries:
+        return jsonify({"error": "Missing queries"}), 400
+    if len(queries) > BATCH_MAX_QUERIES:
+        return jsonify({"error": f"At most {BATCH_MAX_QUERIES} queries per batch"}), 400
+
+    results, pending, searches = [None] * len(queries), {}, {}
+    options = []
+    for i, item in enumerate(queries):
+        item = item if isinstance(item, dict) else {"query": item}
+        user_query = str(item.get("query") or "").strip()
+        origin = parse_origin(item.get("location", data.get("location")))
+        options.append((user_query, origin, item.get("format", data.get("format", FORMAT_MODE)),
+                        item.get("locale", data.get("locale", DEFAULT_LOCALE))))
+        try:
+            reply = canned_reply(user_query) if user_query else {"error": "Missing query", "status": 400}
+            if reply:
+                results[i] = reply
+            elif is_info_query(user_query):
+                pending[i] = _in_context(info_reply, user_query)
+            else:
+                route = router.route("ask_sql", user_query, origin)
+                if route.model is None:
+                    searches[i] = planned_spec(user_query, origin, route)  # rules only: no need for a thread
+                else:
+                    pending[i] = _in_context(planned_spec, user_query, origin, route)
+        except Exception as e:
+            results[i] = {"error": str(e), "message": ERROR_REPLY, "status": 500}
+
+    with span("plan"):
+        for i, future in pending.items():
+            try:
+                outcome = future.result()
+            except Exception as e:
+                results[i] = {"error": str(e), "message": ERROR_REPLY, "status": 500}
+                continue
+            if isinstance(outcome, tuple):
+                searches[i] = outcome
+            else:
+                results[i] = outcome
+    for i, (spec, reply) in list(searches.items()):
+        if reply:
+            results[i] = reply
+            del searches[i]
+
+    order = sorted(searches)
+    fetched = fetch_batch([(searches[i][0], options[i][1]) for i in order]) if order else []
+    formatting = {}
+    for i, rows in zip(order, fetched):
+        user_query, origin, fmt, locale = options[i]
+        if isinstance(rows, Exception):
+            results[i] = {"error": str(rows), "message": ERROR_REPLY, "status": 500}
+            continue
+        add_rows(len(rows))
+        sql, params = compile_spec(searches[i][0], origin=origin)
+        if fmt == "llm":
+            formatting[i] = _in_context(results_reply, sql, params, rows, fmt, locale, user_query)
+        else:
+            results[i] = results_reply(sql, params, rows, fmt, locale, user_query)
+    for i, future in formatting.items():
+        try:
+            results[i] = future.result()
+        except Exception as e:
+            results[i] = {"error": str(e), "message": ERROR_REPLY, "status": 500}
+
+    for result in results:
+        result.setdefault("status", 200)
+    set_path("batch")  # the per-question paths above all land on this one trace
+    return jsonify({"results": results})
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify({"coalescing": [sql_flight.stats(), db_flight.stats()], "llm": gpt.stats(),
+                    "routing": router.stats()})
 
 # --- Start server ---
 if __name__ == "__main__":